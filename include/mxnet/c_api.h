@@ -95,6 +95,8 @@ typedef void *ProfileHandle;
 typedef void (*ExecutorMonitorCallback)(const char*,
                                         NDArrayHandle,
                                         void *);
+/*! \brief callback called once the pending writes to an NDArray are finished */
+typedef void (*NDArrayReadyCallback)(void *);
 
 struct NativeOpInfo {
   void (*forward)(int, float**, int*, unsigned**, int*, void*);
@@ -501,6 +503,28 @@ MXNET_DLL int MXNDArrayLoad(const char* fname,
                             mx_uint *out_name_size,
                             const char*** out_names);
 
+/*!
+ * \brief Create cpu NDArrays backed by the contents of a file mapped into memory.
+ *  The file is mapped copy-on-write, so that processes mapping the same file share
+ *  its pages until they write to the arrays. The file is unmapped once all arrays
+ *  are deleted.
+ * \param fname name of the file
+ * \param num_arrays number of arrays to create
+ * \param offsets offset in bytes of each array in the file
+ * \param ndims number of dimensions of each array
+ * \param shapes shapes of the arrays, concatenated
+ * \param dtypes data type of each array
+ * \param out handles of the created arrays, of size num_arrays
+ * \return 0 when success, -1 when failure happens
+ */
+MXNET_DLL int MXNDArrayCreateFromMappedFile(const char *fname,
+                                            mx_uint num_arrays,
+                                            const size_t *offsets,
+                                            const mx_uint *ndims,
+                                            const mx_uint *shapes,
+                                            const int *dtypes,
+                                            NDArrayHandle *out);
+
 /*!
  * \brief Load list / dictionary of narrays from file content loaded into memory.
  * This will load a list of ndarrays in a similar
@@ -574,6 +598,18 @@ MXNET_DLL int MXNDArraySyncCheckFormat(NDArrayHandle handle, const bool full_che
  * \return 0 when success, -1 when failure happens
  */
 MXNET_DLL int MXNDArrayWaitToRead(NDArrayHandle handle);
+/*!
+ * \brief Call a function once all the pending writes to an NDArray are finished,
+ *  without blocking the calling thread. The callback runs in an engine thread and
+ *  must not wait for the engine.
+ * \param handle the NDArray handle
+ * \param callback the function to call
+ * \param callback_handle the argument passed to callback
+ * \return 0 when success, -1 when failure happens
+ */
+MXNET_DLL int MXNDArrayCallOnReady(NDArrayHandle handle,
+                                   NDArrayReadyCallback callback,
+                                   void *callback_handle);
 /*!
  * \brief Wait until all the pending read/write with respect NDArray are finished.
  *  Always call this before write data into NDArray synchronizely.
@@ -1680,6 +1716,36 @@ MXNET_DLL int MXDataIterGetIndex(DataIterHandle handle,
  */
 MXNET_DLL int MXDataIterGetPadNum(DataIterHandle handle,
                                   int *pad);
+/*!
+ * \brief Get runtime statistics of the data iterator
+ * \param handle the handle pointer to the data iterator
+ * \param reset whether to restart counting after reading
+ * \param out_size number of statistics
+ * \param out_keys statistic names
+ * \param out_vals statistic values
+ * \return 0 when success, -1 when failure happens
+ */
+MXNET_DLL int MXDataIterGetStats(DataIterHandle handle,
+                                 int reset,
+                                 mx_uint *out_size,
+                                 const char ***out_keys,
+                                 const double **out_vals);
+/*!
+ * \brief Get the position of the data iterator after the last returned batch
+ * \param handle the handle pointer to the data iterator
+ * \param out serialized state, valid until the next API call in this thread
+ * \return 0 when success, -1 when failure happens
+ */
+MXNET_DLL int MXDataIterGetState(DataIterHandle handle,
+                                 const char **out);
+/*!
+ * \brief Move the data iterator to a position returned by MXDataIterGetState
+ * \param handle the handle pointer to the data iterator
+ * \param state serialized state
+ * \return 0 when success, -1 when failure happens
+ */
+MXNET_DLL int MXDataIterSetState(DataIterHandle handle,
+                                 const char *state);
 
 /*!
  * \brief Get the handle to the NDArray of underlying label
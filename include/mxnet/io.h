@@ -53,6 +53,30 @@ class IIterator : public dmlc::DataIter<DType> {
   virtual bool Next(void) = 0;
   /*! \brief get current data */
   virtual const DType &Value(void) const = 0;
+  /*!
+   * \brief get runtime statistics of the iterator, empty if it does not record any
+   * \param reset whether to restart counting after reading
+   * \return (name, value) pairs
+   */
+  virtual std::vector<std::pair<std::string, double> > GetStats(bool reset) {
+    return std::vector<std::pair<std::string, double> >();
+  }
+  /*!
+   * \brief get the position of the iterator after the last returned item
+   * \return serialized state that can be passed to SetState
+   */
+  virtual std::string GetState(void) {
+    LOG(FATAL) << "This iterator does not support GetState";
+    return std::string();
+  }
+  /*!
+   * \brief move the iterator to a position returned by GetState,
+   *  the next item is the one following it
+   * \param state serialized state
+   */
+  virtual void SetState(const std::string &state) {
+    LOG(FATAL) << "This iterator does not support SetState";
+  }
   /*! \brief constructor */
   virtual ~IIterator(void) {}
   /*! \brief store the name of each data, it could be used for making NDArrays */
@@ -115,6 +115,18 @@ class NDArray {
         dtype_(data.type_flag_), storage_type_(kDefaultStorage),
         entry_({nullptr, 0, 0}) {
   }
+  /*!
+   * \brief constructing a static NDArray that shares data with TBlob, whose memory
+   *  is owned by external. external is released once the NDArray is deleted and
+   *  the operations on it are finished.
+   * \param data the memory content of static data
+   * \param dev_id the device id this tensor sits at
+   * \param external owner of the memory of data
+   */
+  NDArray(const TBlob &data, int dev_id, std::shared_ptr<void> external)
+      : NDArray(data, dev_id) {
+    ptr_->external_data = std::move(external);
+  }
   /*! \brief create ndarray from shared memory */
   NDArray(int shared_pid, int shared_id, const TShape& shape, int dtype)
       : ptr_(std::make_shared<Chunk>(shared_pid, shared_id, shape, dtype)), shape_(shape),
@@ -715,6 +727,8 @@ class NDArray {
      */
     /*! \brief construct from static data */
     bool static_data;
+    /*! \brief owner of the static data, if it is not owned by the caller */
+    std::shared_ptr<void> external_data;
     /*! \brief whether data allocation is delayed. This doesn't indicate whether aux data
                allocation is delayed. */
     bool delay_alloc;
@@ -41,6 +41,7 @@ from . import operator
 from . import random as rnd
 from . import random
 from . import optimizer
+from . import checkpoint
 from . import model
 from . import notebook
 from . import initializer
@@ -21,8 +21,9 @@ from __future__ import absolute_import
 from __future__ import division
 
 from array import array
-from threading import Lock
+from threading import Lock, Condition
 import traceback
+import weakref
 import ctypes
 from ctypes import c_int, c_void_p, CFUNCTYPE, POINTER, cast
 from .base import _LIB, check_call, string_types, mx_uint
@@ -254,6 +255,7 @@ def backward(heads, head_grads=None, retain_graph=False, train_mode=True): #pyli
     """
     head_handles, hgrad_handles = _parse_head(heads, head_grads)
 
+    states = _before_backward()
     check_call(_LIB.MXAutogradBackwardEx(
         len(head_handles),
         head_handles,
@@ -265,6 +267,61 @@ def backward(heads, head_grads=None, retain_graph=False, train_mode=True): #pyli
         ctypes.c_int(train_mode),
         ctypes.c_void_p(0),
         ctypes.c_void_p(0)))
+    _after_backward(states)
+
+
+_BACKWARD_WATCHERS = weakref.WeakSet()
+
+def _watch_backward(watcher):
+    """Notifies `watcher` of every backward pass into marked variables.
+
+    ``watcher._before_backward()`` is called before the pass is pushed to the engine
+    and its result is passed to ``watcher._after_backward(state)`` afterwards.
+    """
+    _BACKWARD_WATCHERS.add(watcher)
+
+def _before_backward():
+    return [(watcher, watcher._before_backward()) for watcher in list(_BACKWARD_WATCHERS)]
+
+def _after_backward(states):
+    for watcher, state in states:
+        watcher._after_backward(state)
+
+
+_READY_CALLBACK = CFUNCTYPE(None, c_void_p)
+_ready_cond = Condition()
+_ready_funcs = {}
+_ready_next_id = [1]
+
+def _ready_trampoline(key):
+    """Runs the function registered under `key` by `_call_on_ready`."""
+    with _ready_cond:
+        func = _ready_funcs[key]
+    try:
+        func()
+    except Exception: # pylint: disable=broad-except
+        print('Error in NDArray ready callback: %s' % traceback.format_exc())
+    finally:
+        with _ready_cond:
+            del _ready_funcs[key]
+            _ready_cond.notify_all()
+
+_READY_TRAMPOLINE = _READY_CALLBACK(_ready_trampoline)
+
+def _call_on_ready(arr, func):
+    """Calls `func()` from an engine thread once the pending writes to `arr` are
+    finished. `func` must not wait for the engine."""
+    with _ready_cond:
+        key = _ready_next_id[0]
+        _ready_next_id[0] += 1
+        _ready_funcs[key] = func
+    check_call(_LIB.MXNDArrayCallOnReady(arr.handle, _READY_TRAMPOLINE, c_void_p(key)))
+
+def _wait_ready_callbacks():
+    """Waits until the functions passed to `_call_on_ready` have returned."""
+    with _ready_cond:
+        while _ready_funcs:
+            _ready_cond.wait()
 
 
 def grad(heads, variables, head_grads=None, retain_graph=None, create_graph=False,
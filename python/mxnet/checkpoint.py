@@ -0,0 +1,373 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# coding: utf-8
+"""Sharded checkpoints of NDArrays, written in the background.
+
+A checkpoint is a directory holding ``manifest.json`` and shard files with the
+raw bytes of the arrays. Arrays are snapshotted on their device when saving, so
+that training can continue while the snapshots are copied out and written, and
+are read back one shard at a time when loading. Shards can also be mapped into
+memory, so that processes loading the same checkpoint share its pages.
+
+A parameter file written by `ndarray.save` is converted with::
+
+    mx.checkpoint.save(path, mx.nd.load(fname), background=False)
+"""
+from __future__ import absolute_import
+
+import ctypes
+import json
+import os
+import pickle
+import shutil
+import sys
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from .base import _LIB, check_call, c_str, c_array, mx_uint, NDArrayHandle
+from .context import cpu
+from .ndarray import NDArray, add_n
+from .ndarray import array as nd_array
+from .ndarray.ndarray import _DTYPE_NP_TO_MX
+
+__all__ = ['CheckpointFuture', 'snapshot', 'save', 'is_checkpoint', 'list_arrays',
+           'iter_load', 'load']
+
+MANIFEST = 'manifest.json'
+_FORMAT = 'mxnet-sharded-checkpoint'
+_VERSION = 1
+# offsets of arrays in shards are aligned so that they can be mapped in place
+_ALIGN = 64
+_DEFAULT_SHARD_SIZE = 256 << 20
+# background saves are written one after the other
+_SAVE_LOCK = threading.Lock()
+
+
+class CheckpointFuture(object):
+    """Handle of a checkpoint being written.
+
+    Parameters
+    ----------
+    jobs : list of callable
+        Functions writing the files of the checkpoint, called in order.
+    background : bool
+        Whether to call `jobs` in a background thread. Otherwise they are called
+        before the constructor returns.
+    """
+    def __init__(self, jobs, background=True):
+        self._error = None
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, args=(jobs,))
+            self._thread.start()
+        else:
+            self._run(jobs)
+            self.wait()
+
+    def _run(self, jobs):
+        with _SAVE_LOCK:
+            try:
+                for job in jobs:
+                    job()
+            except Exception as e: # pylint: disable=broad-except
+                self._error = e
+
+    def done(self):
+        """Returns whether the checkpoint has been written or has failed."""
+        return self._thread is None or not self._thread.is_alive()
+
+    def wait(self):
+        """Waits until the checkpoint is written, raising the error that stopped it."""
+        if self._thread is not None:
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def snapshot(obj):
+    """Copies the NDArrays in a nested structure of tuples, lists and dicts on their
+    devices. The copies are pushed to the engine without waiting for them, and
+    later writes to the original arrays do not affect them.
+    """
+    if isinstance(obj, NDArray):
+        return obj.copy()
+    if isinstance(obj, (tuple, list)):
+        return type(obj)(snapshot(i) for i in obj)
+    if isinstance(obj, dict):
+        return {k: snapshot(v) for k, v in obj.items()}
+    return obj
+
+
+def _snapshot_mean(replicas):
+    """Snapshot of the mean of copies of an array on several devices, computed on
+    the device of the first copy."""
+    if len(replicas) == 1:
+        return replicas[0].copy()
+    ctx = replicas[0].context
+    return add_n(*(w.copyto(ctx) for w in replicas)) / len(replicas)
+
+
+def _replace(tmp, path):
+    """Moves the file or directory tmp to path, replacing what is there."""
+    old = None
+    if os.path.lexists(path):
+        old = path + '.old'
+        _remove(old)
+        os.rename(path, old)
+    os.rename(tmp, path)
+    _remove(old)
+
+
+def _remove(path):
+    if path is None or not os.path.lexists(path):
+        return
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def _shard_name(shard):
+    return 'shard-%05d.bin' % shard
+
+
+def _save_job(path, arrays, shard_size=None, num_threads=4):
+    """Returns a function writing the arrays in a checkpoint at path.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint directory.
+    arrays : list of (str, NDArray)
+        Named arrays, which must not be written to after the call, e.g. snapshots.
+    shard_size : int, optional
+        Size in bytes above which arrays are put into a new shard.
+    num_threads : int
+        Number of shards written at the same time.
+    """
+    shard_size = _DEFAULT_SHARD_SIZE if shard_size is None else shard_size
+    entries, shards = [], []
+    shard_bytes = 0
+    for name, arr in arrays:
+        nbytes = int(np.prod(arr.shape)) * np.dtype(arr.dtype).itemsize
+        if not shards or (shards[-1] and shard_bytes + nbytes > shard_size):
+            shards.append([])
+            shard_bytes = 0
+        entry = {'name': name, 'dtype': np.dtype(arr.dtype).name, 'shape': list(arr.shape),
+                 'stype': arr.stype, 'shard': len(shards) - 1, 'offset': shard_bytes}
+        entries.append(entry)
+        shards[-1].append((entry, arr))
+        shard_bytes += (nbytes + _ALIGN - 1) // _ALIGN * _ALIGN
+
+    def write_shard(shard):
+        with open(os.path.join(path + '.tmp', _shard_name(shard)), 'wb') as fout:
+            for entry, arr in shards[shard]:
+                fout.seek(entry['offset'])
+                # waits for the snapshot, and its copy to cpu, only
+                fout.write(arr.asnumpy().tobytes())
+
+    def job():
+        tmp = path + '.tmp'
+        _remove(tmp)
+        os.makedirs(tmp)
+        pool = ThreadPool(max(min(num_threads, len(shards)), 1))
+        try:
+            pool.map(write_shard, range(len(shards)))
+        finally:
+            pool.close()
+        manifest = {'format': _FORMAT, 'version': _VERSION, 'byteorder': sys.byteorder,
+                    'shards': [_shard_name(i) for i in range(len(shards))],
+                    'arrays': entries}
+        with open(os.path.join(tmp, MANIFEST), 'w') as fout:
+            json.dump(manifest, fout)
+        _replace(tmp, path)
+    return job
+
+
+def _pickle_job(fname, obj):
+    """Returns a function pickling obj, whose NDArrays must not be written to after
+    the call, into the file fname."""
+    def job():
+        with open(fname + '.tmp', 'wb') as fout:
+            fout.write(pickle.dumps(obj))
+        _replace(fname + '.tmp', fname)
+    return job
+
+
+def save(path, arrays, shard_size=None, num_threads=4, background=True):
+    """Saves NDArrays in a sharded checkpoint directory.
+
+    The arrays are snapshotted on their devices before returning, so they can be
+    updated while the checkpoint is written. The checkpoint replaces `path` once
+    it is complete.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint directory.
+    arrays : dict of str to NDArray
+        Arrays to save. Arrays are stored in the order of `arrays.items()`.
+    shard_size : int, optional
+        Size in bytes above which arrays are put into a new shard file, 256MB by
+        default.
+    num_threads : int, default 4
+        Number of shards written in parallel.
+    background : bool, default True
+        Whether to write in a background thread.
+
+    Returns
+    -------
+    CheckpointFuture
+        Handle to wait for the checkpoint.
+    """
+    snapshots = [(name, arr.copy()) for name, arr in arrays.items()]
+    return CheckpointFuture([_save_job(path, snapshots, shard_size, num_threads)],
+                            background)
+
+
+def is_checkpoint(path):
+    """Returns whether path is a checkpoint written by `save`."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as fin:
+        manifest = json.load(fin)
+    if manifest.get('format') != _FORMAT:
+        raise ValueError("%s is not a sharded checkpoint" % path)
+    if manifest['version'] > _VERSION:
+        raise ValueError("Checkpoint %s has unsupported version %d" % (
+            path, manifest['version']))
+    return manifest
+
+
+def _entry_dtype(manifest, entry):
+    dtype = np.dtype(entry['dtype'])
+    if manifest['byteorder'] != sys.byteorder:
+        dtype = dtype.newbyteorder('<' if manifest['byteorder'] == 'little' else '>')
+    return dtype
+
+
+def list_arrays(path):
+    """Returns the names of the arrays in a checkpoint, in the order they are stored."""
+    return [entry['name'] for entry in _read_manifest(path)['arrays']]
+
+
+def _map_shard(fname, entries):
+    """Creates cpu arrays backed by a shard file mapped into memory."""
+    shapes = [dim for entry in entries for dim in entry['shape']]
+    handles = (NDArrayHandle * len(entries))()
+    check_call(_LIB.MXNDArrayCreateFromMappedFile(
+        c_str(fname), mx_uint(len(entries)),
+        c_array(ctypes.c_size_t, [entry['offset'] for entry in entries]),
+        c_array(mx_uint, [len(entry['shape']) for entry in entries]),
+        c_array(mx_uint, shapes),
+        c_array(ctypes.c_int, [_DTYPE_NP_TO_MX[np.dtype(entry['dtype']).type]
+                               for entry in entries]),
+        handles))
+    return [NDArray(NDArrayHandle(handle)) for handle in handles]
+
+
+def iter_load(path, ctx=None, prefetch=2, mmap=False):
+    """Loads the arrays of a checkpoint one at a time.
+
+    Shards are read by background threads, `prefetch` shards ahead, so at most
+    that many shards are held in host memory.
+
+    With `mmap`, shards are mapped into memory instead. Arrays loaded on cpu are
+    backed by the mapped pages, which are shared by all processes mapping the
+    checkpoint until they write to the arrays. Arrays loaded on other contexts
+    are copied from the mapped pages one at a time.
+
+    Parameters
+    ----------
+    path : str
+        Checkpoint directory.
+    ctx : Context, optional
+        Context the arrays are loaded on, cpu by default.
+    prefetch : int, default 2
+        Number of shards read ahead.
+    mmap : bool, default False
+        Whether to map shards into memory instead of reading them. Not supported
+        for checkpoints written on machines of a different byte order.
+
+    Returns
+    -------
+    iterator of (str, NDArray)
+        Names and arrays, in the order they are stored.
+    """
+    manifest = _read_manifest(path)
+    ctx = cpu() if ctx is None else ctx
+    by_shard = [[] for _ in manifest['shards']]
+    for entry in manifest['arrays']:
+        by_shard[entry['shard']].append(entry)
+    if mmap and manifest['byteorder'] != sys.byteorder:
+        raise ValueError("Checkpoint %s was written with %s endian byte order and "
+                         "cannot be mapped" % (path, manifest['byteorder']))
+
+    if mmap:
+        for shard, entries in enumerate(by_shard):
+            if not entries:
+                continue
+            arrays = _map_shard(os.path.join(path, manifest['shards'][shard]), entries)
+            for entry, arr in zip(entries, arrays):
+                if arr.context != ctx:
+                    arr = arr.copyto(ctx)
+                if entry['stype'] != 'default':
+                    arr = arr.tostype(entry['stype'])
+                yield entry['name'], arr
+        return
+
+    def read_shard(shard):
+        return np.fromfile(os.path.join(path, manifest['shards'][shard]), dtype=np.uint8)
+
+    prefetch = max(prefetch, 1)
+    pool = ThreadPool(prefetch)
+    try:
+        pending = deque(pool.apply_async(read_shard, (i,))
+                        for i in range(min(prefetch, len(by_shard))))
+        for shard, entries in enumerate(by_shard):
+            data = pending.popleft().get()
+            if shard + prefetch < len(by_shard):
+                pending.append(pool.apply_async(read_shard, (shard + prefetch,)))
+            for entry in entries:
+                dtype = _entry_dtype(manifest, entry)
+                nbytes = int(np.prod(entry['shape'])) * dtype.itemsize
+                value = data[entry['offset']:entry['offset'] + nbytes].view(dtype)
+                value = value.reshape(entry['shape']).astype(dtype.newbyteorder('='),
+                                                               copy=False)
+                arr = nd_array(value, ctx=ctx, dtype=value.dtype)
+                if entry['stype'] != 'default':
+                    arr = arr.tostype(entry['stype'])
+                yield entry['name'], arr
+            del data
+    finally:
+        pool.terminate()
+
+
+def load(path, ctx=None, mmap=False):
+    """Loads all arrays of a checkpoint, see `iter_load`.
+
+    Returns
+    -------
+    dict of str to NDArray
+    """
+    return dict(iter_load(path, ctx, mmap=mmap))
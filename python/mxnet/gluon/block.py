@@ -301,11 +301,11 @@ class Block(object):
         self.collect_params().save(filename, strip_prefix=self.prefix)
 
     def load_params(self, filename, ctx=cpu(), allow_missing=False,
-                    ignore_extra=False):
+                    ignore_extra=False, mmap=False):
         """Load parameters from file.
 
         filename : str
-            Path to parameter file.
+            Path to parameter file, or checkpoint directory.
         ctx : Context or list of Context, default cpu()
             Context(s) initialize loaded parameters on.
         allow_missing : bool, default False
@@ -313,9 +313,12 @@ class Block(object):
         ignore_extra : bool, default False
             Whether to silently ignore parameters from the file that are not
             present in this Block.
+        mmap : bool, default False
+            Whether to map a checkpoint directory into memory, see
+            :py:meth:`ParameterDict.load`.
         """
         self.collect_params().load(filename, ctx, allow_missing, ignore_extra,
-                                   self.prefix)
+                                   self.prefix, mmap)
 
     def register_child(self, block):
         """Registers block as a child of self. :py:class:`Block` s assigned to self as
@@ -21,15 +21,23 @@
 __all__ = ['DataLoader']
 
 import multiprocessing
+import multiprocessing.pool
 import multiprocessing.queues
 from multiprocessing.reduction import ForkingPickler
 import pickle
 import io
 import sys
+import threading
+try:
+    import queue as _queue
+except ImportError:
+    import Queue as _queue
 import numpy as np
 
 from . import sampler as _sampler
 from ... import nd, context
+from ...base import _LIB, check_call
+from ..utils import split_and_load
 
 
 def rebuild_ndarray(*args):
@@ -95,6 +103,36 @@ def default_batchify_fn(data):
         return nd.array(data, dtype=data.dtype)
 
 
+def pad_batchify_fn(data, pad_val=0):
+    """Collate data into batch, padding samples of different shapes at the end
+    of every axis to the largest sample in the batch.
+
+    Parameters
+    ----------
+    data : list
+        Samples, tuples of samples are batched per field.
+    pad_val : scalar or tuple of scalar, default 0
+        Padding value, or one value per field of tuple samples.
+
+    Examples
+    --------
+    >>> batchify_fn = functools.partial(pad_batchify_fn, pad_val=(0, 255))
+    >>> loader = DataLoader(dataset, batch_sampler=BucketBatchSampler(sizes, 8),
+    ...                     batchify_fn=batchify_fn)
+    """
+    if isinstance(data[0], tuple):
+        data = list(zip(*data))
+        if not isinstance(pad_val, (list, tuple)):
+            pad_val = [pad_val] * len(data)
+        return [pad_batchify_fn(i, v) for i, v in zip(data, pad_val)]
+    data = [d.asnumpy() if isinstance(d, nd.NDArray) else np.asarray(d) for d in data]
+    shape = tuple(max(d.shape[axis] for d in data) for axis in range(data[0].ndim))
+    out = np.full((len(data),) + shape, pad_val, dtype=data[0].dtype)
+    for i, d in enumerate(data):
+        out[(i,) + tuple(slice(0, n) for n in d.shape)] = d
+    return nd.array(out, dtype=out.dtype)
+
+
 def default_mp_batchify_fn(data):
     """Collate data into batch. Use shared memory for stacking."""
     if isinstance(data[0], nd.NDArray):
@@ -119,6 +157,88 @@ def worker_loop(dataset, key_queue, data_queue, batchify_fn):
         batch = batchify_fn([dataset[i] for i in samples])
         data_queue.put((idx, batch))
 
+def _slot_fits(out, shape, dtype):
+    """Whether a ring slot array can hold a batch of shape and dtype."""
+    return isinstance(out, nd.NDArray) and out.shape == shape and out.dtype == dtype
+
+
+def default_ring_batchify_fn(data, out=None):
+    """Collate data into batch, stacking into the shared memory arrays `out`
+    of a batch ring slot when they have the batch layout."""
+    if isinstance(data[0], nd.NDArray):
+        shape = (len(data),) + data[0].shape
+        if not _slot_fits(out, shape, data[0].dtype):
+            out = nd.empty(shape, dtype=data[0].dtype, ctx=context.Context('cpu_shared', 0))
+        return nd.stack(*data, out=out)
+    elif isinstance(data[0], tuple):
+        data = list(zip(*data))
+        if not isinstance(out, list) or len(out) != len(data):
+            out = [None] * len(data)
+        ret = [default_ring_batchify_fn(i, o) for i, o in zip(data, out)]
+        return out if all(r is o for r, o in zip(ret, out)) else ret
+    else:
+        data = np.asarray(data)
+        if not _slot_fits(out, data.shape, data.dtype):
+            return nd.array(data, dtype=data.dtype, ctx=context.Context('cpu_shared', 0))
+        out[:] = data
+        return out
+
+
+def _copy_to_slot(batch, out=None):
+    """Copy a batch into the shared memory arrays `out` of a batch ring slot,
+    allocating new ones where the layout differs."""
+    if isinstance(batch, nd.NDArray):
+        if not _slot_fits(out, batch.shape, batch.dtype):
+            if batch.context == context.Context('cpu_shared', 0):
+                return batch
+            out = nd.empty(batch.shape, dtype=batch.dtype, ctx=context.Context('cpu_shared', 0))
+        batch.copyto(out)
+        return out
+    elif isinstance(batch, (list, tuple)):
+        if not isinstance(out, type(batch)) or len(out) != len(batch):
+            out = [None] * len(batch)
+        ret = [_copy_to_slot(b, o) for b, o in zip(batch, out)]
+        if all(r is o for r, o in zip(ret, out)):
+            return out
+        return type(batch)(ret)
+    return batch
+
+
+def _wait_to_write(batch):
+    """Wait until pending operations on the arrays of a batch are finished."""
+    if isinstance(batch, nd.NDArray):
+        check_call(_LIB.MXNDArrayWaitToWrite(batch.handle))
+    elif isinstance(batch, (list, tuple)):
+        for b in batch:
+            _wait_to_write(b)
+
+
+def persistent_worker_loop(dataset, key_queue, data_queue, batchify_fn):
+    """Worker loop for DataLoader with persistent workers. Batches are written
+    into the batch ring slots, only new slot arrays are sent back."""
+    slots = {}
+    while True:
+        idx, samples, slot, arrays = key_queue.get()
+        if idx is None:
+            break
+        if arrays is not None:
+            slots[slot] = arrays
+        out = slots.get(slot)
+        data = [dataset[i] for i in samples]
+        if batchify_fn is None:
+            batch = default_ring_batchify_fn(data, out)
+        else:
+            batch = _copy_to_slot(batchify_fn(data), out)
+        if out is not None and batch is out:
+            nd.waitall()
+            data_queue.put((idx, None))
+        else:
+            slots[slot] = batch
+            data_queue.put((idx, batch))
+    # release the shared memory of the slots before exiting
+    slots.clear()
+
+
 class _MultiWorkerIter(object):
     """Interal multi-worker iterator for DataLoader."""
     def __init__(self, num_workers, dataset, batchify_fn, batch_sampler):
@@ -197,6 +317,270 @@ class _MultiWorkerIter(object):
             self._shutdown = True
 
 
+class _WorkerPool(object):
+    """Internal pool of persistent DataLoader workers with a ring of shared
+    memory batch slots.
+
+    Batch ``i`` of an epoch is written by worker ``i % num_workers`` into slot
+    ``i % num_slots``. Workers allocate the arrays of a slot when it is first
+    used or when the batch layout changes, and keep them mapped; the main
+    process sends the arrays of a slot to a worker only when that worker has
+    not seen them yet."""
+    def __init__(self, num_workers, dataset, batchify_fn):
+        self._num_workers = num_workers
+        self._prefetch = 2 * num_workers
+        # the user may still hold the previous batch while the next ones are prefetched
+        self._num_slots = self._prefetch + 2
+        self._slots = [None] * self._num_slots
+        # version of the arrays of each slot, in the main process and in each worker
+        self._versions = [0] * self._num_slots
+        self._worker_versions = [[0] * self._num_slots for _ in range(num_workers)]
+        self._key_queues = [Queue() for _ in range(num_workers)]
+        self._data_queue = Queue(self._prefetch)
+        self._in_flight = 0
+        self._shutdown = False
+        self._workers = []
+        for key_queue in self._key_queues:
+            worker = multiprocessing.Process(
+                target=persistent_worker_loop,
+                args=(dataset, key_queue, self._data_queue, batchify_fn))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def prefetch(self):
+        """Number of batches in flight."""
+        return self._prefetch
+
+    def __del__(self):
+        self.shutdown()
+
+    def put(self, idx, samples):
+        """Send batch `idx` of the epoch to its worker."""
+        worker = idx % self._num_workers
+        slot = idx % self._num_slots
+        arrays = None
+        if self._slots[slot] is not None:
+            # the user may still have pending operations reading the old batch
+            _wait_to_write(self._slots[slot])
+            if self._worker_versions[worker][slot] != self._versions[slot]:
+                arrays = self._slots[slot]
+                self._worker_versions[worker][slot] = self._versions[slot]
+        self._key_queues[worker].put((idx, samples, slot, arrays))
+        self._in_flight += 1
+
+    def get(self):
+        """Receive the next finished batch as ``(idx, batch)``."""
+        idx, arrays = self._data_queue.get()
+        self._in_flight -= 1
+        slot = idx % self._num_slots
+        if arrays is not None:
+            # the worker allocated new arrays for the slot
+            self._slots[slot] = arrays
+            self._versions[slot] += 1
+            self._worker_versions[idx % self._num_workers][slot] = self._versions[slot]
+        return idx, self._slots[slot]
+
+    def drain(self):
+        """Wait for the batches of an abandoned epoch."""
+        while self._in_flight > 0:
+            self.get()
+
+    def shutdown(self):
+        """Shutdown internal workers by pushing terminate signals."""
+        if not self._shutdown:
+            self._shutdown = True
+            try:
+                if all(worker.is_alive() for worker in self._workers):
+                    # receive the batches in flight so that their shared memory is released
+                    self.drain()
+                for key_queue in self._key_queues:
+                    key_queue.put((None, None, None, None))
+                for worker in self._workers:
+                    worker.join(timeout=1)
+            except (IOError, OSError):
+                pass
+            self._slots = []
+
+
+class _PersistentWorkerIter(object):
+    """Internal iterator over one epoch of a DataLoader with persistent workers."""
+    def __init__(self, pool, batch_sampler):
+        self._pool = pool
+        self._pool.drain()
+        self._batch_sampler = batch_sampler
+        self._data_buffer = {}
+        self._rcvd_idx = 0
+        self._sent_idx = 0
+        self._iter = iter(self._batch_sampler)
+        for _ in range(pool.prefetch):
+            self._push_next()
+
+    def __len__(self):
+        return len(self._batch_sampler)
+
+    def _push_next(self):
+        """Assign next batch workload to workers."""
+        r = next(self._iter, None)
+        if r is None:
+            return
+        self._pool.put(self._sent_idx, r)
+        self._sent_idx += 1
+
+    def __next__(self):
+        if self._rcvd_idx == self._sent_idx:
+            assert not self._data_buffer, "Data buffer should be empty at this moment"
+            raise StopIteration
+
+        while self._rcvd_idx not in self._data_buffer:
+            idx, batch = self._pool.get()
+            self._data_buffer[idx] = batch
+        batch = self._data_buffer.pop(self._rcvd_idx)
+        self._rcvd_idx += 1
+        self._push_next()
+        return batch
+
+    def next(self):
+        return self.__next__()
+
+    def __iter__(self):
+        return self
+
+
+class _ThreadWorkerIter(object):
+    """Internal iterator over one epoch of a DataLoader with a thread pool.
+    Batches are produced as plain CPU NDArrays, without inter process
+    communication, and delivered in sampler order."""
+    def __init__(self, pool, num_workers, dataset, batchify_fn, batch_sampler):
+        self._pool = pool
+        self._dataset = dataset
+        self._batchify_fn = batchify_fn
+        self._batch_sampler = batch_sampler
+        self._data_buffer = {}
+        self._rcvd_idx = 0
+        self._sent_idx = 0
+        self._iter = iter(self._batch_sampler)
+
+        # pre-fetch
+        for _ in range(2 * num_workers):
+            self._push_next()
+
+    def __len__(self):
+        return len(self._batch_sampler)
+
+    def _load(self, samples):
+        return self._batchify_fn([self._dataset[i] for i in samples])
+
+    def _push_next(self):
+        """Assign next batch workload to workers."""
+        r = next(self._iter, None)
+        if r is None:
+            return
+        self._data_buffer[self._sent_idx] = self._pool.apply_async(self._load, (r,))
+        self._sent_idx += 1
+
+    def __next__(self):
+        if self._rcvd_idx == self._sent_idx:
+            assert not self._data_buffer, "Data buffer should be empty at this moment"
+            raise StopIteration
+
+        ret = self._data_buffer.pop(self._rcvd_idx)
+        self._rcvd_idx += 1
+        self._push_next()
+        # re-raises exceptions of the worker thread
+        return ret.get()
+
+    def next(self):
+        return self.__next__()
+
+    def __iter__(self):
+        return self
+
+
+def _load_to_ctx(batch, ctx, batch_axis):
+    """Copy the arrays of a batch to ctx, split along batch_axis when ctx is a list."""
+    if isinstance(batch, nd.NDArray):
+        if isinstance(ctx, context.Context):
+            return batch.as_in_context(ctx)
+        return split_and_load(batch, ctx, batch_axis=batch_axis, even_split=False)
+    elif isinstance(batch, (list, tuple)):
+        return type(batch)(_load_to_ctx(b, ctx, batch_axis) for b in batch)
+    return batch
+
+
+def _wait_to_read(batch):
+    """Wait until the arrays of a batch are computed."""
+    if isinstance(batch, nd.NDArray):
+        batch.wait_to_read()
+    elif isinstance(batch, (list, tuple)):
+        for b in batch:
+            _wait_to_read(b)
+
+
+def _put_unless_stopped(data_queue, stop, item):
+    """Put an item unless the consumer is gone, return whether it was put."""
+    while not stop.is_set():
+        try:
+            data_queue.put(item, timeout=0.1)
+            return True
+        except _queue.Full:
+            pass
+    return False
+
+
+def device_prefetch_loop(data_iter, ctx, batch_axis, data_queue, stop):
+    """Background loop copying batches to devices, ends the queue with
+    ``(None, None)`` or ``(None, exception)``."""
+    try:
+        for batch in data_iter:
+            batch = _load_to_ctx(batch, ctx, batch_axis)
+            _wait_to_read(batch)
+            if not _put_unless_stopped(data_queue, stop, (batch, None)):
+                return
+    except Exception as e:  # pylint: disable=broad-except
+        _put_unless_stopped(data_queue, stop, (None, e))
+        return
+    _put_unless_stopped(data_queue, stop, (None, None))
+
+
+class _DevicePrefetchIter(object):
+    """Internal iterator copying the batches of another iterator to devices.
+
+    A background thread keeps up to `prefetch` batches resident on the target
+    contexts ahead of the consumer, so that host to device copies overlap with
+    the computation on the previous batches."""
+    def __init__(self, data_iter, ctx, batch_axis, prefetch):
+        self._queue = _queue.Queue(prefetch)
+        self._stop = threading.Event()
+        self._done = False
+        thread = threading.Thread(target=device_prefetch_loop,
+                                  args=(data_iter, ctx, batch_axis, self._queue, self._stop))
+        thread.daemon = True
+        thread.start()
+
+    def __del__(self):
+        self._stop.set()
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        batch, error = self._queue.get()
+        if error is not None:
+            self._done = True
+            raise error
+        if batch is None:
+            self._done = True
+            raise StopIteration
+        return batch
+
+    def next(self):
+        return self.__next__()
+
+    def __iter__(self):
+        return self
+
+
 class DataLoader(object):
     """Loads data from a dataset and returns mini-batches of data.
 
@@ -238,10 +622,34 @@ class DataLoader(object):
     num_workers : int, default 0
         The number of multiprocessing workers to use for data preprocessing.
         `num_workers > 0` is not supported on Windows yet.
+    persistent_workers : bool, default False
+        Whether to keep the worker processes alive across epochs instead of
+        starting new ones for every iteration over the DataLoader. Batches are
+        then written into a fixed ring of ``2 * num_workers + 2`` shared memory
+        slots which are reused: a batch stays valid until two more batches have
+        been fetched, copy it to keep it longer. Only used with
+        ``num_workers > 0``.
+    thread_pool : bool, default False
+        Whether to use a pool of `num_workers` threads instead of processes.
+        Suitable when the dataset and transforms spend their time in operations
+        that release the GIL, e.g. NDArray operators and OpenCV, as batches are
+        then plain CPU NDArrays that need no pickling or shared memory, and the
+        pool starts instantly.
+    ctx : Context or list of Context, default None
+        If given, batches are copied to these contexts by a background thread
+        ahead of their use, overlapping the copies with computation. With a
+        list of contexts every array of a batch is split along `batch_axis`
+        and returned as a list with one slice per context, like
+        `gluon.utils.split_and_load`.
+    batch_axis : int, default 0
+        The axis along which batches are split over a list of contexts.
+    ctx_prefetch : int, default 2
+        Number of batches kept resident on the contexts ahead of the consumer.
     """
     def __init__(self, dataset, batch_size=None, shuffle=False, sampler=None,
                  last_batch=None, batch_sampler=None, batchify_fn=None,
-                 num_workers=0):
+                 num_workers=0, persistent_workers=False, thread_pool=False,
+                 ctx=None, batch_axis=0, ctx_prefetch=2):
         self._dataset = dataset
 
         if batch_sampler is None:
@@ -265,8 +673,17 @@ class DataLoader(object):
 
         self._batch_sampler = batch_sampler
         self._num_workers = num_workers if num_workers >= 0 else 0
+        self._thread_pool = thread_pool
+        self._ctx = ctx
+        self._batch_axis = batch_axis
+        self._ctx_prefetch = ctx_prefetch
+        self._persistent_workers = persistent_workers and self._num_workers > 0 \
+            and not thread_pool
+        self._worker_pool = None
+        # the batch ring stacks into its slots directly unless batchify_fn is given
+        self._ring_batchify_fn = batchify_fn
         if batchify_fn is None:
-            if num_workers > 0:
+            if num_workers > 0 and not thread_pool:
                 self._batchify_fn = default_mp_batchify_fn
             else:
                 self._batchify_fn = default_batchify_fn
@@ -274,10 +691,30 @@ class DataLoader(object):
             self._batchify_fn = batchify_fn
 
     def __iter__(self):
+        if self._ctx is None:
+            return self._host_iter()
+        return _DevicePrefetchIter(self._host_iter(), self._ctx, self._batch_axis,
+                                   self._ctx_prefetch)
+
+    def _host_iter(self):
+        """Iterator over the batches in host memory."""
         if self._num_workers == 0:
-            generator = lambda: [(yield self._batchify_fn([self._dataset[idx] for idx in batch]))
-                                 for batch in self._batch_sampler]
-            return generator()
+            def same_process_iter():
+                for batch in self._batch_sampler:
+                    yield self._batchify_fn([self._dataset[idx] for idx in batch])
+            return same_process_iter()
+
+        if self._thread_pool:
+            if self._worker_pool is None:
+                self._worker_pool = multiprocessing.pool.ThreadPool(self._num_workers)
+            return _ThreadWorkerIter(self._worker_pool, self._num_workers, self._dataset,
+                                     self._batchify_fn, self._batch_sampler)
+
+        if self._persistent_workers:
+            if self._worker_pool is None:
+                self._worker_pool = _WorkerPool(self._num_workers, self._dataset,
+                                                self._ring_batchify_fn)
+            return _PersistentWorkerIter(self._worker_pool, self._batch_sampler)
 
         # multi-worker
         return _MultiWorkerIter(self._num_workers, self._dataset,
@@ -285,3 +722,10 @@ class DataLoader(object):
 
     def __len__(self):
         return len(self._batch_sampler)
+
+    def __del__(self):
+        if getattr(self, '_worker_pool', None) is not None:
+            if self._thread_pool:
+                self._worker_pool.terminate()
+            else:
+                self._worker_pool.shutdown()
@@ -21,8 +21,11 @@
 __all__ = ['Dataset', 'SimpleDataset', 'ArrayDataset',
            'RecordFileDataset']
 
+import json
 import os
 
+import numpy as np
+
 from ... import recordio, ndarray
 
 
@@ -94,6 +97,72 @@ class Dataset(object):
             return fn(x)
         return self.transform(base_fn, lazy)
 
+    def cache(self, path, overwrite=False):
+        """Writes all samples to a binary file once and returns a dataset
+        reading them back from a memory mapping of the file.
+
+        This is useful to compute expensive deterministic preprocessing,
+        e.g. decoding and resizing, once instead of every epoch. Random
+        augmentations should be applied to the returned dataset::
+
+            train = dataset.transform_first(resize).cache('train.cache')
+            train = train.transform_first(augment)
+
+        Each field of a sample must have the same shape and dtype in all
+        samples. Samples are stored back to back with a fixed stride, and
+        the fields are returned as numpy views of the mapping, without
+        copying.
+
+        Parameters
+        ----------
+        path : str
+            Path of the cache file. Its layout is stored next to it, in
+            `path` + '.json'.
+        overwrite : bool, default False
+            If False and a complete cache of the same number of samples
+            exists at `path`, it is reused without reading this dataset.
+
+        Returns
+        -------
+        Dataset
+            The cached dataset.
+        """
+        meta_path = path + '.json'
+        if not overwrite and os.path.isfile(meta_path):
+            with open(meta_path) as fin:
+                meta = json.load(fin)
+            if meta['length'] == len(self):
+                return _CachedDataset(path, meta)
+        # remove the layout first, so that a partially written cache is never reused
+        if os.path.isfile(meta_path):
+            os.remove(meta_path)
+
+        meta = None
+        with open(path, 'wb') as fout:
+            for idx in range(len(self)):
+                item = self[idx]
+                fields = item if isinstance(item, tuple) else (item,)
+                fields = [f.asnumpy() if isinstance(f, ndarray.NDArray) else np.asarray(f)
+                          for f in fields]
+                if meta is None:
+                    meta = _cache_layout(fields, isinstance(item, tuple), len(self))
+                record = bytearray(meta['stride'])
+                for field, layout in zip(fields, meta['fields']):
+                    if list(field.shape) != layout['shape'] or field.dtype.str != layout['dtype']:
+                        raise ValueError(
+                            "Samples of a cached dataset must have fixed shapes and types, "
+                            "sample %d has %s %s where sample 0 has %s %s."%(
+                                idx, field.shape, field.dtype, tuple(layout['shape']),
+                                np.dtype(layout['dtype'])))
+                    data = np.ascontiguousarray(field).tobytes()
+                    record[layout['offset']:layout['offset'] + len(data)] = data
+                fout.write(record)
+        if meta is None:
+            meta = {'length': 0, 'stride': 0, 'tuple': False, 'fields': []}
+        with open(meta_path, 'w') as fout:
+            json.dump(meta, fout)
+        return _CachedDataset(path, meta)
+
 
 class SimpleDataset(Dataset):
     """Simple Dataset wrapper for lists and arrays.
@@ -129,6 +198,50 @@ class _LazyTransformDataset(Dataset):
         return self._fn(item)
 
 
+def _cache_layout(fields, is_tuple, length):
+    """Layout of the records of a cache file, given the fields of the first sample.
+    Fields are aligned to 16 bytes."""
+    layout = []
+    offset = 0
+    for field in fields:
+        layout.append({'shape': list(field.shape), 'dtype': field.dtype.str, 'offset': offset})
+        offset += (field.nbytes + 15) // 16 * 16
+    return {'length': length, 'stride': offset, 'tuple': is_tuple, 'fields': layout}
+
+
+class _CachedDataset(Dataset):
+    """Dataset reading the samples of a file written by `Dataset.cache`."""
+    def __init__(self, path, meta):
+        self._path = path
+        self._meta = meta
+        self._records = None
+
+    def __len__(self):
+        return self._meta['length']
+
+    def __getitem__(self, idx):
+        if self._records is None:
+            # mapped on first access, so that each worker process maps the file itself
+            self._records = np.memmap(self._path, dtype=np.uint8, mode='r',
+                                      shape=(len(self), self._meta['stride']))
+        record = self._records[idx]
+        fields = []
+        for layout in self._meta['fields']:
+            dtype = np.dtype(layout['dtype'])
+            size = int(np.prod(layout['shape'])) * dtype.itemsize
+            field = record[layout['offset']:layout['offset'] + size].view(dtype)
+            field = field.reshape(layout['shape'])
+            fields.append(field[()] if not layout['shape'] else field)
+        if self._meta['tuple']:
+            return tuple(fields)
+        return fields[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_records'] = None
+        return state
+
+
 class ArrayDataset(Dataset):
     """A dataset that combines multiple dataset-like objects, e.g.
     Datasets, lists, arrays, etc.
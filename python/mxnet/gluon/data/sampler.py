@@ -18,9 +18,11 @@
 # coding: utf-8
 # pylint: disable=
 """Dataset sampler."""
-__all__ = ['Sampler', 'SequentialSampler', 'RandomSampler', 'BatchSampler']
+__all__ = ['Sampler', 'SequentialSampler', 'RandomSampler', 'BatchSampler',
+           'BucketBatchSampler', 'ShardedSampler']
 
 import random
+from functools import reduce
 
 class Sampler(object):
     """Base class for samplers.
@@ -73,6 +75,70 @@ class RandomSampler(Sampler):
         return self._length
 
 
+class ShardedSampler(Sampler):
+    """Samples the shard of [0, length) that belongs to one of several workers.
+
+    All workers shuffle with the same seed, so that their shards are disjoint
+    and together cover the dataset. Like `num_parts` and `part_index` of the
+    record iterators, this lets every worker of a distributed kvstore read only
+    its part of the data.
+
+    Parameters
+    ----------
+    length : int
+        Length of the sequence.
+    num_parts : int, default 1
+        Number of workers, e.g. `kvstore.num_workers`.
+    part_index : int, default 0
+        Index of this worker, e.g. `kvstore.rank`.
+    shuffle : bool, default True
+        Whether to shuffle the samples every epoch.
+    seed : int, default 0
+        Random seed shared by all workers. The samples of epoch ``e`` are
+        shuffled with ``seed + e``.
+    pad : bool, default True
+        If True, the first samples are repeated so that every shard has
+        ``ceil(length / num_parts)`` samples, otherwise the last
+        ``length % num_parts`` samples of the epoch are dropped.
+
+    Examples
+    --------
+    >>> kv = mx.kv.create('dist_sync')
+    >>> sampler = gluon.data.ShardedSampler(len(dataset), kv.num_workers, kv.rank)
+    >>> loader = gluon.data.DataLoader(dataset, batch_size=32, sampler=sampler)
+    """
+    def __init__(self, length, num_parts=1, part_index=0, shuffle=True, seed=0, pad=True):
+        if not 0 <= part_index < num_parts:
+            raise ValueError("part_index must be in [0, %d), but got %d"%(num_parts, part_index))
+        self._length = length
+        self._num_parts = num_parts
+        self._part_index = part_index
+        self._shuffle = shuffle
+        self._seed = seed
+        self._pad = pad
+        self._epoch = 0
+
+    def set_epoch(self, epoch):
+        """Sets the epoch of the next iteration, e.g. when resuming training.
+        Otherwise the epoch is incremented by every iteration."""
+        self._epoch = epoch
+
+    def __iter__(self):
+        indices = list(range(self._length))
+        if self._shuffle:
+            random.Random(self._seed + self._epoch).shuffle(indices)
+        self._epoch += 1
+        total = len(self) * self._num_parts
+        while len(indices) < total:
+            indices += indices[:total - len(indices)]
+        return iter(indices[self._part_index:total:self._num_parts])
+
+    def __len__(self):
+        if self._pad:
+            return (self._length + self._num_parts - 1) // self._num_parts
+        return self._length // self._num_parts
+
+
 class BatchSampler(Sampler):
     """Wraps over another `Sampler` and return mini-batches of samples.
 
@@ -136,3 +202,91 @@ class BatchSampler(Sampler):
         raise ValueError(
             "last_batch must be one of 'keep', 'discard', or 'rollover', " \
             "but got %s"%self._last_batch)
+
+
+class BucketBatchSampler(Sampler):
+    """Samples mini-batches of samples with similar sizes to reduce padding.
+
+    The samples are visited in windows of ``window * batch_size`` indices, in
+    random order if `shuffle`. Every window is sorted by size and cut into
+    batches, and the batches of the epoch are shuffled again. Use with
+    `gluon.data.dataloader.pad_batchify_fn` to pad each batch to its largest
+    sample only.
+
+    Parameters
+    ----------
+    sizes : list of int or list of tuple of int
+        Size of every sample, e.g. the length of a sequence or the (height,
+        width) of an image.
+    batch_size : int or None
+        Maximum number of samples in a batch.
+    shuffle : bool, default True
+        Whether to shuffle the samples and the batches.
+    window : int, default 100
+        Number of batches sorted together. Larger windows pad less but are
+        less random.
+    max_cost : int, optional
+        Maximum padded size of a batch, the batch size times the product of
+        its largest sizes, e.g. tokens or pixels per batch. A sample larger
+        than `max_cost` gets a batch of its own.
+
+    Examples
+    --------
+    >>> lengths = [5, 1, 4, 2, 3, 8]
+    >>> batch_sampler = gluon.data.BucketBatchSampler(lengths, 2, shuffle=False)
+    >>> list(batch_sampler)
+    [[1, 3], [4, 2], [0, 5]]
+    >>> batch_sampler = gluon.data.BucketBatchSampler(lengths, None, shuffle=False, max_cost=8)
+    >>> list(batch_sampler)
+    [[1, 3], [4, 2], [0], [5]]
+    """
+    def __init__(self, sizes, batch_size, shuffle=True, window=100, max_cost=None):
+        if batch_size is None and max_cost is None:
+            raise ValueError("batch_size or max_cost must be specified")
+        self._sizes = [tuple(s) if isinstance(s, (list, tuple)) else (s,) for s in sizes]
+        self._batch_size = batch_size
+        self._shuffle = shuffle
+        self._window = window
+        self._max_cost = max_cost
+        self._batches = None
+
+    def _cost(self, max_size, num_samples):
+        return num_samples * reduce(lambda x, y: x * y, max_size, 1)
+
+    def _make_batches(self):
+        indices = list(range(len(self._sizes)))
+        if self._shuffle:
+            random.shuffle(indices)
+        window = len(indices) if self._batch_size is None else self._window * self._batch_size
+        batches = []
+        for start in range(0, len(indices), window):
+            batch, max_size = [], None
+            for i in sorted(indices[start:start + window], key=lambda i: self._sizes[i]):
+                size = self._sizes[i]
+                new_max = size if max_size is None else tuple(max(a, b) for a, b in
+                                                              zip(max_size, size))
+                full = batch and (len(batch) == self._batch_size or (
+                    self._max_cost is not None and
+                    self._cost(new_max, len(batch) + 1) > self._max_cost))
+                if full:
+                    batches.append(batch)
+                    batch, new_max = [], size
+                batch.append(i)
+                max_size = new_max
+            if batch:
+                batches.append(batch)
+        if self._shuffle:
+            random.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        if self._batches is None:
+            self._batches = self._make_batches()
+        batches, self._batches = self._batches, None
+        return iter(batches)
+
+    def __len__(self):
+        # the number of batches can change between epochs, prepare the next one
+        if self._batches is None:
+            self._batches = self._make_batches()
+        return len(self._batches)
@@ -19,18 +19,19 @@
 # pylint: disable=
 """Dataset container."""
 __all__ = ['MNIST', 'FashionMNIST', 'CIFAR10', 'CIFAR100',
-           'ImageRecordDataset', 'ImageFolderDataset']
+           'ImageRecordDataset', 'ImageSegRecordDataset', 'ImageFolderDataset']
 
 import os
 import gzip
 import tarfile
 import struct
 import warnings
+from multiprocessing.pool import ThreadPool
 import numpy as np
 
 from .. import dataset
 from ...utils import download, check_sha1, _get_repo_file_url
-from .... import nd, image, recordio
+from .... import nd, image, recordio, seg_recordio
 
 
 class MNIST(dataset._DownloadedDataset):
@@ -280,6 +281,48 @@ class ImageRecordDataset(dataset.RecordFileDataset):
         return image.imdecode(img, self._flag), header.label
 
 
+class ImageSegRecordDataset(dataset.Dataset):
+    """A dataset wrapping over a segmentation RecordIO file.
+
+    Each sample is an image and its label mask. The .rec file is memory
+    mapped and the encoded image and label are decoded directly from views
+    of the mapping, so reading a sample does not copy the record.
+
+    Parameters
+    ----------
+    filename : str
+        Path to rec file. The index file is expected next to it with an
+        .idx extension.
+    flag : {0, 1}, default 1
+        If 0, always convert images to greyscale.
+
+        If 1, always convert images to colored (RGB).
+    transform : function, default None
+        A user defined callback that transforms each sample. For example:
+    ::
+
+        transform=lambda data, label: (data.astype(np.float32)/255, label)
+
+    """
+    def __init__(self, filename, flag=1, transform=None):
+        idx_file = os.path.splitext(filename)[0] + '.idx'
+        self._record = seg_recordio.MXMappedIndexedSegRecordIO(idx_file, filename)
+        self._flag = flag
+        self._transform = transform
+
+    def __getitem__(self, idx):
+        record = self._record.read_idx(self._record.keys[idx])
+        header, image_data, label_data = seg_recordio.unpack_buffers(record)
+        img = image.imdecode(image_data, self._flag)
+        label = nd.array(seg_recordio.decode_label(header, label_data), dtype=np.uint8)
+        if self._transform is not None:
+            return self._transform(img, label)
+        return img, label
+
+    def __len__(self):
+        return len(self._record.keys)
+
+
 class ImageFolderDataset(dataset.Dataset):
     """A dataset for loading image files stored in a folder structure like::
 
@@ -303,46 +346,147 @@ class ImageFolderDataset(dataset.Dataset):
 
         transform = lambda data, label: (data.astype(np.float32)/255, label)
 
+    num_threads : int, default 8
+        Number of threads listing the class folders in parallel.
+    index_file : str, default None
+        If given, the list of images is saved to this file, and loaded from
+        it instead of listing the folders as long as the modification times
+        of `root` and of the class folders are unchanged.
+
     Attributes
     ----------
     synsets : list
         List of class names. `synsets[i]` is the name for the integer label `i`
     items : list of tuples
-        List of all images in (filename, label) pairs.
+        All images as (filename, label) pairs. The list is built on first
+        access; until then file names are kept in a single string table,
+        which stays small and is not copied into forked worker processes.
     """
-    def __init__(self, root, flag=1, transform=None):
+    def __init__(self, root, flag=1, transform=None, num_threads=8, index_file=None):
         self._root = os.path.expanduser(root)
         self._flag = flag
         self._transform = transform
         self._exts = ['.jpg', '.jpeg', '.png']
-        self._list_images(self._root)
+        self._num_threads = num_threads
+        self._item_list = None
+        self._list_images(self._root, index_file)
 
-    def _list_images(self, root):
-        self.synsets = []
-        self.items = []
+    @property
+    def items(self):
+        if self._item_list is None:
+            self._item_list = [self._items[i] for i in range(len(self._items))]
+        return self._item_list
+
+    @items.setter
+    def items(self, items):
+        self._item_list = items
 
-        for folder in sorted(os.listdir(root)):
-            path = os.path.join(root, folder)
-            if not os.path.isdir(path):
-                warnings.warn('Ignoring %s, which is not a directory.'%path, stacklevel=3)
+    def _list_images(self, root, index_file=None):
+        self.synsets = []
+        for folder, is_dir in sorted(_list_dir(root)):
+            if not is_dir:
+                warnings.warn('Ignoring %s, which is not a directory.'%os.path.join(root, folder),
+                              stacklevel=3)
                 continue
-            label = len(self.synsets)
             self.synsets.append(folder)
-            for filename in sorted(os.listdir(path)):
-                filename = os.path.join(path, filename)
+        paths = [root] + [os.path.join(root, folder) for folder in self.synsets]
+
+        pool = ThreadPool(self._num_threads)
+        try:
+            mtimes = None
+            if index_file is not None:
+                mtimes = np.array(pool.map(lambda path: os.stat(path).st_mtime, paths))
+                if os.path.isfile(index_file):
+                    with np.load(index_file) as index:
+                        if [_to_str(f) for f in index['synsets']] == self.synsets and \
+                                np.array_equal(index['mtimes'], mtimes):
+                            self._items = _ImageFolderItems(root, self.synsets, index['names'],
+                                                            index['offsets'], index['labels'])
+                            return
+            listings = pool.map(lambda path: sorted(name for name, _ in _list_dir(path)),
+                                paths[1:])
+        finally:
+            pool.close()
+
+        names, offsets, labels = [], [0], []
+        for label, (path, listing) in enumerate(zip(paths[1:], listings)):
+            for filename in listing:
                 ext = os.path.splitext(filename)[1]
                 if ext.lower() not in self._exts:
                     warnings.warn('Ignoring %s of type %s. Only support %s'%(
-                        filename, ext, ', '.join(self._exts)))
+                        os.path.join(path, filename), ext, ', '.join(self._exts)))
                     continue
-                self.items.append((filename, label))
+                name = _to_bytes(filename)
+                names.append(name)
+                offsets.append(offsets[-1] + len(name))
+                labels.append(label)
+        names = np.frombuffer(b''.join(names), dtype=np.uint8)
+        offsets = np.array(offsets, dtype=np.int64)
+        labels = np.array(labels, dtype=np.int32)
+        self._items = _ImageFolderItems(root, self.synsets, names, offsets, labels)
+
+        if index_file is not None:
+            # write to a temporary file first, so that concurrent runs never read a partial index
+            tmp_file = '%s.%d.tmp'%(index_file, os.getpid())
+            with open(tmp_file, 'wb') as fout:
+                np.savez(fout, synsets=np.array([_to_bytes(f) for f in self.synsets]),
+                         mtimes=mtimes, names=names, offsets=offsets, labels=labels)
+            if os.path.exists(index_file):
+                os.remove(index_file)
+            os.rename(tmp_file, index_file)
 
     def __getitem__(self, idx):
-        img = image.imread(self.items[idx][0], self._flag)
-        label = self.items[idx][1]
+        items = self._items if self._item_list is None else self._item_list
+        filename, label = items[idx]
+        img = image.imread(filename, self._flag)
         if self._transform is not None:
             return self._transform(img, label)
         return img, label
 
     def __len__(self):
-        return len(self.items)
+        if self._item_list is None:
+            return len(self._items)
+        return len(self._item_list)
+
+
+def _to_bytes(name):
+    """Encodes a file name returned by os.listdir."""
+    return os.fsencode(name) if hasattr(os, 'fsencode') else name
+
+
+def _to_str(name):
+    """Decodes a file name encoded by _to_bytes."""
+    if isinstance(name, np.ndarray):
+        name = name.tobytes()
+    return os.fsdecode(name) if hasattr(os, 'fsdecode') else bytes(name)
+
+
+def _list_dir(path):
+    """(name, is_dir) pairs of the entries of a folder. os.scandir, when available,
+    gets whether entries are folders without a stat call per entry."""
+    if hasattr(os, 'scandir'):
+        return [(entry.name, entry.is_dir()) for entry in os.scandir(path)]
+    return [(name, os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]
+
+
+class _ImageFolderItems(object):
+    """(filename, label) pairs of an ImageFolderDataset, with the file names
+    concatenated in a uint8 array indexed by offsets."""
+    def __init__(self, root, synsets, names, offsets, labels):
+        self._root = root
+        self._synsets = synsets
+        self._names = names
+        self._offsets = offsets
+        self._labels = labels
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('index %d is out of range'%idx)
+        label = int(self._labels[idx])
+        name = _to_str(self._names[self._offsets[idx]:self._offsets[idx + 1]])
+        return os.path.join(self._root, self._synsets[label], name), label
@@ -19,9 +19,14 @@
 # pylint: disable= arguments-differ
 "Image transforms."
 
+import math
+
+import numpy as np
+
 from ...block import Block, HybridBlock
 from ...nn import Sequential, HybridSequential
 from .... import image
+from .... import ndarray as nd
 from ....base import numeric_types
 
 
@@ -296,3 +301,437 @@ class RandomLighting(HybridBlock):
 
     def hybrid_forward(self, F, x):
         return F.image.random_lighting(x, self._alpha)
+
+
+def _batch_base(F, x):
+    """Zeros of shape (N, 1, 1, 1), to draw per sample random parameters."""
+    return F.zeros_like(F.slice(x, begin=(None, 0, 0, 0), end=(None, 1, 1, 1)))
+
+
+def _batch_factor(F, base, low, high, p, default):
+    """Per sample factors uniform in `[low, high)`, `default` with probability `1 - p`."""
+    factor = F.random.uniform(base + low, base + high)
+    if p < 1:
+        mask = F.random.uniform(base, base + 1) < p
+        factor = mask * factor + (1 - mask) * default
+    return factor
+
+
+def _batch_gray(F, x, layout):
+    """Luma of a batch, with a single channel."""
+    axis = layout.find('C')
+    coef = (0.299, 0.587, 0.114)
+    return sum(F.slice_axis(x, axis=axis, begin=i, end=i + 1) * c for i, c in enumerate(coef))
+
+
+def _batch_blend(F, x, y, factor):
+    """``x * factor + y * (1 - factor)`` with broadcasting."""
+    return F.broadcast_add(F.broadcast_mul(x, factor), F.broadcast_mul(y, 1 - factor))
+
+
+class RandomFlipLeftRightBatch(HybridBlock):
+    """Randomly flip every image of a batch left to right, independently
+    with probability `p`.
+
+    Parameters
+    ----------
+    p : float, default 0.5
+        Probability to flip an image.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    def __init__(self, p=0.5, layout='NCHW'):
+        super(RandomFlipLeftRightBatch, self).__init__()
+        self._p = p
+        self._layout = layout
+
+    def hybrid_forward(self, F, x):
+        base = F.reshape(_batch_base(F, x), shape=(-1,))
+        mask = F.random.uniform(base, base + 1) < self._p
+        return F.where(mask, F.flip(x, axis=self._layout.find('W')), x)
+
+
+class RandomBrightnessBatch(HybridBlock):
+    """Randomly jitters the brightness of every image of a batch with a factor
+    chosen from `[max(0, 1 - brightness), 1 + brightness]`.
+
+    Unlike `RandomBrightness`, which handles one image per call, the factors of
+    all images are drawn and applied by a few operators on the whole batch, e.g.
+    after batchify in the DataLoader workers or on the device.
+
+    Parameters
+    ----------
+    brightness : float
+        How much to jitter brightness.
+    p : float, default 1
+        Probability to jitter an image, the other images are left unchanged.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    def __init__(self, brightness, p=1.0, layout='NCHW'):
+        super(RandomBrightnessBatch, self).__init__()
+        self._args = (max(0, 1-brightness), 1+brightness, p, 1)
+        self._layout = layout
+
+    def hybrid_forward(self, F, x):
+        factor = _batch_factor(F, _batch_base(F, x), *self._args)
+        return F.broadcast_mul(x, factor)
+
+
+class RandomContrastBatch(HybridBlock):
+    """Randomly jitters the contrast of every image of a batch with a factor
+    chosen from `[max(0, 1 - contrast), 1 + contrast]`.
+
+    Parameters
+    ----------
+    contrast : float
+        How much to jitter contrast.
+    p : float, default 1
+        Probability to jitter an image, the other images are left unchanged.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    def __init__(self, contrast, p=1.0, layout='NCHW'):
+        super(RandomContrastBatch, self).__init__()
+        self._args = (max(0, 1-contrast), 1+contrast, p, 1)
+        self._layout = layout
+
+    def hybrid_forward(self, F, x):
+        factor = _batch_factor(F, _batch_base(F, x), *self._args)
+        axes = (self._layout.find('H'), self._layout.find('W'))
+        mean = F.mean(_batch_gray(F, x, self._layout), axis=axes, keepdims=True)
+        return _batch_blend(F, x, mean, factor)
+
+
+class RandomSaturationBatch(HybridBlock):
+    """Randomly jitters the saturation of every image of a batch with a factor
+    chosen from `[max(0, 1 - saturation), 1 + saturation]`.
+
+    Parameters
+    ----------
+    saturation : float
+        How much to jitter saturation.
+    p : float, default 1
+        Probability to jitter an image, the other images are left unchanged.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    def __init__(self, saturation, p=1.0, layout='NCHW'):
+        super(RandomSaturationBatch, self).__init__()
+        self._args = (max(0, 1-saturation), 1+saturation, p, 1)
+        self._layout = layout
+
+    def hybrid_forward(self, F, x):
+        factor = _batch_factor(F, _batch_base(F, x), *self._args)
+        return _batch_blend(F, x, _batch_gray(F, x, self._layout), factor)
+
+
+class RandomColorJitterBatch(HybridSequential):
+    """Randomly jitters the brightness, contrast and saturation of every image
+    of a batch, in this order.
+
+    Hue is not supported, its conversion through HLS does not vectorize; use
+    `RandomHue` per image instead.
+
+    Parameters
+    ----------
+    brightness : float
+        How much to jitter brightness.
+    contrast : float
+        How much to jitter contrast.
+    saturation : float
+        How much to jitter saturation.
+    p : float, default 1
+        Probability to apply each jitter to an image.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    def __init__(self, brightness=0, contrast=0, saturation=0, p=1.0, layout='NCHW'):
+        super(RandomColorJitterBatch, self).__init__()
+        with self.name_scope():
+            if brightness > 0:
+                self.add(RandomBrightnessBatch(brightness, p, layout))
+            if contrast > 0:
+                self.add(RandomContrastBatch(contrast, p, layout))
+            if saturation > 0:
+                self.add(RandomSaturationBatch(saturation, p, layout))
+
+
+class RandomLightingBatch(HybridBlock):
+    """Add AlexNet-style PCA-based noise to every image of a batch.
+
+    The noise is scaled for pixel values in `[0, 255]`, like `RandomLighting`;
+    divide `alpha` by 255 for images in `[0, 1]`.
+
+    Parameters
+    ----------
+    alpha : float
+        Intensity of the image.
+    p : float, default 1
+        Probability to add noise to an image.
+    layout : str, default 'NCHW'
+        Layout of the batch, 'NCHW' or 'NHWC'.
+    """
+    _eig = ((55.46 * -0.5675, 4.794 * 0.7192, 1.148 * 0.4009),
+            (55.46 * -0.5808, 4.794 * -0.0045, 1.148 * -0.8140),
+            (55.46 * -0.5836, 4.794 * -0.6948, 1.148 * 0.4203))
+
+    def __init__(self, alpha, p=1.0, layout='NCHW'):
+        super(RandomLightingBatch, self).__init__()
+        self._alpha = alpha
+        self._p = p
+        self._layout = layout
+
+    def hybrid_forward(self, F, x):
+        base = _batch_base(F, x)
+        alpha = [F.random.normal(base, base + self._alpha) for _ in range(3)]
+        if self._p < 1:
+            mask = F.random.uniform(base, base + 1) < self._p
+            alpha = [a * mask for a in alpha]
+        offset = [sum(a * e for a, e in zip(alpha, eig)) for eig in self._eig]
+        offset = F.concat(*offset, dim=self._layout.find('C'))
+        return F.broadcast_add(x, offset)
+
+
+def _warp_pair(img, mask, matrix, size, fill_value, ignore_label):
+    """Warp an HWC image bilinearly and an HW mask with nearest neighbours.
+
+    `matrix` is the 3x3 affine map from output to input pixel coordinates and
+    `size` the output (w, h). The sampling grid is generated once and shared.
+    """
+    h_in, w_in = img.shape[:2]
+    w, h = size
+    # pixel to [-1, 1] coordinates of the output and the input
+    def normalize(width, height):
+        return np.array([[2. / max(width - 1, 1), 0, -1],
+                         [0, 2. / max(height - 1, 1), -1],
+                         [0, 0, 1]])
+    theta = normalize(w_in, h_in).dot(matrix).dot(np.linalg.inv(normalize(w, h)))
+    grid = nd.GridGenerator(nd.array(theta[:2].reshape((1, 6)), ctx=img.context),
+                            transform_type='affine', target_shape=(h, w))
+
+    data = nd.transpose(img.astype('float32'), axes=(2, 0, 1)).expand_dims(0)
+    # the sampler pads with zeros, shift so that the padding is fill_value
+    data = nd.BilinearSampler(data - fill_value, grid) + fill_value
+    data = nd.transpose(data[0], axes=(1, 2, 0))
+    if img.dtype == np.uint8:
+        data = nd.clip(nd.round(data), 0, 255)
+    out_img = data.astype(img.dtype)
+
+    x = nd.round((grid[0][0] + 1) * (w_in - 1) / 2)
+    y = nd.round((grid[0][1] + 1) * (h_in - 1) / 2)
+    valid = (x >= 0) * (x <= w_in - 1) * (y >= 0) * (y <= h_in - 1)
+    index = nd.clip(y, 0, h_in - 1) * w_in + nd.clip(x, 0, w_in - 1)
+    label = nd.take(mask.reshape((-1,)).astype('float32'), index)
+    out_mask = nd.where(valid, label, nd.full(label.shape, ignore_label, ctx=label.context))
+    return out_img, out_mask.astype(mask.dtype)
+
+
+class ComposePair(Block):
+    """Sequentially composes transforms of an image and its label mask.
+
+    Parameters
+    ----------
+    transforms : list of callable
+        Transforms taking and returning an ``(image, mask)`` pair.
+
+    Examples
+    --------
+    >>> transform = transforms.ComposePair([
+    ...     transforms.RandomScalePair(0.5, 2),
+    ...     transforms.FlipPair(),
+    ...     transforms.RandomCropPair((512, 512))])
+    >>> dataset = gluon.data.vision.ImageSegRecordDataset('train.rec', transform=transform)
+    """
+    def __init__(self, transforms):
+        super(ComposePair, self).__init__()
+        self._transforms = transforms
+        for t in transforms:
+            if isinstance(t, Block):
+                self.register_child(t)
+
+    def forward(self, img, mask):
+        for t in self._transforms:
+            img, mask = t(img, mask)
+        return img, mask
+
+
+def _uniform(n):
+    """`n` samples from U(0, 1), drawn with the mxnet generator so that
+    `mx.random.seed` controls the pair transforms."""
+    return nd.random.uniform(shape=(n,)).asnumpy().astype(np.float64)
+
+
+def _randint(u, low, high):
+    """Maps a sample `u` of U(0, 1) to an integer in [low, high]."""
+    return low + min(int(u * (high - low + 1)), high - low)
+
+
+class FlipPair(Block):
+    """Randomly flip an HWC image and its HW label mask left to right.
+
+    Parameters
+    ----------
+    p : float, default 0.5
+        Probability to flip.
+    """
+    def __init__(self, p=0.5):
+        super(FlipPair, self).__init__()
+        self._p = p
+
+    def forward(self, img, mask):
+        if _uniform(1)[0] < self._p:
+            return nd.flip(img, axis=1), nd.flip(mask, axis=1)
+        return img, mask
+
+
+class RandomScalePair(Block):
+    """Resize an HWC image and its HW label mask by a random factor, the image
+    with bilinear and the mask with nearest neighbour interpolation.
+
+    Parameters
+    ----------
+    min_scale : float
+        Minimum scale factor.
+    max_scale : float
+        Maximum scale factor.
+    """
+    def __init__(self, min_scale, max_scale):
+        super(RandomScalePair, self).__init__()
+        self._args = (min_scale, max_scale)
+
+    def forward(self, img, mask):
+        min_scale, max_scale = self._args
+        scale = min_scale + _uniform(1)[0] * (max_scale - min_scale)
+        h, w = img.shape[:2]
+        new_w, new_h = max(int(w * scale + 0.5), 1), max(int(h * scale + 0.5), 1)
+        img = image.imresize(img, new_w, new_h, interp=1)
+        mask = image.imresize(mask.expand_dims(2), new_w, new_h, interp=0)
+        return img, mask.reshape((new_h, new_w))
+
+
+class RandomCropPair(Block):
+    """Crop the same random area of an HWC image and its HW label mask. Inputs
+    smaller than the crop are padded, the image with `fill_value` and the mask
+    with `ignore_label`.
+
+    Parameters
+    ----------
+    size : int or tuple of (W, H)
+        Size of the crop.
+    fill_value : float, default 0
+        Padding value of the image.
+    ignore_label : int, default 255
+        Padding value of the mask.
+    """
+    def __init__(self, size, fill_value=0, ignore_label=255):
+        super(RandomCropPair, self).__init__()
+        if isinstance(size, numeric_types):
+            size = (size, size)
+        self._size = size
+        self._fill_value = fill_value
+        self._ignore_label = ignore_label
+
+    def forward(self, img, mask):
+        w, h = self._size
+        src_h, src_w = img.shape[:2]
+        pad_h, pad_w = max(h - src_h, 0), max(w - src_w, 0)
+        if pad_h > 0 or pad_w > 0:
+            img = image.copyMakeBorder(img, 0, pad_h, 0, pad_w, type=0,
+                                       values=(self._fill_value,) * img.shape[2])
+            mask = image.copyMakeBorder(mask.expand_dims(2), 0, pad_h, 0, pad_w, type=0,
+                                        values=(self._ignore_label,))
+            mask = mask.reshape(mask.shape[:2])
+            src_h, src_w = img.shape[:2]
+        u = _uniform(2)
+        x0 = _randint(u[0], 0, src_w - w)
+        y0 = _randint(u[1], 0, src_h - h)
+        img = nd.slice(img, begin=(y0, x0, None), end=(y0 + h, x0 + w, None))
+        mask = nd.slice(mask, begin=(y0, x0), end=(y0 + h, x0 + w))
+        return img, mask
+
+
+class RandomRotatePair(Block):
+    """Rotate an HWC image and its HW label mask around their center by a
+    random angle, keeping their size. Areas outside the input are filled with
+    `fill_value` in the image and `ignore_label` in the mask.
+
+    Parameters
+    ----------
+    max_angle : float
+        Maximum rotation in degrees, the angle is chosen from
+        `[-max_angle, max_angle]`.
+    fill_value : float, default 0
+        Padding value of the image.
+    ignore_label : int, default 255
+        Padding value of the mask.
+    """
+    def __init__(self, max_angle, fill_value=0, ignore_label=255):
+        super(RandomRotatePair, self).__init__()
+        self._affine = RandomAffinePair(None, max_angle=max_angle, flip=False,
+                                        fill_value=fill_value, ignore_label=ignore_label)
+
+    def forward(self, img, mask):
+        return self._affine(img, mask)
+
+
+class RandomAffinePair(Block):
+    """Randomly scale, rotate, flip and crop an HWC image and its HW label mask
+    in a single warp.
+
+    The geometry is sampled once and composed into one affine map, the image
+    is then sampled bilinearly and the mask with nearest neighbours, so that
+    chaining `RandomScalePair`, `RandomRotatePair`, `FlipPair` and
+    `RandomCropPair` costs a single resampling. Areas outside the input are
+    filled with `fill_value` in the image and `ignore_label` in the mask.
+
+    Parameters
+    ----------
+    size : tuple of (W, H) or None
+        Size of the output, the input size if None. The crop is chosen at
+        random within the scaled and rotated input.
+    scale : tuple of (min, max), default (1, 1)
+        Range of the scale factor.
+    max_angle : float, default 0
+        Maximum rotation in degrees.
+    flip : bool, default True
+        Whether to flip left to right with probability 0.5.
+    fill_value : float, default 0
+        Padding value of the image.
+    ignore_label : int, default 255
+        Padding value of the mask.
+    """
+    def __init__(self, size, scale=(1, 1), max_angle=0, flip=True, fill_value=0,
+                 ignore_label=255):
+        super(RandomAffinePair, self).__init__()
+        if isinstance(size, numeric_types):
+            size = (size, size)
+        self._size = size
+        self._scale = scale
+        self._max_angle = max_angle
+        self._flip = flip
+        self._fill_value = fill_value
+        self._ignore_label = ignore_label
+
+    def forward(self, img, mask):
+        h, w = img.shape[:2]
+        out_w, out_h = self._size if self._size is not None else (w, h)
+        u = _uniform(5)
+        scale = self._scale[0] + u[0] * (self._scale[1] - self._scale[0])
+        angle = math.radians((2 * u[1] - 1) * self._max_angle)
+        cx, cy = (w - 1) / 2., (h - 1) / 2.
+        # input to output pixel coordinates: flip, scale and rotate about the center
+        forward = np.array([[1., 0, -cx], [0, 1, -cy], [0, 0, 1]])
+        if self._flip and u[2] < 0.5:
+            forward = np.diag([-1., 1, 1]).dot(forward)
+        cos, sin = math.cos(angle) * scale, math.sin(angle) * scale
+        forward = np.array([[cos, -sin, 0], [sin, cos, 0], [0, 0, 1]]).dot(forward)
+        # then crop at a random offset within the scaled input
+        scaled_w, scaled_h = w * scale, h * scale
+        ox = u[3] * (scaled_w - out_w) if scaled_w > out_w else (scaled_w - out_w) / 2.
+        oy = u[4] * (scaled_h - out_h) if scaled_h > out_h else (scaled_h - out_h) / 2.
+        forward = np.array([[1., 0, (scaled_w - 1) / 2. - ox],
+                            [0, 1, (scaled_h - 1) / 2. - oy],
+                            [0, 0, 1]]).dot(forward)
+        return _warp_pair(img, mask, np.linalg.inv(forward), (out_w, out_h),
+                          self._fill_value, self._ignore_label)
@@ -28,7 +28,7 @@ import numpy as np
 
 
 from ..base import mx_real_t, MXNetError
-from .. import symbol, ndarray, initializer, context
+from .. import symbol, ndarray, initializer, context, checkpoint
 from ..context import Context
 from .. import autograd
 from .utils import _indent
@@ -108,6 +108,7 @@ class Parameter(object):
         self._differentiable = differentiable
         self._allow_deferred_init = allow_deferred_init
         self._grad_req = None
+        self._grad_hooks = []
         self._shape = shape
         self.name = name
         self.dtype = dtype
@@ -189,8 +190,9 @@ class Parameter(object):
             "because the later does not include Parameters of " \
             "nested child Blocks"%(self.name))
 
-    def _load_init(self, data, ctx):
-        """(Re)initializes by loading from data."""
+    def _load_init(self, data, ctx, share=False):
+        """(Re)initializes by loading from data. With share, data may be used as
+        the array of this parameter on its context instead of a copy."""
         if self.shape:
             for self_dim, data_dim in zip(self.shape, data.shape):
                 assert self_dim == 0 or self_dim == data_dim, \
@@ -211,7 +213,7 @@ class Parameter(object):
                     "Failed to load Parameter %s on %s because it was " \
                     "previous initialized on %s."%(
                         self.name, str(ctx), str(self.list_ctx()))
-            self._init_impl(data, ctx)
+            self._init_impl(data, ctx, share)
         else:
             assert set(ctx) == set(self.list_ctx()), \
                 "Failed to load Parameter %s on %s because it was " \
@@ -241,7 +243,7 @@ class Parameter(object):
 
             self._init_impl(data, ctx)
 
-    def _init_impl(self, data, ctx_list):
+    def _init_impl(self, data, ctx_list, share=False):
         """Sets data and grad."""
         self._ctx_list = list(ctx_list)
         self._ctx_map = []
@@ -253,7 +255,8 @@ class Parameter(object):
                 dev_list.append(None)
             dev_list[ctx.device_id] = i
 
-        self._data = [data.copyto(ctx) for ctx in self._ctx_list]
+        self._data = [data if share and ctx == data.context else data.copyto(ctx)
+                      for ctx in self._ctx_list]
         self._init_grad()
 
     def _init_grad(self):
@@ -433,6 +436,38 @@ class Parameter(object):
         for i in self._grad:
             i[:] = 0
 
+    def register_grad_hook(self, hook):
+        """Registers a function called when backward finishes writing a gradient
+        of this parameter.
+
+        `hook(param, grad)` is called once per context for every backward pass that
+        makes the gradient on that context fresh, from an engine thread as soon as
+        the gradient is computed. It must not wait for the engine, e.g. by calling
+        `asnumpy` or `wait_to_read`.
+
+        Parameters
+        ----------
+        hook : callable
+            Function taking this parameter and the gradient NDArray.
+        """
+        self._grad_hooks.append(hook)
+        autograd._watch_backward(self)
+
+    def _before_backward(self):
+        if not self._grad_hooks or self._grad is None:
+            return []
+        return [i for i, data in enumerate(self._data) if not data._fresh_grad]
+
+    def _after_backward(self, stale):
+        for i in stale:
+            if self._data[i]._fresh_grad:
+                grad = self._grad[i]
+                autograd._call_on_ready(grad, lambda grad=grad: self._run_grad_hooks(grad))
+
+    def _run_grad_hooks(self, grad):
+        for hook in self._grad_hooks:
+            hook(self, grad)
+
     def var(self):
         """Returns a symbol representing this parameter."""
         if self._var is None:
@@ -706,24 +741,60 @@ class ParameterDict(object):
         arg_dict = {}
         for param in self.values():
             weight = param._reduce()
-            if not param.name.startswith(strip_prefix):
-                raise ValueError(
-                    "Prefix %s is to be striped before saving, but Parameter " \
-                    "%s does not start with %s. If you are using Block.save_params, " \
-                    "This may be due to your Block shares parameters from other " \
-                    "Blocks or you forgot to use ``with name_scope()`` during init. " \
-                    "Consider switching to Block.collect_params.save and " \
-                    "Block.collect_params.load instead."%(
-                        strip_prefix, param.name, strip_prefix))
-            arg_dict[param.name[len(strip_prefix):]] = weight
+            arg_dict[self._strip_name(param, strip_prefix)] = weight
         ndarray.save(filename, arg_dict)
 
+    def save_checkpoint(self, path, strip_prefix='', background=True, shard_size=None,
+                        num_threads=4):
+        """Save parameters to a sharded checkpoint directory, see `mxnet.checkpoint`.
+
+        Parameters are reduced and snapshotted on their devices, then copied out and
+        written while training continues. `load` reads the checkpoint one shard at
+        a time.
+
+        path : str
+            Path to checkpoint directory.
+        strip_prefix : str, default ''
+            Strip prefix from parameter names before saving.
+        background : bool, default True
+            Whether to write in a background thread.
+        shard_size : int, optional
+            Size in bytes of the shard files, 256MB by default.
+        num_threads : int, default 4
+            Number of shards written in parallel.
+
+        Returns
+        -------
+        CheckpointFuture
+            Handle to wait for the checkpoint.
+        """
+        arrays = []
+        for param in self.values():
+            name = self._strip_name(param, strip_prefix)
+            arrays.append((name, checkpoint._snapshot_mean(param.list_data())))
+        job = checkpoint._save_job(path, arrays, shard_size, num_threads)
+        return checkpoint.CheckpointFuture([job], background)
+
+    @staticmethod
+    def _strip_name(param, strip_prefix):
+        if not param.name.startswith(strip_prefix):
+            raise ValueError(
+                "Prefix %s is to be striped before saving, but Parameter " \
+                "%s does not start with %s. If you are using Block.save_params, " \
+                "This may be due to your Block shares parameters from other " \
+                "Blocks or you forgot to use ``with name_scope()`` during init. " \
+                "Consider switching to Block.collect_params.save and " \
+                "Block.collect_params.load instead."%(
+                    strip_prefix, param.name, strip_prefix))
+        return param.name[len(strip_prefix):]
+
     def load(self, filename, ctx, allow_missing=False,
-             ignore_extra=False, restore_prefix=''):
+             ignore_extra=False, restore_prefix='', mmap=False):
         """Load parameters from file.
 
         filename : str
-            Path to parameter file.
+            Path to parameter file, or checkpoint directory written by
+            `save_checkpoint`, which is loaded one shard at a time.
         ctx : Context or list of Context
             Context(s) initialize loaded parameters on.
         allow_missing : bool, default False
@@ -733,6 +804,12 @@ class ParameterDict(object):
             present in this ParameterDict.
         restore_prefix : str, default ''
             prepend prefix to names of stored parameters before loading.
+        mmap : bool, default False
+            Whether to map the shards of a checkpoint directory into memory instead
+            of reading them. Uninitialized parameters loaded on cpu then use the
+            mapped pages, which are shared by all processes loading the checkpoint
+            until the parameters are modified. Parameters on other contexts are
+            copied from the mapped pages one at a time.
         """
         if restore_prefix:
             for name in self.keys():
@@ -740,17 +817,27 @@ class ParameterDict(object):
                     "restore_prefix is %s but Parameters name %s does not start " \
                     "with %s"%(restore_prefix, name, restore_prefix)
         lprefix = len(restore_prefix)
-        loaded = [(k[4:] if k.startswith('arg:') or k.startswith('aux:') else k, v) \
-                  for k, v in ndarray.load(filename).items()]
-        arg_dict = {restore_prefix+k: v for k, v in loaded}
+        if checkpoint.is_checkpoint(filename):
+            names = checkpoint.list_arrays(filename)
+            loaded = checkpoint.iter_load(
+                filename, ctx[0] if isinstance(ctx, (list, tuple)) else ctx, mmap=mmap)
+            share = True
+        else:
+            loaded = list(ndarray.load(filename).items())
+            names = [k for k, _ in loaded]
+            share = False
+        names = [restore_prefix+(k[4:] if k.startswith('arg:') or k.startswith('aux:') else k)
+                 for k in names]
         if not allow_missing:
+            name_set = set(names)
             for name in self.keys():
-                assert name in arg_dict, \
+                assert name in name_set, \
                     "Parameter %s is missing in file %s"%(name[lprefix:], filename)
-        for name in arg_dict:
+        for name in names:
             if name not in self._params:
                 assert ignore_extra, \
                     "Parameter %s loaded from file %s is not present in ParameterDict"%(
                         name[lprefix:], filename)
-                continue
-            self[name]._load_init(arg_dict[name], ctx)
+        for name, value in zip(names, (v for _, v in loaded)):
+            if name in self._params:
+                self[name]._load_init(value, ctx, share)
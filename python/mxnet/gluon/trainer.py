@@ -20,8 +20,15 @@
 """Parameter optimizer."""
 __all__ = ['Trainer']
 
+import pickle
+import threading
+import weakref
+from functools import partial
+
+from .. import autograd
+from .. import checkpoint
 from .. import optimizer as opt
-from ..model import _create_kvstore
+from ..model import _create_kvstore, _get_bucket_size, _GradientBuckets
 from .parameter import ParameterDict, Parameter
 
 class Trainer(object):
@@ -49,6 +56,24 @@ class Trainer(object):
         on the type of compression being used. For example, 2bit compression requires a threshold.
         Arguments would then be {'type':'2bit', 'threshold':0.5}
         See mxnet.KVStore.set_gradient_compression method for more details on gradient compression.
+    bucket_size : int, optional
+        Size in bytes of the buckets that gradients of consecutive Parameters are
+        coalesced into before being reduced by kvstore, so that small gradients are
+        sent with one message per bucket. Defaults to the environment variable
+        `MXNET_KVSTORE_BUCKET_SIZE`, 0 disables bucketing. With bucketing the
+        optimizer is always applied on the workers instead of on kvstore.
+        Bucketing is not supported with asynchronous distributed kvstores.
+    overlap_comm : bool, optional, default=False
+        Whether to push each gradient, or gradient bucket, to kvstore as soon as
+        backward has computed it on all contexts, so that communication overlaps
+        with the rest of backward. `step` then only reduces the gradients that
+        were not ready and applies the updates. The optimizer is applied on the
+        workers instead of on kvstore. Gradients are reduced in place while
+        backward runs, so code that reads or modifies them between backward and
+        `step`, e.g. to clip them, sees local or reduced gradients depending on
+        timing. Each gradient must be written by one backward pass per step;
+        gradients of Parameters with `grad_req='add'` are only reduced by `step`.
+        Not supported with asynchronous distributed kvstores.
 
     Properties
     ----------
@@ -57,7 +82,7 @@ class Trainer(object):
         optimizer, its learning rate can be accessed as optimizer.learning_rate.
     """
     def __init__(self, params, optimizer, optimizer_params=None, kvstore='device',
-                 compression_params=None):
+                 compression_params=None, bucket_size=None, overlap_comm=False):
         if isinstance(params, (dict, ParameterDict)):
             params = list(params.values())
         if not isinstance(params, (list, tuple)):
@@ -78,6 +103,11 @@ class Trainer(object):
         self._init_optimizer(optimizer, optimizer_params)
         self._kv_initialized = False
         self._kvstore = kvstore
+        self._bucket_size = bucket_size
+        self._grad_buckets = None
+        self._overlap_comm = overlap_comm
+        if overlap_comm:
+            self._init_overlap()
 
     def _check_contexts(self):
         contexts = None
@@ -112,12 +142,24 @@ class Trainer(object):
         if kvstore:
             if self._compression_params:
                 kvstore.set_gradient_compression(self._compression_params)
-            if 'dist' in kvstore.type:
+            bucket_size = _get_bucket_size(self._bucket_size)
+            if 'async' in kvstore.type:
+                # servers of async kvstores do not sum the pushed gradients
+                if self._bucket_size or self._overlap_comm:
+                    raise ValueError(
+                        "bucket_size and overlap_comm are not supported with " \
+                        "kvstore %s."%kvstore.type)
+                bucket_size = 0
+            if 'dist' in kvstore.type or bucket_size or self._overlap_comm:
                 update_on_kvstore = False
             for i, param in enumerate(self._params):
                 param_arrays = param.list_data()
                 kvstore.init(i, param_arrays[0])
                 kvstore.pull(i, param_arrays, priority=-i)
+            if bucket_size or self._overlap_comm:
+                self._grad_buckets = _GradientBuckets(list(range(len(self._params))),
+                                                      self._grad_arrays(), bucket_size)
+                self._grad_buckets.init(kvstore)
             if update_on_kvstore:
                 kvstore.set_optimizer(self._optimizer)
             self._kvstore = kvstore
@@ -127,7 +169,66 @@ class Trainer(object):
             self._update_on_kvstore = None
 
         self._kv_initialized = True
+        if self._overlap_comm and self._kvstore:
+            buckets = self._grad_buckets.buckets
+            with self._overlap_lock:
+                self._overlap_grads = self._grad_arrays()
+                self._bucket_of = {i: b for b, (_, group, _, _) in enumerate(buckets)
+                                   for i in group}
+                self._ready_counts = [0] * len(buckets)
+                self._reduced = [False] * len(buckets)
+
+    def _init_overlap(self):
+        self._overlap_lock = threading.Lock()
+        self._overlap_grads = None
+        self._overlap_error = None
+        self._param_index = {id(param): i for i, param in enumerate(self._params)}
+        hook = partial(_overlap_grad_hook, weakref.ref(self))
+        for param in self._params:
+            if param.grad_req != 'null':
+                param.register_grad_hook(hook)
+
+    def _grad_ready(self, param):
+        """Reduces the bucket of `param` once its gradients are ready on all contexts.
+        Called from engine threads."""
+        if param.grad_req == 'add':
+            # later backward passes of the step add to the gradient
+            return
+        with self._overlap_lock:
+            if self._overlap_grads is None:
+                return
+            bucket = self._bucket_of[self._param_index[id(param)]]
+            self._ready_counts[bucket] += 1
+            group = self._grad_buckets.buckets[bucket][1]
+            if self._ready_counts[bucket] == len(group) * len(self._contexts):
+                try:
+                    self._grad_buckets.reduce_bucket(self._kvstore, bucket,
+                                                     self._overlap_grads)
+                    self._reduced[bucket] = True
+                except Exception as e: # pylint: disable=broad-except
+                    self._overlap_error = e
 
+    def _reduce_grads(self):
+        """Reduces the gradients of all buckets that were not reduced during backward."""
+        if not self._overlap_comm:
+            self._grad_buckets.reduce(self._kvstore, self._grad_arrays())
+            return
+        autograd._wait_ready_callbacks()
+        with self._overlap_lock:
+            error, self._overlap_error = self._overlap_error, None
+            for bucket, reduced in enumerate(self._reduced):
+                if not reduced:
+                    self._grad_buckets.reduce_bucket(self._kvstore, bucket,
+                                                     self._overlap_grads)
+                self._reduced[bucket] = False
+                self._ready_counts[bucket] = 0
+        if error is not None:
+            raise error
+
+    def _grad_arrays(self):
+        """Gradients of each Parameter on each context, None if it has no gradient."""
+        return [param.list_grad() if param.grad_req != 'null' else [None]
+                for param in self._params]
 
     @property
     def learning_rate(self):
@@ -171,6 +272,8 @@ class Trainer(object):
 
         self._optimizer.rescale_grad = self._scale / batch_size
 
+        # updates per context, applied at once so that optimizers can fuse them
+        updates = [[] for _ in self._updaters]
         for i, param in enumerate(self._params):
             if param.grad_req == 'null':
                 continue
@@ -186,34 +289,62 @@ class Trainer(object):
                             "warning and skip updating of Parameters with stale gradient" \
                             %(param.name, str(data.context)))
 
-            if self._kvstore:
+            if self._kvstore and self._grad_buckets is None:
                 self._kvstore.push(i, param.list_grad(), priority=-i)
                 if self._update_on_kvstore:
                     self._kvstore.pull(i, param.list_data(), priority=-i)
-                    continue
                 else:
                     self._kvstore.pull(i, param.list_grad(), priority=-i)
 
-            for upd, arr, grad in zip(self._updaters, param.list_data(), param.list_grad()):
+        if self._grad_buckets is not None:
+            self._reduce_grads()
+
+        for i, param in enumerate(self._params):
+            if param.grad_req == 'null' or self._update_on_kvstore:
+                continue
+            for upd, arr, grad in zip(updates, param.list_data(), param.list_grad()):
                 if not ignore_stale_grad or arr._fresh_grad:
-                    upd(i, grad, arr)
+                    upd.append((i, grad, arr))
                     arr._fresh_grad = False
 
-    def save_states(self, fname):
+        for updater, upd in zip(self._updaters, updates):
+            if upd:
+                indices, grads, arrays = zip(*upd)
+                updater(list(indices), list(grads), list(arrays))
+
+    def save_states(self, fname, background=False):
         """Saves trainer states (e.g. optimizer, momentum) to a file.
 
         Parameters
         ----------
         fname : str
             Path to output states file.
+        background : bool, default False
+            Whether to snapshot the states on their devices and write them in a
+            background thread, so that training can continue meanwhile.
+
+        Returns
+        -------
+        CheckpointFuture
+            Handle to wait for the file, if `background` is True.
         """
         assert self._optimizer is not None
 
+        if not self._kv_initialized:
+            self._init_kvstore()
+
+        if background:
+            updater = self._kvstore._updater if self._update_on_kvstore else self._updaters[0]
+            optimizer = pickle.loads(pickle.dumps(updater.optimizer))
+            states = (checkpoint.snapshot(updater.states), optimizer)
+            return checkpoint.CheckpointFuture([checkpoint._pickle_job(fname, states)])
+
         if self._update_on_kvstore:
             self._kvstore.save_optimizer_states(fname, dump_optimizer=True)
         else:
             with open(fname, 'wb') as fout:
                 fout.write(self._updaters[0].get_states(dump_optimizer=True))
+        return None
 
     def load_states(self, fname):
         """Loads trainer states (e.g. optimizer, momentum) from a file.
@@ -236,3 +367,12 @@ class Trainer(object):
                 updater.set_states(states)
                 updater.optimizer = self._updaters[0].optimizer
             self._optimizer = self._updaters[0].optimizer
+        self._optimizer.param_dict = {i: param for i, param in enumerate(self._params)}
+
+
+def _overlap_grad_hook(trainer_ref, param, _):
+    """Gradient hook of Trainers with overlap_comm, holding a weak reference to
+    the Trainer so that discarded Trainers ignore later backward passes."""
+    trainer = trainer_ref()
+    if trainer is not None:
+        trainer._grad_ready(param) # pylint: disable=protected-access
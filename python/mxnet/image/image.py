@@ -96,6 +96,13 @@ def imdecode(buf, *args, **kwargs):
         1 for three channel color output. 0 for grayscale output.
     to_rgb : int, optional, default=1
         1 for RGB formatted output (MXNet default). 0 for BGR formatted output (OpenCV default).
+    min_size : int, optional, default=0
+        If positive, JPEG images are decoded at the smallest scale out of 1, 1/2, 1/4
+        and 1/8 at which their shorter edge is at least `min_size`. Scaling during
+        decoding is much faster than decoding at full size and resizing.
+    reduce : int, optional, default=0
+        If positive, JPEG images are decoded at 1/`reduce` of their size, one of
+        1, 2, 4 or 8. Overrides `min_size`.
     out : NDArray, optional
         Output buffer. Use `None` for automatic allocation.
 
@@ -130,6 +137,12 @@ def imdecode(buf, *args, **kwargs):
     >>> image = mx.img.imdecode(str_image, to_rgb=0)
     >>> image
     <NDArray 224x224x3 @cpu(0)>
+
+    Set `min_size` to decode a large JPEG directly at a reduced size
+
+    >>> image = mx.img.imdecode(str_image, min_size=256)
+    >>> image
+    <NDArray 300x400x3 @cpu(0)>
     """
     if not isinstance(buf, nd.NDArray):
         buf = nd.array(np.frombuffer(buf, dtype=np.uint8), dtype=np.uint8)
@@ -1203,7 +1216,10 @@ class ImageIter(io.DataIter):
 
     def imdecode(self, s):
         """Decodes a string or byte string to an NDArray.
-        See mx.img.imdecode for more details."""
+        See mx.img.imdecode for more details.
+
+        If the first augmenter is a `ResizeAug`, JPEG images are decoded at the
+        smallest reduced size that is still at least as large as its target."""
         def locate():
             """Locate the image file/index if decode fails."""
             if self.seq is not None:
@@ -1216,8 +1232,11 @@ class ImageIter(io.DataIter):
             else:
                 msg = "index: {}".format(idx)
             return "Broken image " + msg
+        kwargs = {}
+        if self.auglist and isinstance(self.auglist[0], ResizeAug):
+            kwargs['min_size'] = self.auglist[0].size
         try:
-            img = imdecode(s)
+            img = imdecode(s, **kwargs)
         except Exception as e:
             raise RuntimeError("{}, {}".format(locate(), e))
         return img
@@ -29,9 +29,9 @@ except ImportError:
     h5py = None
 import numpy as np
 from .base import _LIB
-from .base import c_str_array, mx_uint, py_str
+from .base import c_str, c_str_array, mx_uint, py_str, string_types
 from .base import DataIterHandle, NDArrayHandle
-from .base import mx_real_t
+from .base import mx_real_t, MXNetError
 from .base import check_call, build_param_doc as _build_param_doc
 from .ndarray import NDArray
 from .ndarray.sparse import CSRNDArray
@@ -781,15 +781,30 @@ class MXDataIter(DataIter):
     label_name : str, optional
         Label name. Default to "softmax_label".
 
+    If the iterator was created with `bucket_shapes`, every batch carries a
+    `bucket_key` of its (height, width) along with its own `provide_data` and
+    `provide_label`, so that it can feed a `BucketingModule`. The iterator's
+    `provide_data` and `default_bucket_key` then follow `data_shape`, which
+    should be at least as large as every bucket.
+
     See Also
     --------
     src/io : The underlying C++ data iterator implementation, e.g., `CSVIter`.
     """
-    def __init__(self, handle, data_name='data', label_name='softmax_label', **_):
+    def __init__(self, handle, data_name='data', label_name='softmax_label', **kwargs):
         super(MXDataIter, self).__init__()
         self.handle = handle
         # debug option, used to test the speed with io effect eliminated
         self._debug_skip_load = False
+        self._data_name = data_name
+        self._label_name = label_name
+        self._bucketed = bool(kwargs.get('bucket_shapes'))
+
+        # position before the first batch is read ahead, see get_state
+        try:
+            self._first_state = self._read_state()
+        except MXNetError:
+            self._first_state = None
 
         # load the first batch to get shape information
         self.first_batch = None
@@ -801,6 +816,16 @@ class MXDataIter(DataIter):
         self.provide_data = [DataDesc(data_name, data.shape, data.dtype)]
         self.provide_label = [DataDesc(label_name, label.shape, label.dtype)]
         self.batch_size = data.shape[0]
+        self.default_bucket_key = None
+        if self._bucketed:
+            data_shape = _shape_arg(kwargs['data_shape'])
+            label_scale = float(kwargs.get('label_scale', 1))
+            label_shape = tuple(int(x * label_scale) for x in data_shape[1:])
+            self.default_bucket_key = data_shape[1:]
+            self.provide_data = [DataDesc(data_name, (self.batch_size,) + data_shape,
+                                          data.dtype)]
+            self.provide_label = [DataDesc(label_name, (self.batch_size,) + label_shape,
+                                           label.dtype)]
 
     def __del__(self):
         check_call(_LIB.MXDataIterFree(self.handle))
@@ -819,8 +844,7 @@ class MXDataIter(DataIter):
 
     def next(self):
         if self._debug_skip_load and not self._debug_at_begin:
-            return  DataBatch(data=[self.getdata()], label=[self.getlabel()], pad=self.getpad(),
-                              index=self.getindex())
+            return self._current_batch()
         if self.first_batch is not None:
             batch = self.first_batch
             self.first_batch = None
@@ -829,11 +853,20 @@ class MXDataIter(DataIter):
         next_res = ctypes.c_int(0)
         check_call(_LIB.MXDataIterNext(self.handle, ctypes.byref(next_res)))
         if next_res.value:
-            return DataBatch(data=[self.getdata()], label=[self.getlabel()], pad=self.getpad(),
-                             index=self.getindex())
+            return self._current_batch()
         else:
             raise StopIteration
 
+    def _current_batch(self):
+        data = self.getdata()
+        label = self.getlabel()
+        batch = DataBatch(data=[data], label=[label], pad=self.getpad(), index=self.getindex())
+        if self._bucketed:
+            batch.bucket_key = tuple(data.shape[2:])
+            batch.provide_data = [DataDesc(self._data_name, data.shape, data.dtype)]
+            batch.provide_label = [DataDesc(self._label_name, label.shape, label.dtype)]
+        return batch
+
     def iter_next(self):
         if self.first_batch is not None:
             return True
@@ -870,6 +903,92 @@ class MXDataIter(DataIter):
         check_call(_LIB.MXDataIterGetPadNum(self.handle, ctypes.byref(pad)))
         return pad.value
 
+    def get_stats(self, reset=False):
+        """Returns runtime statistics of the underlying iterator.
+
+        Iterators that record statistics, e.g. `ImageSegRecordIter`, report
+        records and bytes read, throughput, per stage and per thread times in
+        milliseconds with their latency histograms, and the prefetch queue
+        occupancy. While the profiler is running the stages are also emitted
+        as profiler tasks and counters.
+
+        Parameters
+        ----------
+        reset : bool, default False
+            Whether to restart counting after reading the statistics.
+
+        Returns
+        -------
+        dict of str to float
+            Empty if the iterator does not record statistics.
+
+        Examples
+        --------
+        >>> stats = data_iter.get_stats(reset=True)
+        >>> stats['records_per_sec'], stats['image_decode_ms'], stats['queue_occupancy_mean']
+        """
+        size = mx_uint()
+        keys = ctypes.POINTER(ctypes.c_char_p)()
+        vals = ctypes.POINTER(ctypes.c_double)()
+        check_call(_LIB.MXDataIterGetStats(self.handle, ctypes.c_int(reset),
+                                           ctypes.byref(size), ctypes.byref(keys),
+                                           ctypes.byref(vals)))
+        return OrderedDict((py_str(keys[i]), vals[i]) for i in range(size.value))
+
+    def get_state(self):
+        """Returns the position of the iterator after the last returned batch.
+
+        Supported by `ImageRecordIter` and `ImageSegRecordIter` created with
+        ``path_imgidx`` and ``stateful=True``, and by `ImageSegRecordIter` created
+        with ``path_imgidx`` and ``sample_weights``, without ``bucket_shapes``.
+        The state holds the epoch, the record within the epoch,
+        the shuffle seed and the random states of the augmenters, so that training
+        resumed with `set_state` sees the same remaining batches.
+
+        Returns
+        -------
+        str
+            Serialized state, to be stored along with a training checkpoint.
+
+        Examples
+        --------
+        >>> state = data_iter.get_state()
+        >>> # later, with an iterator created with the same arguments
+        >>> data_iter.set_state(state)
+        """
+        if self.first_batch is not None and self._first_state is not None:
+            # the first batch was read ahead for the shapes and is not returned yet
+            return self._first_state
+        return self._read_state()
+
+    def _read_state(self):
+        state = ctypes.c_char_p()
+        check_call(_LIB.MXDataIterGetState(self.handle, ctypes.byref(state)))
+        return py_str(state.value)
+
+    def set_state(self, state):
+        """Moves the iterator to a position returned by `get_state`.
+
+        The next batch is the one that followed the state when it was saved. The
+        iterator must be created with the same arguments, apart from the number
+        of preprocess threads. With ``sample_weights``, the restored epoch is drawn
+        with the weights in the file when `set_state` is called; a warning is
+        logged if they differ from the weights of the saved epoch.
+
+        Parameters
+        ----------
+        state : str
+            State returned by `get_state`.
+        """
+        self.first_batch = None
+        check_call(_LIB.MXDataIterSetState(self.handle, c_str(state)))
+
+def _shape_arg(value):
+    """Returns a shape passed to an iterator either as a tuple or as a string."""
+    if isinstance(value, string_types):
+        return tuple(int(x) for x in value.strip('()[] ').split(',') if x.strip())
+    return tuple(int(x) for x in value)
+
 def _make_io_iterator(handle):
     """Create an io iterator by handle."""
     name = ctypes.c_char_p()
@@ -24,7 +24,7 @@ import os
 import time
 import logging
 import warnings
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import numpy as np
 
 from . import io
@@ -32,13 +32,14 @@ from . import nd
 from . import symbol as sym
 from . import optimizer as opt
 from . import metric
+from . import checkpoint
 from . import kvstore as kvs
 from .context import Context, cpu
 from .initializer import Uniform
 from .optimizer import get_updater
 from .executor_manager import DataParallelExecutorManager, _check_arguments, _load_data
 from .io import DataDesc
-from .base import mx_real_t
+from .base import mx_real_t, string_types
 
 BASE_ESTIMATOR = object
 
@@ -135,15 +136,123 @@ def _update_params_on_kvstore(param_arrays, grad_arrays, kvstore, param_names):
         # pull back the weights
         kvstore.pull(name, arg_list, priority=-index)
 
+def _get_bucket_size(bucket_size=None):
+    """Returns the size in bytes of the gradient buckets, 0 if bucketing is disabled."""
+    if bucket_size is None:
+        bucket_size = int(os.getenv('MXNET_KVSTORE_BUCKET_SIZE', 0))
+    return max(int(bucket_size), 0)
+
+class _GradientBuckets(object):
+    """Coalesces the gradients of consecutive parameters into flat buffers, so that
+    each bucket is reduced by the kvstore with a single push and pull.
+
+    Dense gradients of the same type are grouped in parameter order until a bucket
+    reaches `bucket_size` bytes. Gradients larger than that and sparse gradients are
+    reduced under their own key. Buckets are stored under new keys, following the
+    integer keys or prefixed by ``'__bucket'`` for string keys.
+
+    Parameters
+    ----------
+    keys : list of int or str
+        kvstore keys of the parameters.
+    grad_arrays : list of list of NDArray
+        Gradients of each parameter on each device, ``None`` if it has no gradient.
+    bucket_size : int
+        Maximum size in bytes of a bucket.
+    """
+    def __init__(self, keys, grad_arrays, bucket_size):
+        groups = []
+        group, group_bytes = [], 0
+        for index, grad_list in enumerate(grad_arrays):
+            if grad_list[0] is None:
+                continue
+            grad = grad_list[0]
+            nbytes = int(np.prod(grad.shape)) * np.dtype(grad.dtype).itemsize
+            if group and (nbytes >= bucket_size or grad.stype != 'default' or
+                          grad.dtype != grad_arrays[group[0]][0].dtype or
+                          group_bytes + nbytes > bucket_size):
+                groups.append(group)
+                group, group_bytes = [], 0
+            if nbytes >= bucket_size or grad.stype != 'default':
+                groups.append([index])
+                continue
+            group.append(index)
+            group_bytes += nbytes
+        if group:
+            groups.append(group)
+
+        self.buckets = []
+        for group in groups:
+            if len(group) == 1:
+                self.buckets.append((keys[group[0]], group, None, None))
+                continue
+            if isinstance(keys[0], string_types):
+                key = '__bucket%d_%s' % (len(self.buckets), keys[group[0]])
+            else:
+                key = max(keys) + 1 + len(self.buckets)
+            sizes = [int(np.prod(grad_arrays[i][0].shape)) for i in group]
+            flats, views = [], []
+            for dev, grad in enumerate(grad_arrays[group[0]]):
+                flat = nd.zeros((sum(sizes),), ctx=grad.context, dtype=grad.dtype)
+                offset, dev_views = 0, []
+                for index, size in zip(group, sizes):
+                    view = flat[offset:offset+size].reshape(grad_arrays[index][dev].shape)
+                    dev_views.append(view)
+                    offset += size
+                flats.append(flat)
+                views.append(dev_views)
+            self.buckets.append((key, group, flats, views))
+
+    def init(self, kvstore):
+        """Initializes the keys of the buckets in kvstore."""
+        for key, _, flats, _ in self.buckets:
+            if flats is not None:
+                kvstore.init(key, flats[0])
+
+    def reduce(self, kvstore, grad_arrays):
+        """Sums the gradients over devices and workers in place.
+
+        Parameters
+        ----------
+        kvstore : KVStore
+            The kvstore the buckets were initialized in.
+        grad_arrays : list of list of NDArray
+            Gradients of each parameter on each device, in the layout the buckets
+            were created with.
+        """
+        for bucket in range(len(self.buckets)):
+            self.reduce_bucket(kvstore, bucket, grad_arrays)
+
+    def reduce_bucket(self, kvstore, bucket, grad_arrays):
+        """Sums the gradients of the parameters in one bucket, see `reduce`."""
+        key, group, flats, views = self.buckets[bucket]
+        # priority is negative index of the first parameter
+        priority = -group[0]
+        if flats is None:
+            grad_list = grad_arrays[group[0]]
+            kvstore.push(key, grad_list, priority=priority)
+            kvstore.pull(key, grad_list, priority=priority)
+            return
+        for dev, flat in enumerate(flats):
+            nd.concat(*[grad_arrays[i][dev].reshape((-1,)) for i in group],
+                      dim=0, out=flat)
+        kvstore.push(key, flats, priority=priority)
+        kvstore.pull(key, flats, priority=priority)
+        for dev, dev_views in enumerate(views):
+            for index, view in zip(group, dev_views):
+                view.copyto(grad_arrays[index][dev])
+
 def _update_params(param_arrays, grad_arrays, updater, num_device,
-                   kvstore=None, param_names=None):
+                   kvstore=None, param_names=None, grad_buckets=None):
     """Perform update of param_arrays from grad_arrays not on kvstore."""
+    if kvstore and grad_buckets is not None:
+        grad_buckets.reduce(kvstore, grad_arrays)
     for i, pair in enumerate(zip(param_arrays, grad_arrays)):
         arg_list, grad_list = pair
         if grad_list[0] is None:
             continue
         index = i
-        if kvstore:
+        if kvstore and grad_buckets is None:
             name = param_names[index]
             # push gradient, priority is negative index
             kvstore.push(name, grad_list, priority=-index)
@@ -363,7 +472,7 @@ def _train_multi_device(symbol, ctx, arg_names, param_names, aux_names,
     return
 
 
-def save_checkpoint(prefix, epoch, symbol, arg_params, aux_params):
+def save_checkpoint(prefix, epoch, symbol, arg_params, aux_params, background=False):
     """Checkpoint the model data into file.
 
     Parameters
@@ -378,6 +487,15 @@ def save_checkpoint(prefix, epoch, symbol, arg_params, aux_params):
         Model parameter, dict of name to NDArray of net's weights.
     aux_params : dict of str to NDArray
         Model parameter, dict of name to NDArray of net's auxiliary states.
+    background : bool, default False
+        Whether to snapshot the parameters and write them in a background thread,
+        as a sharded checkpoint directory (see `mxnet.checkpoint`).
+
+    Returns
+    -------
+    CheckpointFuture
+        Handle to wait for the parameters, if `background` is True.
+
     Notes
     -----
     - ``prefix-symbol.json`` will be saved for symbol.
@@ -386,14 +504,19 @@ def save_checkpoint(prefix, epoch, symbol, arg_params, aux_params):
     if symbol is not None:
         symbol.save('%s-symbol.json' % prefix)
 
+    param_name = '%s-%04d.params' % (prefix, epoch)
+    if background:
+        save_dict = [('arg:%s' % k, v) for k, v in arg_params.items()]
+        save_dict += [('aux:%s' % k, v) for k, v in aux_params.items()]
+        return checkpoint.save(param_name, OrderedDict(save_dict))
     save_dict = {('arg:%s' % k) : v.as_in_context(cpu()) for k, v in arg_params.items()}
     save_dict.update({('aux:%s' % k) : v.as_in_context(cpu()) for k, v in aux_params.items()})
-    param_name = '%s-%04d.params' % (prefix, epoch)
     nd.save(param_name, save_dict)
     logging.info('Saved checkpoint to \"%s\"', param_name)
+    return None
 
 
-def load_checkpoint(prefix, epoch):
+def load_checkpoint(prefix, epoch, mmap=False):
     """Load model checkpoint from file.
 
     Parameters
@@ -402,6 +525,10 @@ def load_checkpoint(prefix, epoch):
         Prefix of model name.
     epoch : int
         Epoch number of model we would like to load.
+    mmap : bool, default False
+        Whether to map the parameters into memory instead of reading them, if they
+        were saved as a checkpoint directory. The returned arrays are then backed by
+        pages shared with other processes loading the checkpoint.
 
     Returns
     -------
@@ -415,10 +542,15 @@ def load_checkpoint(prefix, epoch):
     Notes
     -----
     - Symbol will be loaded from ``prefix-symbol.json``.
-    - Parameters will be loaded from ``prefix-epoch.params``.
+    - Parameters will be loaded from ``prefix-epoch.params``, which is either a
+      file or a checkpoint directory.
     """
     symbol = sym.load('%s-symbol.json' % prefix)
-    save_dict = nd.load('%s-%04d.params' % (prefix, epoch))
+    param_name = '%s-%04d.params' % (prefix, epoch)
+    if checkpoint.is_checkpoint(param_name):
+        save_dict = checkpoint.load(param_name, mmap=mmap)
+    else:
+        save_dict = nd.load(param_name)
     arg_params = {}
     aux_params = {}
     for k, v in save_dict.items():
@@ -26,9 +26,11 @@ import warnings
 
 from .. import context as ctx
 from .. import optimizer as opt
+from .. import checkpoint
 
 from .executor_group import DataParallelExecutorGroup
 from ..model import _create_kvstore, _initialize_kvstore, _update_params, _update_params_on_kvstore
+from ..model import _get_bucket_size, _GradientBuckets
 from ..model import load_checkpoint
 from ..initializer import Uniform, InitDesc
 from ..io import DataDesc
@@ -114,6 +116,7 @@ class Module(BaseModule):
         self._optimizer = None
         self._kvstore = None
         self._update_on_kvstore = None
+        self._grad_buckets = None
         self._updater = None
         self._preload_opt_states = None
         self._grad_req = None
@@ -161,7 +164,7 @@ class Module(BaseModule):
             mod._preload_opt_states = '%s-%04d.states'%(prefix, epoch)
         return mod
 
-    def save_checkpoint(self, prefix, epoch, save_optimizer_states=False):
+    def save_checkpoint(self, prefix, epoch, save_optimizer_states=False, background=False):
         """Saves current progress to checkpoint.
         Use `mx.callback.module_checkpoint` as `epoch_end_callback` to save during training.
 
@@ -173,15 +176,50 @@ class Module(BaseModule):
             The current epoch number.
         save_optimizer_states : bool
             Whether to save optimizer states to continue training.
+        background : bool
+            Default ``False``. Whether to snapshot parameters and optimizer states on
+            their devices and write them in a background thread. Parameters are then
+            saved as a sharded checkpoint directory (see `mxnet.checkpoint`), which
+            `Module.load` and `load_checkpoint` read as well.
+
+        Returns
+        -------
+        CheckpointFuture
+            Handle to wait for the files, if `background` is ``True``.
         """
         self._symbol.save('%s-symbol.json'%prefix)
         param_name = '%s-%04d.params' % (prefix, epoch)
+        state_name = '%s-%04d.states' % (prefix, epoch)
+        if background:
+            assert self.binded and self.params_initialized
+            jobs = [checkpoint._save_job(param_name, self._snapshot_params())]
+            if save_optimizer_states:
+                jobs.append(checkpoint._pickle_job(state_name, self._snapshot_optimizer_states()))
+            return checkpoint.CheckpointFuture(jobs)
         self.save_params(param_name)
         logging.info('Saved checkpoint to \"%s\"', param_name)
         if save_optimizer_states:
-            state_name = '%s-%04d.states' % (prefix, epoch)
             self.save_optimizer_states(state_name)
             logging.info('Saved optimizer state to \"%s\"', state_name)
+        return None
+
+    def _snapshot_params(self):
+        """Snapshots of the parameters averaged over devices, named as in checkpoints."""
+        if not self._params_dirty:
+            arrays = [('arg:%s' % k, v.copy()) for k, v in self._arg_params.items()]
+            return arrays + [('aux:%s' % k, v.copy()) for k, v in self._aux_params.items()]
+        exec_group = self._exec_group
+        arrays = [('arg:%s' % name, checkpoint._snapshot_mean(block))
+                  for name, block in zip(exec_group.param_names, exec_group.param_arrays)]
+        return arrays + [('aux:%s' % name, checkpoint._snapshot_mean(block))
+                         for name, block in zip(exec_group.aux_names, exec_group.aux_arrays)]
+
+    def _snapshot_optimizer_states(self):
+        """Snapshot of the states written by `save_optimizer_states`."""
+        assert self.optimizer_initialized
+        updater = self._kvstore._updater if self._update_on_kvstore else self._updater
+        assert updater is not None, "Cannot save states for distributed training"
+        return checkpoint.snapshot(updater.states)
 
     def _reset_bind(self):
         """Internal function to reset binded state."""
@@ -497,6 +535,15 @@ class Module(BaseModule):
 
         (kvstore, update_on_kvstore) = \
                 _create_kvstore(kvstore, len(self._context), self._arg_params)
+        bucket_size = _get_bucket_size() if kvstore else 0
+        if bucket_size and 'async' in kvstore.type:
+            # servers of async kvstores do not sum the pushed buckets
+            self.logger.warning('MXNET_KVSTORE_BUCKET_SIZE is ignored with kvstore %s',
+                                kvstore.type)
+            bucket_size = 0
+        if bucket_size:
+            # buckets are reduced by kvstore, the optimizer runs on the workers
+            update_on_kvstore = False
 
         batch_size = self._exec_group.batch_size
         if kvstore and 'dist' in kvstore.type and '_sync' in kvstore.type:
@@ -531,6 +578,7 @@ class Module(BaseModule):
         self._kvstore = kvstore
         self._update_on_kvstore = update_on_kvstore
         self._updater = None
+        self._grad_buckets = None
 
         if kvstore:
             if self._compression_params:
@@ -541,6 +589,11 @@ class Module(BaseModule):
                                 arg_params=self._arg_params,
                                 param_names=self._param_names,
                                 update_on_kvstore=update_on_kvstore)
+            if bucket_size:
+                self._grad_buckets = _GradientBuckets(self._exec_group.param_names,
+                                                      self._exec_group.grad_arrays,
+                                                      bucket_size)
+                self._grad_buckets.init(kvstore)
         if update_on_kvstore:
             kvstore.set_optimizer(self._optimizer)
         else:
@@ -565,6 +618,12 @@ class Module(BaseModule):
         self._kvstore = shared_module._kvstore
         self._update_on_kvstore = shared_module._update_on_kvstore
         self._updater = shared_module._updater
+        self._grad_buckets = None
+        if shared_module._grad_buckets is not None and \
+                self._exec_group.param_names == shared_module._exec_group.param_names:
+            # buckets index the gradients by position, other parameter lists are
+            # reduced per parameter
+            self._grad_buckets = shared_module._grad_buckets
         self.optimizer_initialized = True
 
     def forward(self, data_batch, is_train=None):
@@ -647,7 +706,8 @@ class Module(BaseModule):
                            updater=self._updater,
                            num_device=len(self._context),
                            kvstore=self._kvstore,
-                           param_names=self._exec_group.param_names)
+                           param_names=self._exec_group.param_names,
+                           grad_buckets=self._grad_buckets)
 
     def get_outputs(self, merge_multi_context=True):
         """Gets outputs of the previous forward computation.
@@ -2023,6 +2023,8 @@ fixed-size items.
         else:
             ograd_handles = [out_grad.handle]
 
+        from ..autograd import _before_backward, _after_backward
+        states = _before_backward()
         check_call(_LIB.MXAutogradBackwardEx(
             1, c_handle_array([self]),
             c_array(NDArrayHandle, ograd_handles),
@@ -2033,6 +2035,7 @@ fixed-size items.
             ctypes.c_int(train_mode),
             ctypes.c_void_p(0),
             ctypes.c_void_p(0)))
+        _after_backward(states)
 
     def tostype(self, stype):
         """Return a copy of the array with chosen storage type.
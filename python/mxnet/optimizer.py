@@ -19,6 +19,7 @@
 # pylint: disable=too-many-lines
 """Weight updating functions."""
 import math
+import os
 import pickle
 import warnings
 import numpy
@@ -26,10 +27,31 @@ from .base import py_str
 from .ndarray import (NDArray, zeros, clip, sqrt, cast, maximum, abs as NDabs)
 from .ndarray import (sgd_update, sgd_mom_update, adam_update, rmsprop_update, rmspropalex_update,
                       mp_sgd_update, mp_sgd_mom_update, square, ftrl_update, ftml_update,
-                      signsgd_update, signum_update)
+                      signsgd_update, signum_update, multi_sgd_update, multi_sgd_mom_update,
+                      multi_mp_sgd_update, multi_mp_sgd_mom_update, multi_nag_mom_update,
+                      multi_adam_update)
 from .ndarray import sparse
 from .random import normal
 
+# largest num_weights of the multi-tensor update operators
+_MAX_AGGREGATE_NUM = 48
+
+
+def _get_aggregate_num(optimizer, cls):
+    """Number of weights `optimizer` updates at once. Subclasses of `cls` that
+    override `update` or `update_multi_precision` take one weight at a time,
+    unless they set `aggregate_num` themselves."""
+    for name in ('update', 'update_multi_precision'):
+        owner = next(klass for klass in type(optimizer).__mro__ if name in vars(klass))
+        if owner not in cls.__mro__:
+            return 0
+    return min(int(os.getenv('MXNET_OPTIMIZER_AGGREGATION_SIZE', '16')), _MAX_AGGREGATE_NUM)
+
+
+def _flatten_groups(*lists):
+    """Interleaves lists, e.g. weights and grads into weight_0, grad_0, weight_1, ..."""
+    return [x for group in zip(*lists) for x in group]
+
 
 class Optimizer(object):
     """The base class inherited by all optimizers.
@@ -93,6 +115,8 @@ class Optimizer(object):
         self._index_update_count = {}
         self.clip_gradient = clip_gradient
         self.multi_precision = multi_precision
+        # number of weights `update` accepts at once, 0 if it only takes one
+        self.aggregate_num = 0
 
         if param_idx2name is None:
             param_idx2name = {}
@@ -169,6 +193,16 @@ class Optimizer(object):
         else:
             raise ValueError('Cannot find optimizer %s' % name)
 
+    def __getstate__(self):
+        ret = self.__dict__.copy()
+        # param_dict holds the Parameters, which are saved separately
+        ret.pop('param_dict', None)
+        return ret
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self.param_dict = {}
+
     @property
     def learning_rate(self):
         if self.lr_scheduler is not None:
@@ -262,7 +296,14 @@ class Optimizer(object):
         state : any obj
             The state returned by `create_state()`.
         """
-        if self.multi_precision and weight.dtype == numpy.float16:
+        if isinstance(index, (list, tuple)):
+            # optimizers aggregating updates do not handle the wrapped states
+            if self.multi_precision and weight[0].dtype == numpy.float16:
+                for i, w, g, s in zip(index, weight, grad, state):
+                    self.update_multi_precision(i, w, g, s)
+            else:
+                self.update(index, weight, grad, state)
+        elif self.multi_precision and weight.dtype == numpy.float16:
             # Wrapper for mixed precision
             weight_master_copy = state[0]
             original_state = state[1]
@@ -368,9 +409,13 @@ class Optimizer(object):
 
         Parameters
         ----------
-        index : int
-            The index to be updated.
+        index : int or list of int
+            The index or indices to be updated.
         """
+        if isinstance(index, (list, tuple)):
+            for idx in index:
+                self._update_count(idx)
+            return
         if index not in self._index_update_count:
             self._index_update_count[index] = self.begin_num_update
         self._index_update_count[index] += 1
@@ -478,6 +523,7 @@ class SGD(Optimizer):
         super(SGD, self).__init__(**kwargs)
         self.momentum = momentum
         self.lazy_update = lazy_update
+        self.aggregate_num = _get_aggregate_num(self, SGD)
 
     def create_state_multi_precision(self, index, weight):
         weight_master_copy = None
@@ -499,6 +545,13 @@ class SGD(Optimizer):
         return momentum
 
     def _update_impl(self, index, weight, grad, state, multi_precision=False):
+        if isinstance(index, (list, tuple)):
+            if all(w.stype == 'default' and g.stype == 'default' for w, g in zip(weight, grad)):
+                self._update_multi_impl(index, weight, grad, state, multi_precision)
+            else:
+                for i, w, g, s in zip(index, weight, grad, state):
+                    self._update_impl(i, w, g, s, multi_precision)
+            return
         assert(isinstance(weight, NDArray))
         assert(isinstance(grad, NDArray))
         self._update_count(index)
@@ -526,11 +579,38 @@ class SGD(Optimizer):
                 mp_sgd_update(weight, grad, state[1], out=weight,
                               lr=lr, wd=wd, **kwargs)
 
+    def _update_multi_impl(self, indices, weights, grads, states, multi_precision):
+        """Updates dense weights of one type with a multi-tensor operator."""
+        self._update_count(indices)
+        kwargs = {'rescale_grad': self.rescale_grad, 'num_weights': len(weights),
+                  'lrs': tuple(self._get_lr(i) for i in indices),
+                  'wds': tuple(self._get_wd(i) for i in indices)}
+        if self.momentum > 0:
+            kwargs['momentum'] = self.momentum
+        if self.clip_gradient:
+            kwargs['clip_gradient'] = self.clip_gradient
+
+        if not multi_precision:
+            if states[0] is not None:
+                multi_sgd_mom_update(*_flatten_groups(weights, grads, states),
+                                     out=list(weights), **kwargs)
+            else:
+                multi_sgd_update(*_flatten_groups(weights, grads), out=list(weights), **kwargs)
+        else:
+            moms, weights32 = zip(*states)
+            if moms[0] is not None:
+                multi_mp_sgd_mom_update(*_flatten_groups(weights, grads, moms, weights32),
+                                        out=list(weights), **kwargs)
+            else:
+                multi_mp_sgd_update(*_flatten_groups(weights, grads, weights32),
+                                    out=list(weights), **kwargs)
+
     def update(self, index, weight, grad, state):
         self._update_impl(index, weight, grad, state, multi_precision=False)
 
     def update_multi_precision(self, index, weight, grad, state):
-        use_multi_precision = self.multi_precision and weight.dtype == numpy.float16
+        dtype = weight[0].dtype if isinstance(weight, (list, tuple)) else weight.dtype
+        use_multi_precision = self.multi_precision and dtype == numpy.float16
         self._update_impl(index, weight, grad, state,
                           multi_precision=use_multi_precision)
 
@@ -913,6 +993,7 @@ class NAG(Optimizer):
     def __init__(self, momentum=0.0, **kwargs):
         super(NAG, self).__init__(**kwargs)
         self.momentum = momentum
+        self.aggregate_num = _get_aggregate_num(self, NAG)
 
     def create_state(self, index, weight):
         momentum = None
@@ -921,6 +1002,13 @@ class NAG(Optimizer):
         return momentum
 
     def update(self, index, weight, grad, state):
+        if isinstance(index, (list, tuple)):
+            if all(w.stype == 'default' and g.stype == 'default' for w, g in zip(weight, grad)):
+                self._update_multi(index, weight, grad, state)
+            else:
+                for i, w, g, s in zip(index, weight, grad, state):
+                    self.update(i, w, g, s)
+            return
         assert(isinstance(weight, NDArray))
         assert(isinstance(grad, NDArray))
         self._update_count(index)
@@ -942,6 +1030,22 @@ class NAG(Optimizer):
             assert self.momentum == 0.0
             weight[:] += -lr * (grad + wd * weight)
 
+    def _update_multi(self, indices, weights, grads, states):
+        """Updates weights of one type with a multi-tensor operator."""
+        self._update_count(indices)
+        kwargs = {'rescale_grad': self.rescale_grad, 'num_weights': len(weights),
+                  'lrs': tuple(self._get_lr(i) for i in indices),
+                  'wds': tuple(self._get_wd(i) for i in indices)}
+        if self.clip_gradient is not None:
+            kwargs['clip_gradient'] = self.clip_gradient
+
+        if states[0] is not None:
+            multi_nag_mom_update(*_flatten_groups(weights, grads, states), out=list(weights),
+                                 momentum=self.momentum, **kwargs)
+        else:
+            assert self.momentum == 0.0
+            multi_sgd_update(*_flatten_groups(weights, grads), out=list(weights), **kwargs)
+
 @register
 class SGLD(Optimizer):
     """Stochastic Gradient Riemannian Langevin Dynamics.
@@ -1031,6 +1135,7 @@ class Adam(Optimizer):
         self.beta2 = beta2
         self.epsilon = epsilon
         self.lazy_update = lazy_update
+        self.aggregate_num = _get_aggregate_num(self, Adam)
 
     def create_state(self, index, weight):
         stype = weight.stype if self.lazy_update else 'default'
@@ -1040,17 +1145,19 @@ class Adam(Optimizer):
                       stype=stype))  # variance
 
     def update(self, index, weight, grad, state):
+        if isinstance(index, (list, tuple)):
+            if all(w.stype == 'default' and g.stype == 'default' for w, g in zip(weight, grad)):
+                self._update_multi(index, weight, grad, state)
+            else:
+                for i, w, g, s in zip(index, weight, grad, state):
+                    self.update(i, w, g, s)
+            return
         assert(isinstance(weight, NDArray))
         assert(isinstance(grad, NDArray))
         self._update_count(index)
-        lr = self._get_lr(index)
+        lr = self._get_corrected_lr(index)
         wd = self._get_wd(index)
 
-        t = self._index_update_count[index]
-        coef1 = 1. - self.beta1**t
-        coef2 = 1. - self.beta2**t
-        lr *= math.sqrt(coef2)/coef1
-
         kwargs = {'beta1': self.beta1, 'beta2': self.beta2, 'epsilon': self.epsilon,
                   'rescale_grad': self.rescale_grad}
         if self.clip_gradient:
@@ -1060,6 +1167,27 @@ class Adam(Optimizer):
         adam_update(weight, grad, mean, var, out=weight,
                     lr=lr, wd=wd, **kwargs)
 
+    def _get_corrected_lr(self, index):
+        """Learning rate with the bias correction of the moment estimates."""
+        t = self._index_update_count[index]
+        coef1 = 1. - self.beta1**t
+        coef2 = 1. - self.beta2**t
+        return self._get_lr(index) * math.sqrt(coef2)/coef1
+
+    def _update_multi(self, indices, weights, grads, states):
+        """Updates dense weights of one type with a multi-tensor operator."""
+        self._update_count(indices)
+        kwargs = {'beta1': self.beta1, 'beta2': self.beta2, 'epsilon': self.epsilon,
+                  'rescale_grad': self.rescale_grad, 'num_weights': len(weights),
+                  'lrs': tuple(self._get_corrected_lr(i) for i in indices),
+                  'wds': tuple(self._get_wd(i) for i in indices)}
+        if self.clip_gradient:
+            kwargs['clip_gradient'] = self.clip_gradient
+
+        means, variances = zip(*states)
+        multi_adam_update(*_flatten_groups(weights, grads, means, variances),
+                          out=list(weights), **kwargs)
+
 @register
 class AdaGrad(Optimizer):
     """AdaGrad optimizer.
@@ -1457,18 +1585,37 @@ class Updater(object):
         self.states_synced = {}
 
     def __call__(self, index, grad, weight):
-        """Updates weight given gradient and index."""
+        """Updates weight given gradient and index.
+
+        `index`, `grad` and `weight` can also be lists, to update several weights at
+        once. Optimizers with a positive `aggregate_num` then update the weights of
+        the same type in groups of up to `aggregate_num` weights."""
+        if not isinstance(index, (list, tuple)):
+            index, grad, weight = [index], [grad], [weight]
         # convert ctypes.char_p.value back to python str if needed
-        if isinstance(index, bytes):
-            index = py_str(index)
-        if index not in self.states:
-            self.states[index] = self.optimizer.create_state_multi_precision(index, weight)
-            self.states_synced[index] = True
-        elif not self.states_synced[index]:
-            self.states[index] = \
-                self.sync_state_context(self.states[index], weight.context)
-            self.states_synced[index] = True
-        self.optimizer.update_multi_precision(index, weight, grad, self.states[index])
+        index = [py_str(i) if isinstance(i, bytes) else i for i in index]
+        for i, w in zip(index, weight):
+            if i not in self.states:
+                self.states[i] = self.optimizer.create_state_multi_precision(i, w)
+                self.states_synced[i] = True
+            elif not self.states_synced[i]:
+                self.states[i] = self.sync_state_context(self.states[i], w.context)
+                self.states_synced[i] = True
+
+        num = getattr(self.optimizer, 'aggregate_num', 0)
+        if num <= 0:
+            for i, g, w in zip(index, grad, weight):
+                self.optimizer.update_multi_precision(i, w, g, self.states[i])
+            return
+        groups = {}
+        for i, g, w in zip(index, grad, weight):
+            groups.setdefault(w.dtype, []).append((i, w, g))
+        for group in groups.values():
+            for begin in range(0, len(group), num):
+                indices, weights, grads = zip(*group[begin:begin + num])
+                states = [self.states[i] for i in indices]
+                self.optimizer.update_multi_precision(list(indices), list(weights),
+                                                      list(grads), states)
 
     def sync_state_context(self, state, context):
         """sync state context."""
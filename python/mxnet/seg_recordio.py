@@ -19,15 +19,20 @@
 from __future__ import absolute_import
 from collections import namedtuple
 
+import os
 import ctypes
+import mmap
 import struct
 import numbers
+from multiprocessing.pool import ThreadPool
 import numpy as np
 
 from .base import _LIB
 from .base import RecordIOHandle
 from .base import check_call
 from .base import c_str
+from . import ndarray as nd
+from .image import imdecode
 try:
     import cv2
 except ImportError:
@@ -288,6 +293,207 @@ class MXIndexedSegRecordIO(MXSegRecordIO):
         self.keys.append(key)
 
 
+_kMagic = 0xced7230a
+_kLRecHeader = struct.Struct('II')
+
+class MXMappedIndexedSegRecordIO(object):
+    """Reads indexed `RecordIO` data through a read-only memory map.
+
+    Unlike ``MXIndexedSegRecordIO``, records are returned as ``memoryview``
+    slices of the mapped file, so no bytes are copied for records that were
+    written in a single part. The index file is parsed once on construction.
+
+    Example usage:
+    ----------
+    >>> record = mx.seg_recordio.MXMappedIndexedSegRecordIO('tmp.idx', 'tmp.rec')
+    >>> header, image_data, label_data = mx.seg_recordio.unpack_buffers(record.read_idx(3))
+
+    Parameters
+    ----------
+    idx_path : str
+        Path to the index file.
+    uri : str
+        Path to the record file.
+    key_type : type
+        Data type for keys.
+    """
+    def __init__(self, idx_path, uri, key_type=int):
+        self.idx_path = idx_path
+        self.uri = uri
+        self.key_type = key_type
+        self.keys = []
+        self.idx = {}
+        with open(idx_path, 'r') as fidx:
+            for line in fidx:
+                line = line.strip().split('\t')
+                if len(line) < 2:
+                    continue
+                key = self.key_type(line[0])
+                self.idx[key] = int(line[1])
+                self.keys.append(key)
+        self._file = None
+        self._mmap = None
+
+    def __getstate__(self):
+        # the mapping is re-created lazily in each process
+        state = self.__dict__.copy()
+        state['_file'] = None
+        state['_mmap'] = None
+        return state
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Closes the memory map and the record file."""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views handed out by read_at are still alive, the mapping
+                # is released when they are garbage collected.
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _map(self):
+        if self._mmap is None:
+            self._file = open(self.uri, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read_at(self, pos):
+        """Returns the record starting at byte offset `pos`.
+
+        Returns a ``memoryview`` into the mapped file, or ``bytes`` when the
+        record was split into several parts by the writer."""
+        buf = self._map()
+        view = memoryview(buf)
+        parts = []
+        while True:
+            magic, lrec = _kLRecHeader.unpack_from(buf, pos)
+            if magic != _kMagic:
+                raise ValueError("Invalid RecordIO File %s at offset %d" % (self.uri, pos))
+            cflag = lrec >> 29
+            length = lrec & ((1 << 29) - 1)
+            start = pos + _kLRecHeader.size
+            if cflag == 0:
+                return view[start:start + length]
+            parts.append(view[start:start + length])
+            if cflag == 3:
+                break
+            parts.append(struct.pack('I', _kMagic))
+            pos = start + (((length + 3) >> 2) << 2)
+        return b''.join(parts)
+
+    def read_idx(self, idx):
+        """Returns the record at given index."""
+        return self.read_at(self.idx[idx])
+
+
+class MXIndexedSegRecordWriter(object):
+    """Writes indexed `RecordIO` files from Python.
+
+    The output is byte compatible with ``MXIndexedSegRecordIO``. Unlike the
+    latter, the files can be opened for appending and flushed at any time,
+    which allows interrupted writes to be resumed.
+
+    Example usage:
+    ----------
+    >>> record = mx.seg_recordio.MXIndexedSegRecordWriter('tmp.idx', 'tmp.rec')
+    >>> for i in range(5):
+    ...     record.write_idx(i, 'record_%d'%i)
+    >>> record.close()
+    >>> record = mx.seg_recordio.MXIndexedSegRecordWriter('tmp.idx', 'tmp.rec', append=True)
+    >>> record.write_idx(5, 'record_5')
+    >>> record.close()
+
+    Parameters
+    ----------
+    idx_path : str
+        Path to the index file.
+    uri : str
+        Path to the record file.
+    append : bool
+        If True, records are appended to existing files.
+    key_type : type
+        Data type for keys.
+    """
+    def __init__(self, idx_path, uri, append=False, key_type=int):
+        self.idx_path = idx_path
+        self.uri = uri
+        self.key_type = key_type
+        self.frec = open(uri, 'ab' if append else 'wb')
+        self.fidx = open(idx_path, 'a' if append else 'w')
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Closes the record and index files."""
+        if self.frec is not None:
+            self.frec.close()
+            self.fidx.close()
+            self.frec = None
+            self.fidx = None
+
+    def flush(self):
+        """Flushes both files to the operating system."""
+        self.frec.flush()
+        self.fidx.flush()
+
+    def tell(self):
+        """Returns the current position of write head."""
+        return self.frec.tell()
+
+    def _write_part(self, cflag, data):
+        self.frec.write(_kLRecHeader.pack(_kMagic, (cflag << 29) | len(data)))
+        self.frec.write(data)
+
+    def write(self, buf):
+        """Inserts a string buffer as a record.
+
+        Follows ``dmlc::RecordIOWriter``: the record is split wherever the
+        magic number appears at an aligned position."""
+        buf = bytes(buf)
+        length = len(buf)
+        assert length < (1 << 29), 'RecordIO only accept record less than 2^29 bytes'
+        magic = struct.pack('I', _kMagic)
+        dptr = 0
+        start = 0
+        while True:
+            i = buf.find(magic, start)
+            if i < 0:
+                break
+            if i % 4 != 0:
+                start = i + 1
+                continue
+            self._write_part(1 if dptr == 0 else 2, buf[dptr:i])
+            dptr = i + 4
+            start = dptr
+        self._write_part(3 if dptr != 0 else 0, buf[dptr:])
+        upper_align = ((length + 3) >> 2) << 2
+        if upper_align != length:
+            self.frec.write(b'\0' * (upper_align - length))
+
+    def write_idx(self, idx, buf):
+        """Inserts input record at given index.
+
+        Parameters
+        ----------
+        idx : int
+            Index of a file.
+        buf :
+            Record to write.
+        """
+        key = self.key_type(idx)
+        pos = self.tell()
+        self.write(buf)
+        self.fidx.write('%s\t%d\n'%(str(key), pos))
+
+
 ISegRHeader = namedtuple('HEADER', ['flag', 'label', 'image_size', 'label_size', 'id', 'id2'])
 """An alias for HEADER. Used to store metadata (e.g. labels) accompanying a record.
 See mxnet.recordio.pack and mxnet.recordio.pack_img for example uses.
@@ -295,7 +501,8 @@ See mxnet.recordio.pack and mxnet.recordio.pack_img for example uses.
 Parameters
 ----------
     flag : int
-        Available for convenience, can be set arbitrarily.
+        The lower 24 bits are available for convenience. The high byte
+        holds the label encoding, see ``LABEL_CODEC_IMAGE`` and ``LABEL_CODEC_RLE``.
     label : float or an array of float
         Typically used to store label(s) for a record.
     image_size: int
@@ -310,6 +517,69 @@ Parameters
 _ISEGR_FORMAT = 'IfIIQQ'
 _IR_SIZE = struct.calcsize(_ISEGR_FORMAT)
 
+LABEL_CODEC_IMAGE = 0
+"""Label stored as an OpenCV encoded image (PNG by default)."""
+LABEL_CODEC_RLE = 1
+"""Label stored as run-length encoded uint8 mask, see ``encode_label_rle``."""
+_LABEL_CODEC_SHIFT = 24
+_FLAG_MASK = (1 << _LABEL_CODEC_SHIFT) - 1
+_RLE_HEADER = struct.Struct('<III')
+
+def label_codec(header):
+    """Returns the label encoding stored in the header flag."""
+    return header.flag >> _LABEL_CODEC_SHIFT
+
+def encode_label_rle(label):
+    """Run-length encode a 2D uint8 mask.
+
+    The mask is scanned in row-major order. The result is a little endian
+    ``(rows, cols, num_runs)`` uint32 header followed by `num_runs` uint32
+    run lengths and `num_runs` uint8 run values.
+
+    Parameters
+    ----------
+    label : numpy.ndarray
+        2D uint8 mask.
+
+    Returns
+    -------
+    s : bytes
+        The encoded mask.
+    """
+    label = np.ascontiguousarray(label)
+    assert label.ndim == 2 and label.dtype == np.uint8, \
+        'RLE label encoding requires a 2D uint8 mask'
+    flat = label.ravel()
+    if flat.size == 0:
+        return _RLE_HEADER.pack(label.shape[0], label.shape[1], 0)
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.append(starts, flat.size)).astype('<u4')
+    values = flat[starts]
+    return _RLE_HEADER.pack(label.shape[0], label.shape[1], len(starts)) + \
+        lengths.tobytes() + values.tobytes()
+
+def decode_label_rle(s):
+    """Decode a mask encoded by ``encode_label_rle``.
+
+    Parameters
+    ----------
+    s : str, bytes, memoryview or numpy.ndarray
+        The encoded mask.
+
+    Returns
+    -------
+    label : numpy.ndarray
+        2D uint8 mask.
+    """
+    rows, cols, num_runs = _RLE_HEADER.unpack_from(s, 0)
+    lengths = np.frombuffer(s, dtype='<u4', count=num_runs, offset=_RLE_HEADER.size)
+    values = np.frombuffer(s, dtype=np.uint8, count=num_runs,
+                           offset=_RLE_HEADER.size + 4 * num_runs)
+    if int(lengths.sum()) != rows * cols:
+        raise ValueError('Corrupted RLE label: runs cover %d pixels, expect %d' % (
+            int(lengths.sum()), rows * cols))
+    return np.repeat(values, lengths).reshape(rows, cols)
+
 def pack(header, image_data, label_data):
     """Pack a string into MXImageRecord.
 
@@ -382,10 +652,41 @@ def unpack(s):
     """
     header = ISegRHeader(*struct.unpack(_ISEGR_FORMAT, s[:_IR_SIZE]))
     s = s[_IR_SIZE:]
-    if header.flag > 0:
-        s = s[header.flag*4:]
+    if header.flag & _FLAG_MASK > 0:
+        s = s[(header.flag & _FLAG_MASK)*4:]
     return header, s
 
+def unpack_buffers(s):
+    """Unpack a MXImageSegRecord to image and label buffers without copying.
+
+    Parameters
+    ----------
+    s : str, bytes or memoryview
+        Buffer from ``MXSegRecordIO.read`` or ``MXMappedIndexedSegRecordIO.read_idx``.
+
+    Returns
+    -------
+    header : ISegRHeader
+        Header of the image record.
+    image_data : numpy.ndarray
+        uint8 view of the encoded image.
+    label_data : numpy.ndarray
+        uint8 view of the encoded label.
+
+    Examples
+    --------
+    >>> record = mx.seg_recordio.MXSegRecordIO('test.rec', 'r')
+    >>> header, image_data, label_data = mx.seg_recordio.unpack_buffers(record.read())
+    >>> image = mx.image.imdecode(image_data)
+    """
+    header = ISegRHeader(*struct.unpack_from(_ISEGR_FORMAT, s, 0))
+    offset = _IR_SIZE + (header.flag & _FLAG_MASK)*4
+    buf = np.frombuffer(s, dtype=np.uint8)
+    image_data = buf[offset:offset + header.image_size]
+    offset += header.image_size
+    label_data = buf[offset:offset + header.label_size]
+    return header, image_data, label_data
+
 def unpack_img(s, iscolor=-1):
     """Unpack a MXImageSegRecord to image.
 
@@ -423,14 +724,40 @@ def unpack_img(s, iscolor=-1):
             [168, 169, 167],
             [166, 167, 165]]], dtype=uint8)
     """
-    header, s = unpack(s)
-    image_data = np.frombuffer(s, dtype=np.uint8, count=header.image_size, offset=0)
-    label_data = np.frombuffer(s, dtype=np.uint8, count=header.label_size, offset=header.image_size)
+    header, image_data, label_data = unpack_buffers(s)
     assert cv2 is not None
     image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-    label = cv2.imdecode(label_data, cv2.IMREAD_GRAYSCALE)
+    label = decode_label(header, label_data)
     return header, image, label
 
+def decode_label(header, label_data):
+    """Decodes the label payload of a record into a mask.
+
+    Parameters
+    ----------
+    header : ISegRHeader
+        Header of the record, which holds the label encoding.
+    label_data : str, bytes or numpy.ndarray
+        Encoded label, e.g. as returned by ``unpack_buffers``.
+
+    Returns
+    -------
+    numpy.ndarray
+        2D uint8 mask.
+
+    Examples
+    --------
+    >>> header, image_data, label_data = mx.seg_recordio.unpack_buffers(record.read_idx(3))
+    >>> label = mx.seg_recordio.decode_label(header, label_data)
+    """
+    codec = label_codec(header)
+    if codec == LABEL_CODEC_RLE:
+        return decode_label_rle(label_data)
+    if codec != LABEL_CODEC_IMAGE:
+        raise ValueError("Unknown label codec %d in record %d" % (codec, header.id))
+    label = imdecode(label_data, 0).asnumpy()
+    return label.reshape(label.shape[:2])
+
 def pack_img(header, img, label, quality=95, img_fmt='.jpg', label_fmt='.png'):
     """Pack an image into ``MXImageRecord``.
 
@@ -447,7 +774,9 @@ def pack_img(header, img, label, quality=95, img_fmt='.jpg', label_fmt='.png'):
     img_fmt : str
         Encoding of the image (.jpg for JPEG, .png for PNG).
     label_fmt : str
-        Encoding of the label (.jpg for JPEG, .png for PNG).
+        Encoding of the label (.jpg for JPEG, .png for PNG, .rle for
+        run-length encoding, which decodes much faster than PNG for masks
+        with few classes).
 
     Returns
     -------
@@ -485,16 +814,220 @@ def pack_img(header, img, label, quality=95, img_fmt='.jpg', label_fmt='.png'):
     assert ret, 'failed to encode image'
     image_data = buf.tostring()
 
-    if label_fmt.upper() in jpg_formats:
-        encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
-    elif label_fmt.upper() in png_formats:
-        encode_params = [cv2.IMWRITE_PNG_COMPRESSION, quality]
-    ret, buf = cv2.imencode(label_fmt, label, encode_params)
-    assert ret, 'failed to encode image'
-    label_data = buf.tostring()
+    flag = header.flag & _FLAG_MASK
+    if label_fmt.upper() == '.RLE':
+        label_data = encode_label_rle(label)
+        flag |= LABEL_CODEC_RLE << _LABEL_CODEC_SHIFT
+    else:
+        if label_fmt.upper() in jpg_formats:
+            encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        elif label_fmt.upper() in png_formats:
+            encode_params = [cv2.IMWRITE_PNG_COMPRESSION, quality]
+        ret, buf = cv2.imencode(label_fmt, label, encode_params)
+        assert ret, 'failed to encode image'
+        label_data = buf.tostring()
 
     image_len = len(image_data)
     label_len = len(label_data)
-    header = ISegRHeader(header.flag, header.label, image_len, label_len, header.id, 0)
+    header = ISegRHeader(flag, header.label, image_len, label_len, header.id, 0)
 
     return pack(header, image_data, label_data)
+
+
+class SegRecordDecoder(object):
+    """Decodes batches of packed segmentation records on a thread pool.
+
+    Images and labels are written into uint8 buffers of shape
+    ``(batch_size, height, width, channels)`` and ``(batch_size, height, width)``
+    that are allocated once and reused by every call to ``decode``. OpenCV
+    releases the GIL while decoding, so the worker threads run in parallel.
+
+    Example usage:
+    ----------
+    >>> decoder = mx.seg_recordio.SegRecordDecoder(4, (512, 512), num_threads=4)
+    >>> record = mx.seg_recordio.MXSegRecordIO('test.rec', 'r')
+    >>> headers, images, labels = decoder.decode([record.read() for _ in range(4)])
+    >>> images.shape, labels.shape
+    ((4, 512, 512, 3), (4, 512, 512))
+
+    Parameters
+    ----------
+    batch_size : int
+        Maximum number of records decoded per call.
+    data_shape : tuple of int
+        Output (height, width) of images and labels.
+    num_threads : int
+        Number of decoding threads.
+    iscolor : int
+        1 to decode images as 3 channel BGR, 0 for grayscale.
+    resize : bool
+        If True, records whose size differs from `data_shape` are resized,
+        bilinear for images and nearest for labels. Otherwise a size mismatch
+        raises ValueError.
+    ctx : Context, optional
+        If set, e.g. ``mx.Context('cpu_shared', 0)``, ``decode`` returns
+        NDArrays on this context instead of numpy arrays. The NDArrays are
+        also reused across calls.
+    """
+    def __init__(self, batch_size, data_shape, num_threads=4, iscolor=1,
+                 resize=False, ctx=None):
+        assert cv2 is not None
+        height, width = data_shape
+        channels = 3 if iscolor else 1
+        self._iscolor = cv2.IMREAD_COLOR if iscolor else cv2.IMREAD_GRAYSCALE
+        self._resize = resize
+        self._images = np.empty((batch_size, height, width, channels), dtype=np.uint8)
+        self._labels = np.empty((batch_size, height, width), dtype=np.uint8)
+        self._pool = ThreadPool(num_threads)
+        self._out = None
+        if ctx is not None:
+            self._out = (nd.empty(self._images.shape, ctx=ctx, dtype=np.uint8),
+                         nd.empty(self._labels.shape, ctx=ctx, dtype=np.uint8))
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Stops the decoding threads."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _fit(self, src, interpolation):
+        height, width = self._labels.shape[1:]
+        if src.shape[:2] == (height, width):
+            return src
+        if not self._resize:
+            raise ValueError("Decoded size %s does not match data_shape %s, "
+                             "set resize=True to resize" % (str(src.shape[:2]),
+                                                            str((height, width))))
+        return cv2.resize(src, (width, height), interpolation=interpolation)
+
+    def _decode_one(self, args):
+        i, s = args
+        header, image_data, label_data = unpack_buffers(s)
+        image = cv2.imdecode(image_data, self._iscolor)
+        label = decode_label(header, label_data)
+        if image is None or label is None:
+            raise ValueError("Failed to decode record with id %d" % header.id)
+        image = self._fit(image, cv2.INTER_LINEAR)
+        label = self._fit(label, cv2.INTER_NEAREST)
+        self._images[i] = image.reshape(self._images.shape[1:])
+        self._labels[i] = label
+        return header
+
+    def decode(self, records):
+        """Decodes a list of packed records.
+
+        Parameters
+        ----------
+        records : list of str, bytes or memoryview
+            Packed records, at most `batch_size` of them.
+
+        Returns
+        -------
+        headers : list of ISegRHeader
+            Headers of the decoded records.
+        images : numpy.ndarray or NDArray
+            Decoded images in NHWC layout. Only the first ``len(records)``
+            entries are valid, and the buffer is overwritten on the next call.
+        labels : numpy.ndarray or NDArray
+            Decoded labels in NHW layout.
+        """
+        assert self._pool is not None, "decode called after close"
+        if len(records) > self._images.shape[0]:
+            raise ValueError("Got %d records for a decoder with batch_size %d" % (
+                len(records), self._images.shape[0]))
+        headers = self._pool.map(self._decode_one, enumerate(records))
+        if self._out is None:
+            return headers, self._images, self._labels
+        self._out[0][:] = self._images
+        self._out[1][:] = self._labels
+        return headers, self._out[0], self._out[1]
+
+
+def class_histograms(idx_path, uri, num_classes):
+    """Counts the label pixels of every class in every record.
+
+    Pixels with a label of `num_classes` or more, such as an ignore label of
+    255, are not counted.
+
+    Parameters
+    ----------
+    idx_path : str
+        Path to the index file.
+    uri : str
+        Path to the record file.
+    num_classes : int
+        Number of classes.
+
+    Returns
+    -------
+    keys : list of int
+        Record keys, in index file order.
+    hist : numpy.ndarray
+        int64 array of shape (len(keys), num_classes).
+    """
+    record = MXMappedIndexedSegRecordIO(idx_path, uri)
+    hist = np.zeros((len(record.keys), num_classes), dtype=np.int64)
+    for i, key in enumerate(record.keys):
+        header, _, label_data = unpack_buffers(record.read_idx(key))
+        label = decode_label(header, label_data).ravel()
+        hist[i] = np.bincount(label[label < num_classes], minlength=num_classes)
+    keys = record.keys
+    record.close()
+    return keys, hist
+
+def balanced_sample_weights(hist, power=1.0):
+    """Computes per record sampling weights that favour rare classes.
+
+    The weight of a record is the pixel weighted mean over its classes of
+    ``(1 / frequency of the class) ** power``, so records showing classes
+    that are rare in the whole dataset are drawn more often.
+
+    Parameters
+    ----------
+    hist : numpy.ndarray
+        Class pixel counts of shape (num_records, num_classes), as returned by
+        ``class_histograms``.
+    power : float
+        Strength of the balancing, 0 gives uniform weights.
+
+    Returns
+    -------
+    weights : numpy.ndarray
+        float64 array of shape (num_records,), normalized to a mean of 1.
+    """
+    hist = np.asarray(hist, dtype=np.float64)
+    freq = hist.sum(axis=0)
+    class_weights = np.zeros_like(freq)
+    class_weights[freq > 0] = (freq[freq > 0] / freq.sum()) ** -power
+    pixels = hist.sum(axis=1)
+    weights = np.zeros(hist.shape[0])
+    valid = pixels > 0
+    weights[valid] = hist[valid].dot(class_weights) / pixels[valid]
+    return weights / weights.mean()
+
+def save_sample_weights(path, keys, weights):
+    """Writes per record sampling weights for the `sample_weights` option of
+    ``ImageSegRecordIter``.
+
+    The file is replaced atomically, so it can be updated while an iterator is
+    running, for example from per sample losses, and the new weights are
+    picked up at the beginning of the next epoch.
+
+    Parameters
+    ----------
+    path : str
+        Path to the weight file.
+    keys : list of int
+        Record keys.
+    weights : list of float or numpy.ndarray
+        Non-negative weight of each record.
+    """
+    assert len(keys) == len(weights), "keys and weights must have the same length"
+    with open(path + '.tmp', 'w') as fout:
+        for key, weight in zip(keys, weights):
+            fout.write('%d\t%.9g\n' % (key, weight))
+    # os.rename does not replace existing files on Windows
+    getattr(os, 'replace', os.rename)(path + '.tmp', path)
@@ -43,6 +43,12 @@
 #include <memory>
 #include <functional>
 #include <utility>
+#if !defined(_WIN32)
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
 #include "./c_api_common.h"
 #include "../operator/custom/custom-inl.h"
 
@@ -256,6 +262,20 @@ int MXNDArrayWaitToRead(NDArrayHandle handle) {
   API_END();
 }
 
+int MXNDArrayCallOnReady(NDArrayHandle handle,
+                         NDArrayReadyCallback callback,
+                         void *callback_handle) {
+  API_BEGIN();
+  // the copy keeps the variable alive until the callback has run
+  NDArray arr = *static_cast<NDArray*>(handle);
+  Engine::Get()->PushAsync(
+    [arr, callback, callback_handle](RunContext rctx, Engine::CallbackOnComplete on_complete) {
+      callback(callback_handle);
+      on_complete();
+    }, Context::CPU(), {arr.var()}, {}, FnProperty::kNormal, 0, "NDArrayCallOnReady");
+  API_END();
+}
+
 int MXNDArrayWaitToWrite(NDArrayHandle handle) {
   API_BEGIN();
   static_cast<NDArray*>(handle)->WaitToWrite();
@@ -322,6 +342,54 @@ int MXNDArrayLoad(const char* fname,
   API_END();
 }
 
+int MXNDArrayCreateFromMappedFile(const char *fname,
+                                  mx_uint num_arrays,
+                                  const size_t *offsets,
+                                  const mx_uint *ndims,
+                                  const mx_uint *shapes,
+                                  const int *dtypes,
+                                  NDArrayHandle *out) {
+  API_BEGIN();
+#if defined(_WIN32)
+  LOG(FATAL) << "Memory mapped NDArrays are not supported on Windows";
+#else
+  int fd = open(fname, O_RDONLY);
+  CHECK_NE(fd, -1) << "Cannot open " << fname;
+  struct stat st;
+  const int stat_ret = fstat(fd, &st);
+  const size_t size = stat_ret == 0 ? static_cast<size_t>(st.st_size) : 0;
+  std::shared_ptr<void> mapping;
+  if (stat_ret == 0 && size != 0) {
+    // private writable mapping: pages are shared until the arrays are written to
+    void *addr = mmap(nullptr, size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    if (addr != MAP_FAILED) {
+      mapping = std::shared_ptr<void>(addr, [size](void *p) { munmap(p, size); });
+    }
+  }
+  close(fd);
+  CHECK_EQ(stat_ret, 0) << "Cannot stat " << fname;
+  CHECK(size == 0 || mapping != nullptr) << "Cannot map " << fname;
+  std::vector<TShape> arr_shapes;
+  for (mx_uint i = 0; i < num_arrays; ++i) {
+    arr_shapes.emplace_back(shapes, shapes + ndims[i]);
+    shapes += ndims[i];
+    const size_t nbytes = arr_shapes[i].Size() * mshadow::mshadow_sizeof(dtypes[i]);
+    CHECK(nbytes == 0 || offsets[i] + nbytes <= size)
+      << "Array " << i << " is out of the bounds of " << fname;
+  }
+  for (mx_uint i = 0; i < num_arrays; ++i) {
+    if (arr_shapes[i].Size() == 0) {
+      out[i] = new NDArray(arr_shapes[i], Context::CPU(), true, dtypes[i]);
+      continue;
+    }
+    TBlob data(static_cast<char*>(mapping.get()) + offsets[i], arr_shapes[i],
+               cpu::kDevMask, dtypes[i], 0);
+    out[i] = new NDArray(data, 0, mapping);
+  }
+#endif
+  API_END();
+}
+
 int MXNDArrayLoadFromBuffer(const void *ndarray_buffer,
                             size_t size,
                             mx_uint *out_size,
@@ -739,6 +807,42 @@ int MXDataIterGetPadNum(DataIterHandle handle, int *pad) {
   API_END();
 }
 
+int MXDataIterGetStats(DataIterHandle handle, int reset, mx_uint *out_size,
+                       const char ***out_keys, const double **out_vals) {
+  MXAPIThreadLocalEntry *ret = MXAPIThreadLocalStore::Get();
+  API_BEGIN();
+  std::vector<std::pair<std::string, double> > stats =
+    static_cast<IIterator<DataBatch>* >(handle)->GetStats(reset != 0);
+  ret->ret_vec_str.clear();
+  ret->ret_vec_charp.clear();
+  ret->ret_vec_double.clear();
+  for (const auto& kv : stats) {
+    ret->ret_vec_str.push_back(kv.first);
+    ret->ret_vec_double.push_back(kv.second);
+  }
+  for (const auto& key : ret->ret_vec_str) {
+    ret->ret_vec_charp.push_back(key.c_str());
+  }
+  *out_size = static_cast<mx_uint>(stats.size());
+  *out_keys = dmlc::BeginPtr(ret->ret_vec_charp);
+  *out_vals = dmlc::BeginPtr(ret->ret_vec_double);
+  API_END();
+}
+
+int MXDataIterGetState(DataIterHandle handle, const char **out) {
+  MXAPIThreadLocalEntry *ret = MXAPIThreadLocalStore::Get();
+  API_BEGIN();
+  ret->ret_str = static_cast<IIterator<DataBatch>* >(handle)->GetState();
+  *out = ret->ret_str.c_str();
+  API_END();
+}
+
+int MXDataIterSetState(DataIterHandle handle, const char *state) {
+  API_BEGIN();
+  static_cast<IIterator<DataBatch>* >(handle)->SetState(state);
+  API_END();
+}
+
 int MXKVStoreCreate(const char *type,
                     KVStoreHandle *out) {
   API_BEGIN();
@@ -73,6 +73,8 @@ struct MXAPIThreadLocalEntry {
   std::vector<const char *> ret_vec_charp;
   /*! \brief result holder for returning handles */
   std::vector<void *> ret_handles;
+  /*! \brief result holder for returning doubles */
+  std::vector<double> ret_vec_double;
   /*! \brief holder for NDArray handles */
   std::vector<NDArray*> ndinputs, ndoutputs;
   /*! \brief result holder for returning shapes */
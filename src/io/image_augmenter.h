@@ -62,6 +62,27 @@ class ImageAugmenter {
 
   virtual cv::Mat Process(const cv::Mat &src, const cv::Mat &label, cv::Mat *out_label,
                   common::RANDOM_ENGINE *prnd, const std::map<int, int>& label_id_map) = 0;
+  /*!
+   * \brief sample the region of a width x height source image that the next
+   *  call to Process will keep, so that the caller can decode only that region.
+   *  If it returns true, the caller must pass the cropped image and label to
+   *  the next Process call, which then skips its own cropping.
+   * \param width width of the encoded source image
+   * \param height height of the encoded source image
+   * \param prnd pointer to random number generator.
+   * \param roi the region of the source image to decode
+   * \return false if the augmenter does not support cropping before decoding.
+   */
+  virtual bool PlanCrop(int width, int height, common::RANDOM_ENGINE *prnd, cv::Rect *roi) {
+    return false;
+  }
+  /*!
+   * \brief set the size of the images produced by the following Process calls,
+   *  which otherwise is data_shape. Used to batch samples into shape buckets.
+   * \param height output height
+   * \param width output width
+   */
+  virtual void SetOutputShape(int height, int width) {}
   // virtual destructor
   virtual ~ImageAugmenter() {}
   /*!
@@ -34,6 +34,7 @@
 #include <nnvm/op_attr_types.h>
 #include <nnvm/tuple.h>
 
+#include <algorithm>
 #include <fstream>
 
 #include "../operator/elemwise_op_common.h"
@@ -100,6 +101,8 @@ bool get_png_size(const uint8_t* data, uint32_t data_size, int64_t *width, int64
 struct ImdecodeParam : public dmlc::Parameter<ImdecodeParam> {
   int flag;
   bool to_rgb;
+  int min_size;
+  int reduce;
   DMLC_DECLARE_PARAMETER(ImdecodeParam) {
     DMLC_DECLARE_FIELD(flag)
     .set_lower_bound(0)
@@ -109,6 +112,16 @@ struct ImdecodeParam : public dmlc::Parameter<ImdecodeParam> {
     .set_default(true)
     .describe("Whether to convert decoded image to mxnet's default RGB format "
               "(instead of opencv's default BGR).");
+    DMLC_DECLARE_FIELD(min_size)
+    .set_lower_bound(0)
+    .set_default(0)
+    .describe("If positive, JPEG images are decoded at the smallest scale out of "
+              "1, 1/2, 1/4 and 1/8 at which their shorter edge is at least min_size.");
+    DMLC_DECLARE_FIELD(reduce)
+    .set_range(0, 8)
+    .set_default(0)
+    .describe("If positive, JPEG images are decoded at 1/reduce of their size, "
+              "one of 1, 2, 4 or 8. Overrides min_size.");
   }
 };
 
@@ -136,10 +149,28 @@ DMLC_REGISTER_PARAMETER(ImreadParam);
 
 
 #if MXNET_USE_OPENCV
+// Gets the factor of the DCT scaling libjpeg decodes a width x height JPEG with.
+int JpegReduceFactor(const ImdecodeParam& param, int64_t width, int64_t height) {
+#if (CV_MAJOR_VERSION > 3 || (CV_MAJOR_VERSION == 3 && CV_MINOR_VERSION >= 2))
+  if (param.reduce > 0) return param.reduce;
+  if (param.min_size == 0) return 1;
+  const int64_t short_edge = std::min(width, height);
+  int factor = 8;
+  while (factor > 1 && (short_edge + factor - 1) / factor < param.min_size) {
+    factor /= 2;
+  }
+  return factor;
+#else
+  return 1;
+#endif
+}
+
 void ImdecodeImpl(int flag, bool to_rgb, void* data, size_t size,
-                  NDArray* out) {
+                  NDArray* out, int reduce = 1) {
   cv::Mat buf(1, size, CV_8U, data);
   cv::Mat dst;
+  // IMREAD_REDUCED_{GRAYSCALE,COLOR}_{2,4,8} are the grayscale/color flag | 8 * factor
+  const int reduce_flag = reduce > 1 ? reduce * 8 : 0;
   if (out->is_none()) {
     cv::Mat res = cv::imdecode(buf, flag);
     if (res.empty()) {
@@ -157,13 +188,13 @@ void ImdecodeImpl(int flag, bool to_rgb, void* data, size_t size,
     dst = cv::Mat(out->shape()[0], out->shape()[1], flag == 0 ? CV_8U : CV_8UC3,
                 out->data().dptr_);
 #if (CV_MAJOR_VERSION > 3 || (CV_MAJOR_VERSION == 3 && CV_MINOR_VERSION >= 3))
-    cv::imdecode(buf, flag | cv::IMREAD_IGNORE_ORIENTATION, &dst);
+    cv::imdecode(buf, flag | reduce_flag | cv::IMREAD_IGNORE_ORIENTATION, &dst);
     CHECK(!dst.empty()) << "Decoding failed. Invalid image file.";
 #elif(CV_MAJOR_VERSION > 2 || (CV_MAJOR_VERSION == 2 && CV_MINOR_VERSION >= 4))
-    cv::imdecode(buf, flag, &dst);
+    cv::imdecode(buf, flag | reduce_flag, &dst);
     CHECK(!dst.empty()) << "Decoding failed. Invalid image file.";
 #else
-    cv::Mat tmp = cv::imdecode(buf, flag);
+    cv::Mat tmp = cv::imdecode(buf, flag | reduce_flag);
     CHECK(!tmp.empty()) << "Decoding failed. Invalid image file.";
     tmp.copyTo(dst);
     CHECK(!dst.empty()) << "Failed copying buffer to output.";
@@ -184,13 +215,19 @@ void Imdecode(const nnvm::NodeAttrs& attrs,
 
   CHECK_EQ(inputs[0].ctx().dev_mask(), Context::kCPU) << "Only supports cpu input";
   CHECK_EQ(inputs[0].dtype(), mshadow::kUint8) << "Input needs to be uint8 buffer";
+  CHECK_EQ(param.reduce & (param.reduce - 1), 0) << "reduce must be 1, 2, 4 or 8";
   inputs[0].WaitToRead();
 
   uint8_t* str_img = inputs[0].data().dptr<uint8_t>();
   size_t len = inputs[0].shape().Size();
   TShape oshape(3);
   oshape[2] = param.flag == 0 ? 1 : 3;
+  int reduce = 1;
   if (get_jpeg_size(str_img, len, &oshape[1], &oshape[0])) {
+    // libjpeg rounds the scaled size up
+    reduce = JpegReduceFactor(param, oshape[1], oshape[0]);
+    oshape[0] = (oshape[0] + reduce - 1) / reduce;
+    oshape[1] = (oshape[1] + reduce - 1) / reduce;
   } else if (get_png_size(str_img, len, &oshape[1], &oshape[0])) {
   } else {
     (*outputs)[0] = NDArray();
@@ -201,9 +238,9 @@ void Imdecode(const nnvm::NodeAttrs& attrs,
   const NDArray& ndin = inputs[0];
   NDArray& ndout = (*outputs)[0];
   ndout = NDArray(oshape, Context::CPU(), true, mshadow::kUint8);
-  Engine::Get()->PushSync([ndin, ndout, str_img, len, param](RunContext ctx){
+  Engine::Get()->PushSync([ndin, ndout, str_img, len, param, reduce](RunContext ctx){
       ImdecodeImpl(param.flag, param.to_rgb, str_img, len,
-                   const_cast<NDArray*>(&ndout));
+                   const_cast<NDArray*>(&ndout), reduce);
     }, ndout.ctx(), {ndin.var()}, {ndout.var()},
     FnProperty::kNormal, 0, PROFILER_MESSAGE("Imdecode"));
 #else
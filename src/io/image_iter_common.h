@@ -202,6 +202,19 @@ struct ImageRecordParam: public dmlc::Parameter<ImageRecordParam> {
   }
 };
 
+// parameters of the position of image record iterators
+struct ImageRecordStateParam : public dmlc::Parameter<ImageRecordStateParam> {
+  /*! \brief whether the position can be saved and restored */
+  bool stateful;
+  // declare parameters
+  DMLC_DECLARE_PARAMETER(ImageRecordStateParam) {
+    DMLC_DECLARE_FIELD(stateful).set_default(false)
+        .describe("Whether the position of the iterator can be saved by get_state and "
+                  "restored by set_state. Requires path_imgidx. Records are then read "
+                  "in a different shuffle order than with stateful=False.");
+  }
+};
+
 // normalize parameters
 struct ImageNormalizeParam :  public dmlc::Parameter<ImageNormalizeParam> {
   /*! \brief random seed */
@@ -361,6 +374,20 @@ struct ImageSegRecParserParam : public dmlc::Parameter<ImageSegRecParserParam> {
     int shuffle_chunk_seed;
     /*! \brief scale of label data, must be divisible by 1*/
     float label_scale;
+    /*! \brief whether to pick the crop window before decoding */
+    bool crop_before_decode;
+    /*! \brief memory budget of the decoded sample cache in MB */
+    size_t decode_cache_size;
+    /*! \brief path of the decoded sample cache spill file */
+    std::string decode_cache_spill_path;
+    /*! \brief size of the decoded sample cache spill file in MB */
+    size_t decode_cache_spill_size;
+    /*! \brief path to per record sampling weights */
+    std::string sample_weights;
+    /*! \brief number of records drawn per epoch in weighted sampling */
+    int num_samples;
+    /*! \brief (height, width) pairs of the shape buckets */
+    TShape bucket_shapes;
 
     // declare parameters
     DMLC_DECLARE_PARAMETER(ImageSegRecParserParam) {
@@ -397,6 +424,38 @@ struct ImageSegRecParserParam : public dmlc::Parameter<ImageSegRecParserParam> {
             .describe("The random seed for shuffling");
             DMLC_DECLARE_FIELD(label_scale).set_default(1.0f)
             .describe("scale of label data, must be divisible by 1");
+            DMLC_DECLARE_FIELD(crop_before_decode).set_default(false)
+            .describe("Pick the random crop window from the encoded image size before "
+              "decoding, then decode JPEG images with DCT downscaling and RLE labels "
+              "only within the window. Requires libjpeg-turbo.");
+            DMLC_DECLARE_FIELD(decode_cache_size).set_default(0)
+            .describe("Memory budget in MB of a cache of decoded images and labels, keyed "
+              "by record id, that lets later epochs skip decoding. Least recently used "
+              "samples are evicted first. 0 disables the cache. Record ids must be unique. "
+              "Takes precedence over crop_before_decode.");
+            DMLC_DECLARE_FIELD(decode_cache_spill_path).set_default("")
+            .describe("If set, samples evicted from the decoded sample cache are written "
+              "to this memory mapped file, which is removed when the iterator is destroyed. "
+              "Samples read from the file move back to memory and free their space, the "
+              "least recently written samples are dropped when it is full.");
+            DMLC_DECLARE_FIELD(decode_cache_spill_size).set_default(0)
+            .describe("Size in MB of the decoded sample cache spill file, which is "
+              "allocated with this size when the iterator is created.");
+            DMLC_DECLARE_FIELD(sample_weights).set_default("")
+            .describe("Path to a file of per record sampling weights, one "\
+              "<record key> <weight> pair per line. If set, records are drawn with "\
+              "replacement with probability proportional to their weight instead of "\
+              "being read in order. The file is read again at the beginning of every "\
+              "epoch, records it does not list keep their previous weight, initially 1. "\
+              "Requires path_imgidx, the position can then be saved as with stateful=True.");
+            DMLC_DECLARE_FIELD(num_samples).set_default(0)
+            .describe("Number of records drawn per epoch with sample_weights, "\
+              "0 for the number of records in the partition.");
+            DMLC_DECLARE_FIELD(bucket_shapes).set_default(TShape())
+            .describe("Flattened (height, width) pairs of output shape buckets, e.g. "\
+              "(512, 1024, 768, 768). If set, every sample is warped to the bucket closest "\
+              "to its size in log scale, and each batch holds samples of a single bucket. "\
+              "The last batch of every bucket is padded, round_batch is ignored.");
     }
 };
 
@@ -155,7 +155,7 @@ std::vector <dmlc::ParamFieldInfo> ListDefaultSegAugParams() {
 class ImageSegAugmenter : public ImageAugmenter {
  public:
   // contructor
-  ImageSegAugmenter() {
+  ImageSegAugmenter() : crop_planned_(false), out_height_(0), out_width_(0) {
     rotateM_ = cv::Mat(2, 3, CV_32F);
   }
   void Init(const std::vector<std::pair<std::string, std::string> >& kwargs) override {
@@ -173,6 +173,13 @@ class ImageSegAugmenter : public ImageAugmenter {
           }
         }
     }
+    out_height_ = param_.data_shape[1];
+    out_width_ = param_.data_shape[2];
+  }
+
+  void SetOutputShape(int height, int width) override {
+    out_height_ = height;
+    out_width_ = width;
   }
   /*!
    * \brief get interpolation method with given inter_method, 0-CV_INTER_NN 1-CV_INTER_LINEAR 2-CV_INTER_CUBIC
@@ -337,13 +344,56 @@ class ImageSegAugmenter : public ImageAugmenter {
     return res;
   }
 
+  bool NeedRandomCrop() const {
+    return param_.max_random_scale != 1.0 || param_.min_random_scale != 1.0
+        || (param_.max_aspect_ratio > 0.0f && param_.min_aspect_ratio > 0.0f);
+  }
+
+  /*! \brief sample random scale and aspect-ratio patch as fractions of the image size */
+  void SampleCrop(common::RANDOM_ENGINE *prnd, float *left, float *top, float *ws, float *hs) {
+    std::uniform_real_distribution<float> rand_uniform(0, 1);
+    float scale(1.0);
+    if (param_.max_random_scale >= param_.min_random_scale) {
+      scale = rand_uniform(*prnd) *
+        (param_.max_random_scale - param_.min_random_scale) + param_.min_random_scale;
+    }
+    float ratio(1.0);
+    float min_ratio = std::max(param_.min_aspect_ratio, scale * scale);
+    float max_ratio = std::min(param_.max_aspect_ratio, float(1.0 / scale / scale));
+    if (max_ratio > min_ratio) {
+      ratio = std::sqrt(rand_uniform(*prnd) * (max_ratio - min_ratio) + min_ratio);
+    }
+    *ws = scale * ratio;
+    *hs = scale / ratio;
+    // [0, 1 - ws], [0, 1 - hs]
+    *left = rand_uniform(*prnd) * (1 - *ws);
+    *top = rand_uniform(*prnd) * (1 - *hs);
+  }
+
+  bool PlanCrop(int width, int height, common::RANDOM_ENGINE *prnd, cv::Rect *roi) override {
+    // resize before cropping does not change the crop fractions, but padding does
+    if (!NeedRandomCrop() || param_.pad > 0) return false;
+    float left, top, ws, hs;
+    SampleCrop(prnd, &left, &top, &ws, &hs);
+    *roi = cv::Rect(static_cast<int>(left * width), static_cast<int>(top * height),
+                    std::max(static_cast<int>(ws * width), 1),
+                    std::max(static_cast<int>(hs * height), 1));
+    *roi &= cv::Rect(0, 0, width, height);
+    crop_planned_ = true;
+    return true;
+  }
+
   cv::Mat Process(const cv::Mat &src, const cv::Mat &label, cv::Mat *out_label,
                   common::RANDOM_ENGINE *prnd, const std::map<int, int>& label_id_map) override {
     using mshadow::index_t;
     cv::Mat res;
     cv::Mat res_label;
+    // src and label were cropped by the caller with the region from PlanCrop,
+    // the final warp to data_shape makes the resize below redundant
+    const bool cropped = crop_planned_;
+    crop_planned_ = false;
 
-    if (param_.resize != -1) {
+    if (param_.resize != -1 && !cropped) {
       int new_height, new_width;
       if (src.rows > src.cols) {
         new_height = param_.resize*src.rows/src.cols;
@@ -367,25 +417,9 @@ class ImageSegAugmenter : public ImageAugmenter {
     }
 
     // Crop random scale and aspect-ratio patch
-    if (param_.max_random_scale != 1.0 || param_.min_random_scale != 1.0
-        || (param_.max_aspect_ratio > 0.0f && param_.min_aspect_ratio > 0.0f)) {
-      std::uniform_real_distribution<float> rand_uniform(0, 1);
-      float scale(1.0);
-      if (param_.max_random_scale >= param_.min_random_scale) {
-        scale = rand_uniform(*prnd) *
-          (param_.max_random_scale - param_.min_random_scale) + param_.min_random_scale;
-      }
-      float ratio(1.0);
-      float min_ratio = std::max(param_.min_aspect_ratio, scale * scale);
-      float max_ratio = std::min(param_.max_aspect_ratio, float(1.0 / scale / scale));
-      if (max_ratio > min_ratio) {
-        ratio = std::sqrt(rand_uniform(*prnd) * (max_ratio - min_ratio) + min_ratio);
-      }
-      float ws = scale * ratio;
-      float hs = scale / ratio;
-      // [0, 1 - ws], [0, 1 - hs]
-      float left = rand_uniform(*prnd) * (1 - ws);
-      float top = rand_uniform(*prnd) * (1 - hs);
+    if (!cropped && NeedRandomCrop()) {
+      float left, top, ws, hs;
+      SampleCrop(prnd, &left, &top, &ws, &hs);
 
       // Crop it
       int width = res.cols;
@@ -450,10 +484,10 @@ class ImageSegAugmenter : public ImageAugmenter {
         cvtColor(res, res, CV_HLS2BGR);
     }
 
-    // Warp to data_shape
+    // Warp to data_shape, or the shape set by SetOutputShape
     // Pad: int top, int bottom, int left, int right
-    int th = param_.data_shape[1];
-    int tw = param_.data_shape[2];
+    int th = out_height_;
+    int tw = out_width_;
     int oh = res.rows;
     int ow = res.cols;
     if (1.0 * oh / ow > 1.0 * th / tw) {
@@ -524,6 +558,10 @@ class ImageSegAugmenter : public ImageAugmenter {
   // rotation param
   cv::Mat rotateM_;
   cv::Mat map_mat_;
+  // whether the next Process call receives an input cropped by PlanCrop
+  bool crop_planned_;
+  // output size
+  int out_height_, out_width_;
   // parameters
   ImageSegAugmentParam param_;
   /*! \brief list of possible rotate angle */
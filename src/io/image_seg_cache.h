@@ -0,0 +1,260 @@
+/*
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+
+/*!
+ *  Copyright (c) 2018 by Contributors
+ * \file image_seg_cache.h
+ * \brief bounded cache of decoded segmentation samples
+ */
+#ifndef MXNET_IO_IMAGE_SEG_CACHE_H_
+#define MXNET_IO_IMAGE_SEG_CACHE_H_
+
+#if MXNET_USE_OPENCV
+#include <dmlc/logging.h>
+#include <opencv2/opencv.hpp>
+#include <cstring>
+#include <iterator>
+#include <list>
+#include <map>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+#include <utility>
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+
+namespace mxnet {
+namespace io {
+/*!
+ * \brief thread safe LRU cache of decoded (image, label) pairs keyed by record id.
+ *  Entries evicted from memory are optionally spilled to a memory mapped file of
+ *  fixed size. Entries read from the spill file move back to memory and free their
+ *  region, and the least recently spilled entries are dropped when it is full.
+ */
+class DecodedSegCache {
+ public:
+  /*!
+   * \brief constructor
+   * \param capacity memory budget in bytes
+   * \param spill_path path of the spill file, empty to disable spilling
+   * \param spill_capacity size of the spill file in bytes
+   */
+  DecodedSegCache(size_t capacity, const std::string &spill_path, size_t spill_capacity)
+      : capacity_(capacity), size_(0), spill_path_(spill_path), spill_fd_(-1),
+        spill_data_(nullptr), spill_capacity_(0) {
+    if (spill_path.length() == 0 || spill_capacity == 0) return;
+#ifndef _WIN32
+    spill_fd_ = open(spill_path.c_str(), O_RDWR | O_CREAT | O_TRUNC, 0600);
+    CHECK_GE(spill_fd_, 0) << "Cannot open decode cache spill file " << spill_path;
+    CHECK_EQ(ftruncate(spill_fd_, spill_capacity), 0)
+      << "Cannot allocate " << spill_capacity << " bytes for " << spill_path;
+    void *data = mmap(nullptr, spill_capacity, PROT_READ | PROT_WRITE, MAP_SHARED, spill_fd_, 0);
+    CHECK(data != MAP_FAILED) << "Cannot mmap decode cache spill file " << spill_path;
+    spill_data_ = static_cast<char*>(data);
+    spill_capacity_ = spill_capacity;
+    free_.emplace(0, spill_capacity);
+#else
+    LOG(WARNING) << "Decode cache spilling is not supported on Windows";
+#endif
+  }
+
+  ~DecodedSegCache() {
+#ifndef _WIN32
+    if (spill_data_ != nullptr) {
+      munmap(spill_data_, spill_capacity_);
+    }
+    if (spill_fd_ >= 0) {
+      close(spill_fd_);
+      unlink(spill_path_.c_str());
+    }
+#endif
+  }
+
+  /*!
+   * \brief look up a record, copying the cached pair into image and label.
+   * \return false if the record is not cached.
+   */
+  bool Get(uint64_t key, cv::Mat *image, cv::Mat *label) {
+    cv::Mat cached_image, cached_label;
+    {
+      std::lock_guard<std::mutex> lock(mutex_);
+      auto it = entries_.find(key);
+      if (it != entries_.end()) {
+        lru_.splice(lru_.begin(), lru_, it->second.pos);
+        cached_image = it->second.image;
+        cached_label = it->second.label;
+      } else {
+        auto sit = spilled_.find(key);
+        if (sit == spilled_.end()) return false;
+        // copy out before the region is freed and reused
+        const SpillEntry &s = sit->second;
+        Entry entry;
+        entry.image = cv::Mat(s.image_rows, s.image_cols, s.image_type,
+                              spill_data_ + s.offset).clone();
+        entry.label = cv::Mat(s.label_rows, s.label_cols, s.label_type,
+                              spill_data_ + s.offset + Bytes(entry.image)).clone();
+        cached_image = entry.image;
+        cached_label = entry.label;
+        this->Unspill(key);
+        this->Insert(key, std::move(entry));
+      }
+    }
+    // augmenters may modify their input in place, so hand out copies
+    cached_image.copyTo(*image);
+    cached_label.copyTo(*label);
+    return true;
+  }
+
+  /*! \brief insert a decoded pair, evicting least recently used entries if needed */
+  void Put(uint64_t key, const cv::Mat &image, const cv::Mat &label) {
+    const size_t bytes = Bytes(image) + Bytes(label);
+    if (bytes > capacity_) return;
+    Entry entry;
+    entry.image = image.clone();
+    entry.label = label.clone();
+    std::lock_guard<std::mutex> lock(mutex_);
+    if (entries_.count(key) != 0 || spilled_.count(key) != 0) return;
+    this->Insert(key, std::move(entry));
+  }
+
+ private:
+  struct Entry {
+    cv::Mat image;
+    cv::Mat label;
+    std::list<uint64_t>::iterator pos;
+  };
+  struct SpillEntry {
+    size_t offset, bytes;
+    int image_rows, image_cols, image_type;
+    int label_rows, label_cols, label_type;
+    std::list<uint64_t>::iterator pos;
+  };
+
+  static size_t Bytes(const cv::Mat &m) {
+    return m.total() * m.elemSize();
+  }
+
+  // must be called with mutex_ held, inserts an entry that fits into capacity_
+  void Insert(uint64_t key, Entry &&entry) {
+    const size_t bytes = Bytes(entry.image) + Bytes(entry.label);
+    while (size_ + bytes > capacity_ && !lru_.empty()) {
+      auto it = entries_.find(lru_.back());
+      lru_.pop_back();
+      size_ -= Bytes(it->second.image) + Bytes(it->second.label);
+      this->Spill(it->first, it->second);
+      entries_.erase(it);
+    }
+    lru_.push_front(key);
+    entry.pos = lru_.begin();
+    entries_.emplace(key, std::move(entry));
+    size_ += bytes;
+  }
+
+  // must be called with mutex_ held, entries are cloned so they are continuous
+  void Spill(uint64_t key, const Entry &entry) {
+    if (spill_data_ == nullptr) return;
+    const size_t image_bytes = Bytes(entry.image);
+    // keep entries 64 byte aligned
+    const size_t bytes = (image_bytes + Bytes(entry.label) + 63) / 64 * 64;
+    if (bytes > spill_capacity_) return;
+    size_t offset;
+    while (!this->Allocate(bytes, &offset)) {
+      // all regions are free once spill_lru_ is empty, so this terminates
+      this->Unspill(spill_lru_.back());
+    }
+    std::memcpy(spill_data_ + offset, entry.image.data, image_bytes);
+    std::memcpy(spill_data_ + offset + image_bytes, entry.label.data, Bytes(entry.label));
+    SpillEntry s;
+    s.offset = offset;
+    s.bytes = bytes;
+    s.image_rows = entry.image.rows;
+    s.image_cols = entry.image.cols;
+    s.image_type = entry.image.type();
+    s.label_rows = entry.label.rows;
+    s.label_cols = entry.label.cols;
+    s.label_type = entry.label.type();
+    spill_lru_.push_front(key);
+    s.pos = spill_lru_.begin();
+    spilled_.emplace(key, s);
+  }
+
+  // must be called with mutex_ held, removes a spilled entry and frees its region
+  void Unspill(uint64_t key) {
+    auto it = spilled_.find(key);
+    this->Free(it->second.offset, it->second.bytes);
+    spill_lru_.erase(it->second.pos);
+    spilled_.erase(it);
+  }
+
+  // first fit allocation of a spill file region
+  bool Allocate(size_t bytes, size_t *offset) {
+    for (auto it = free_.begin(); it != free_.end(); ++it) {
+      if (it->second < bytes) continue;
+      *offset = it->first;
+      if (it->second > bytes) free_.emplace(it->first + bytes, it->second - bytes);
+      free_.erase(it);
+      return true;
+    }
+    return false;
+  }
+
+  // return a region to free_, merging it with its free neighbours
+  void Free(size_t offset, size_t bytes) {
+    auto next = free_.lower_bound(offset);
+    if (next != free_.end() && offset + bytes == next->first) {
+      bytes += next->second;
+      next = free_.erase(next);
+    }
+    if (next != free_.begin()) {
+      auto prev = std::prev(next);
+      if (prev->first + prev->second == offset) {
+        prev->second += bytes;
+        return;
+      }
+    }
+    free_.emplace(offset, bytes);
+  }
+
+  /*! \brief protects all members below */
+  std::mutex mutex_;
+  /*! \brief memory budget and usage in bytes */
+  size_t capacity_, size_;
+  /*! \brief record ids, most recently used first */
+  std::list<uint64_t> lru_;
+  /*! \brief in-memory entries */
+  std::unordered_map<uint64_t, Entry> entries_;
+  /*! \brief spill file */
+  std::string spill_path_;
+  int spill_fd_;
+  char *spill_data_;
+  size_t spill_capacity_;
+  /*! \brief entries in the spill file */
+  std::unordered_map<uint64_t, SpillEntry> spilled_;
+  /*! \brief spilled record ids, most recently spilled first */
+  std::list<uint64_t> spill_lru_;
+  /*! \brief free regions of the spill file, offset to size */
+  std::map<size_t, size_t> free_;
+};
+}  // namespace io
+}  // namespace mxnet
+#endif  // MXNET_USE_OPENCV
+#endif  // MXNET_IO_IMAGE_SEG_CACHE_H_
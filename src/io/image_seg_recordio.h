@@ -33,11 +33,19 @@ namespace mxnet {
 namespace io {
 /*! \brief image recordio struct */
 struct ImageSegRecordIO {
+  /*! \brief encoding of the label string, stored in the high byte of flag */
+  enum LabelCodec {
+    /*! \brief label is an image encoded by OpenCV, e.g. PNG */
+    kLabelImage = 0,
+    /*! \brief label is a run-length encoded uint8 mask */
+    kLabelRLE = 1
+  };
   /*! \brief header in image recordio */
   struct Header {
       /*!
        * \brief flag of the header,
-       *  used for future extension purposes
+       *  the high byte stores the LabelCodec,
+       *  the rest is used for future extension purposes
        */
       uint32_t flag;
       /*!
@@ -89,6 +97,10 @@ struct ImageSegRecordIO {
   inline uint64_t image_index(void) const {
     return header.image_id[0];
   }
+  /*! \brief get the encoding of label_data */
+  inline int label_codec(void) const {
+    return static_cast<int>(header.flag >> 24U);
+  }
 
   /*!
    * \brief load header from a record content
@@ -0,0 +1,239 @@
+/*
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+
+/*!
+ *  Copyright (c) 2018 by Contributors
+ * \file image_seg_stats.h
+ * \brief per stage throughput and latency statistics of the segmentation iterators
+ */
+#ifndef MXNET_IO_IMAGE_SEG_STATS_H_
+#define MXNET_IO_IMAGE_SEG_STATS_H_
+
+#include <atomic>
+#include <chrono>
+#include <memory>
+#include <string>
+#include <utility>
+#include <vector>
+#include "../profiler/profiler.h"
+
+namespace mxnet {
+namespace io {
+/*!
+ * \brief lock free per thread counters and latency histograms of the pipeline stages.
+ *  Every preprocess thread owns one slot, the batch thread which reads records and
+ *  assembles batches owns the last one. While the profiler is running each timed
+ *  scope is also emitted as a profiler task, and record/byte counts as counters.
+ */
+class SegIterStats {
+ public:
+  enum Stage {
+    kRead = 0,
+    kImageDecode,
+    kLabelDecode,
+    kAugment,
+    kNormalize,
+    kAssemble,
+    kNumStages
+  };
+  /*! \brief histogram buckets, upper bounds are 0.25ms * 2^i, the last one is unbounded */
+  static const int kNumBuckets = 14;
+
+  /*! \brief RAII timer adding its lifetime to a stage */
+  class Scope {
+   public:
+    Scope(SegIterStats *stats, int tid, Stage stage)
+        : stats_(stats), tid_(tid), stage_(stage),
+          start_(std::chrono::steady_clock::now()) {
+#if MXNET_USE_PROFILER
+      if (profiler::Profiler::Get()->GetState() == profiler::Profiler::kRunning) {
+        task_.reset(new profiler::ProfileTask(StageName(stage), &stats->domain_));
+        task_->start();
+      }
+#endif
+    }
+    ~Scope() {
+      const auto elapsed = std::chrono::steady_clock::now() - start_;
+      stats_->AddTime(tid_, stage_,
+          std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count());
+#if MXNET_USE_PROFILER
+      if (task_ != nullptr) task_->stop();
+#endif
+    }
+
+   private:
+    SegIterStats *stats_;
+    int tid_;
+    Stage stage_;
+    std::chrono::steady_clock::time_point start_;
+#if MXNET_USE_PROFILER
+    std::unique_ptr<profiler::ProfileTask> task_;
+#endif
+  };
+
+  explicit SegIterStats(const char *domain_name)
+#if MXNET_USE_PROFILER
+      : domain_(domain_name), records_counter_("records", &domain_),
+        bytes_counter_("bytes_read", &domain_)
+#endif
+  {
+    this->Reset();
+  }
+
+  /*! \brief allocate slots for num_threads preprocess threads plus the batch thread */
+  void Init(int num_threads) {
+    slots_.clear();
+    for (int i = 0; i <= num_threads; ++i) {
+      slots_.emplace_back(new Slot());
+    }
+    this->Reset();
+  }
+
+  /*! \return slot id of the batch thread */
+  int batch_thread() const {
+    return static_cast<int>(slots_.size()) - 1;
+  }
+
+  void Reset() {
+    for (auto &slot : slots_) slot->Clear();
+    batches_ = 0;
+    start_ = std::chrono::steady_clock::now();
+  }
+
+  void AddRecord(int tid, size_t bytes) {
+    Slot *slot = slots_[tid].get();
+    slot->records.fetch_add(1, std::memory_order_relaxed);
+    slot->bytes.fetch_add(bytes, std::memory_order_relaxed);
+  }
+
+  void AddTime(int tid, Stage stage, int64_t ns) {
+    Slot *slot = slots_[tid].get();
+    slot->ns[stage].fetch_add(ns, std::memory_order_relaxed);
+    int bucket = 0;
+    for (int64_t bound = 250000; bucket < kNumBuckets - 1 && ns > bound; bound *= 2) {
+      ++bucket;
+    }
+    slot->hist[stage][bucket].fetch_add(1, std::memory_order_relaxed);
+  }
+
+  /*! \brief called by the batch thread once a batch is complete */
+  void AddBatch() {
+    batches_.fetch_add(1, std::memory_order_relaxed);
+#if MXNET_USE_PROFILER
+    if (profiler::Profiler::Get()->GetState() == profiler::Profiler::kRunning) {
+      uint64_t records = 0, bytes = 0;
+      for (auto &slot : slots_) {
+        records += slot->records.load(std::memory_order_relaxed);
+        bytes += slot->bytes.load(std::memory_order_relaxed);
+      }
+      records_counter_ = records;
+      bytes_counter_ = bytes;
+    }
+#endif
+  }
+
+  /*!
+   * \brief append the statistics as (name, value) pairs, times are in milliseconds.
+   * \param reset whether to restart counting afterwards
+   */
+  void Get(std::vector<std::pair<std::string, double> > *out, bool reset) {
+    const double elapsed = std::chrono::duration<double>(
+        std::chrono::steady_clock::now() - start_).count();
+    uint64_t records = 0, bytes = 0;
+    uint64_t ns[kNumStages] = {0};
+    uint64_t hist[kNumStages][kNumBuckets] = {{0}};
+    for (size_t i = 0; i < slots_.size(); ++i) {
+      const Slot &slot = *slots_[i];
+      const std::string prefix = i + 1 < slots_.size() ?
+          "thread" + std::to_string(i) + "_" : "batch_thread_";
+      const uint64_t n = slot.records.load(std::memory_order_relaxed);
+      records += n;
+      bytes += slot.bytes.load(std::memory_order_relaxed);
+      if (i + 1 < slots_.size()) out->emplace_back(prefix + "records", n);
+      for (int s = 0; s < kNumStages; ++s) {
+        const uint64_t stage_ns = slot.ns[s].load(std::memory_order_relaxed);
+        ns[s] += stage_ns;
+        for (int b = 0; b < kNumBuckets; ++b) {
+          hist[s][b] += slot.hist[s][b].load(std::memory_order_relaxed);
+        }
+        if (stage_ns != 0) {
+          out->emplace_back(prefix + StageName(static_cast<Stage>(s)) + "_ms", stage_ns * 1e-6);
+        }
+      }
+    }
+    out->emplace_back("elapsed_sec", elapsed);
+    out->emplace_back("batches", batches_.load(std::memory_order_relaxed));
+    out->emplace_back("records", records);
+    out->emplace_back("bytes_read", bytes);
+    out->emplace_back("records_per_sec", elapsed > 0 ? records / elapsed : 0);
+    out->emplace_back("bytes_per_sec", elapsed > 0 ? bytes / elapsed : 0);
+    for (int s = 0; s < kNumStages; ++s) {
+      const std::string name = StageName(static_cast<Stage>(s));
+      out->emplace_back(name + "_ms", ns[s] * 1e-6);
+      double bound = 0.25;
+      for (int b = 0; b < kNumBuckets; ++b, bound *= 2) {
+        std::string le = b + 1 < kNumBuckets ? std::to_string(bound) : "inf";
+        if (b + 1 < kNumBuckets) le.erase(le.find_last_not_of("0") + 1);
+        if (le.back() == '.') le.pop_back();
+        out->emplace_back(name + "_ms_le_" + le, hist[s][b]);
+      }
+    }
+    if (reset) this->Reset();
+  }
+
+  static const char *StageName(Stage stage) {
+    static const char *names[kNumStages] = {
+      "read", "image_decode", "label_decode", "augment", "normalize", "assemble"
+    };
+    return names[stage];
+  }
+
+ private:
+  struct Slot {
+    std::atomic<uint64_t> records;
+    std::atomic<uint64_t> bytes;
+    std::atomic<uint64_t> ns[kNumStages];
+    std::atomic<uint64_t> hist[kNumStages][kNumBuckets];
+    Slot() { Clear(); }
+    void Clear() {
+      records = 0;
+      bytes = 0;
+      for (int s = 0; s < kNumStages; ++s) {
+        ns[s] = 0;
+        for (int b = 0; b < kNumBuckets; ++b) hist[s][b] = 0;
+      }
+    }
+  };
+
+  /*! \brief one slot per preprocess thread, plus the batch thread */
+  std::vector<std::unique_ptr<Slot> > slots_;
+  /*! \brief number of completed batches */
+  std::atomic<uint64_t> batches_;
+  /*! \brief start of the current measurement */
+  std::chrono::steady_clock::time_point start_;
+#if MXNET_USE_PROFILER
+  /*! \brief profiler domain of tasks and counters */
+  profiler::ProfileDomain domain_;
+  profiler::ProfileCounter records_counter_;
+  profiler::ProfileCounter bytes_counter_;
+#endif
+};
+}  // namespace io
+}  // namespace mxnet
+#endif  // MXNET_IO_IMAGE_SEG_STATS_H_
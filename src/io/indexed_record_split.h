@@ -0,0 +1,280 @@
+/*
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+
+/*!
+ *  Copyright (c) 2018 by Contributors
+ * \file indexed_record_split.h
+ * \brief resumable input split over indexed RecordIO files
+ */
+#ifndef MXNET_IO_INDEXED_RECORD_SPLIT_H_
+#define MXNET_IO_INDEXED_RECORD_SPLIT_H_
+
+#include <dmlc/io.h>
+#include <dmlc/logging.h>
+#include <dmlc/recordio.h>
+#include <algorithm>
+#include <fstream>
+#include <memory>
+#include <random>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+namespace mxnet {
+namespace io {
+/*!
+ * \brief input split over an indexed RecordIO file.
+ *  Records of the partition are read in index order, in a random permutation per
+ *  epoch, or drawn with replacement with probability proportional to per record
+ *  weights. Weights are read from a text file of "<key> <weight>" lines at the
+ *  beginning of every epoch, so that they can be updated between epochs.
+ *  The order of an epoch only depends on the random state at its beginning, so
+ *  the split can be positioned at any record of an epoch without reading the
+ *  records before it.
+ */
+class IndexedRecordSplit : public dmlc::InputSplit {
+ public:
+  /*!
+   * \brief constructor
+   * \param rec_path path of the record file
+   * \param idx_path path of the index file
+   * \param part_index index of the partition to read
+   * \param num_parts number of partitions
+   * \param shuffle whether to read the records in random order
+   * \param seed random seed
+   * \param batch_size number of records returned by NextChunk
+   * \param weight_path path of the weight file, empty to not sample by weight
+   * \param num_samples number of records drawn per epoch when sampling by weight,
+   *  0 for the partition size
+   */
+  IndexedRecordSplit(const std::string &rec_path, const std::string &idx_path,
+                     unsigned part_index, unsigned num_parts, bool shuffle, int seed,
+                     size_t batch_size, const std::string &weight_path = "",
+                     size_t num_samples = 0)
+      : shuffle_(shuffle), weight_path_(weight_path), num_samples_(num_samples),
+        batch_size_(batch_size), epoch_(0), cursor_(0), rnd_(seed) {
+    std::ifstream index_file(idx_path.c_str());
+    CHECK(index_file.good()) << "Cannot open index file " << idx_path;
+    size_t key, offset;
+    while (index_file >> key >> offset) {
+      all_keys_.push_back(key);
+      all_offsets_.push_back(offset);
+    }
+    CHECK(!all_keys_.empty()) << "Empty index file " << idx_path;
+    stream_.reset(dmlc::SeekStream::CreateForRead(rec_path.c_str()));
+    // records are stored back to back, so their sizes follow from the sorted offsets
+    std::vector<size_t> sorted(all_offsets_);
+    std::sort(sorted.begin(), sorted.end());
+    const size_t last_size = this->RecordSize(sorted.back());
+    for (size_t offset : all_offsets_) {
+      auto next = std::upper_bound(sorted.begin(), sorted.end(), offset);
+      all_sizes_.push_back(next != sorted.end() ? *next - offset : last_size);
+    }
+    this->ResetPartition(part_index, num_parts);
+  }
+
+  void HintChunkSize(size_t chunk_size) override {}
+
+  size_t GetTotalSize(void) override {
+    return total_size_;
+  }
+
+  void BeforeFirst(void) override {
+    epoch_rnd_ = rnd_;
+    this->MakeOrder();
+    ++epoch_;
+    cursor_ = 0;
+  }
+
+  bool NextRecord(Blob *out_rec) override {
+    if (reader_ == nullptr || !reader_->NextRecord(out_rec)) {
+      Blob chunk;
+      if (!this->NextBatch(&chunk, 1)) return false;
+      reader_.reset(new dmlc::RecordIOChunkReader(chunk));
+      return reader_->NextRecord(out_rec);
+    }
+    return true;
+  }
+
+  bool NextChunk(Blob *out_chunk) override {
+    return this->NextBatch(out_chunk, batch_size_);
+  }
+
+  bool NextBatch(Blob *out_chunk, size_t n_records) override {
+    if (cursor_ >= order_.size()) return false;
+    const size_t end = std::min(cursor_ + n_records, order_.size());
+    buffer_.clear();
+    // read runs of records that are adjacent in the file at once
+    while (cursor_ < end) {
+      const size_t begin = offsets_[order_[cursor_]];
+      size_t nbytes = sizes_[order_[cursor_]];
+      for (++cursor_; cursor_ < end && offsets_[order_[cursor_]] == begin + nbytes; ++cursor_) {
+        nbytes += sizes_[order_[cursor_]];
+      }
+      CHECK_EQ(nbytes % sizeof(uint32_t), 0U) << "Invalid RecordIO file at offset " << begin;
+      const size_t pos = buffer_.size();
+      buffer_.resize(pos + nbytes / sizeof(uint32_t));
+      stream_->Seek(begin);
+      CHECK_EQ(stream_->Read(dmlc::BeginPtr(buffer_) + pos, nbytes), nbytes)
+        << "Truncated record at offset " << begin;
+    }
+    out_chunk->dptr = dmlc::BeginPtr(buffer_);
+    out_chunk->size = buffer_.size() * sizeof(uint32_t);
+    return true;
+  }
+
+  void ResetPartition(unsigned part_index, unsigned num_parts) override {
+    const size_t nstep = (all_keys_.size() + num_parts - 1) / num_parts;
+    const size_t begin = std::min(part_index * nstep, all_keys_.size());
+    const size_t end = std::min(begin + nstep, all_keys_.size());
+    CHECK_LT(begin, end) << "Partition " << part_index << " of " << num_parts
+                         << " is empty";
+    offsets_.assign(all_offsets_.begin() + begin, all_offsets_.begin() + end);
+    sizes_.assign(all_sizes_.begin() + begin, all_sizes_.begin() + end);
+    weights_.assign(end - begin, 1.0);
+    key_to_pos_.clear();
+    total_size_ = 0;
+    for (size_t i = begin; i < end; ++i) {
+      key_to_pos_[all_keys_[i]] = i - begin;
+      total_size_ += all_sizes_[i];
+    }
+    reader_.reset();
+    this->BeforeFirst();
+  }
+
+  /*!
+   * \brief get the position in the current epoch
+   * \param epoch number of epochs started
+   * \param cursor number of records returned in the epoch
+   * \param rnd random state at the beginning of the epoch
+   */
+  void GetState(uint64_t *epoch, uint64_t *cursor, std::mt19937 *rnd) const {
+    *epoch = epoch_;
+    *cursor = cursor_;
+    *rnd = epoch_rnd_;
+  }
+
+  /*! \brief hash of the sample weights of the current epoch, 0 without weights */
+  uint64_t WeightsHash(void) const {
+    return weights_hash_;
+  }
+
+  /*! \brief move to a position returned by GetState */
+  void SetState(uint64_t epoch, uint64_t cursor, const std::mt19937 &rnd) {
+    rnd_ = rnd;
+    this->BeforeFirst();
+    CHECK_LE(cursor, order_.size()) << "Invalid position " << cursor;
+    epoch_ = epoch;
+    cursor_ = cursor;
+    reader_.reset();
+  }
+
+ private:
+  /*! \brief size of the record at offset, including its headers */
+  size_t RecordSize(size_t offset) {
+    stream_->Seek(offset);
+    size_t nbytes = 0;
+    uint32_t header[2];
+    while (true) {
+      CHECK_EQ(stream_->Read(header, sizeof(header)), sizeof(header))
+        << "Invalid RecordIO file at offset " << offset;
+      CHECK(header[0] == dmlc::RecordIOWriter::kMagic)
+        << "Invalid RecordIO file at offset " << offset;
+      const uint32_t cflag = dmlc::RecordIOWriter::DecodeFlag(header[1]);
+      const size_t len = (dmlc::RecordIOWriter::DecodeLength(header[1]) + 3U) & ~3U;
+      nbytes += sizeof(header) + len;
+      if (cflag == 0 || cflag == 3) break;
+      stream_->Seek(offset + nbytes);
+    }
+    return nbytes;
+  }
+
+  /*! \brief the records of the next epoch, drawn from rnd_ */
+  void MakeOrder(void) {
+    order_.clear();
+    weights_hash_ = 0;
+    if (weight_path_.length() != 0) {
+      this->LoadWeights();
+      std::discrete_distribution<size_t> sampler(weights_.begin(), weights_.end());
+      const size_t n = num_samples_ != 0 ? num_samples_ : offsets_.size();
+      for (size_t i = 0; i < n; ++i) {
+        order_.push_back(sampler(rnd_));
+      }
+      return;
+    }
+    for (size_t i = 0; i < offsets_.size(); ++i) {
+      order_.push_back(i);
+    }
+    if (shuffle_) {
+      std::shuffle(order_.begin(), order_.end(), rnd_);
+    }
+  }
+
+  void LoadWeights(void) {
+    std::ifstream weight_file(weight_path_.c_str());
+    CHECK(weight_file.good()) << "Cannot open sample weights " << weight_path_;
+    size_t key;
+    double weight;
+    while (weight_file >> key >> weight) {
+      CHECK_GE(weight, 0) << "Negative sample weight for record " << key;
+      auto it = key_to_pos_.find(key);
+      if (it != key_to_pos_.end()) {
+        weights_[it->second] = weight;
+      }
+    }
+    double total = 0;
+    for (double w : weights_) total += w;
+    CHECK_GT(total, 0) << "All sample weights in " << weight_path_ << " are zero";
+    // FNV-1a
+    weights_hash_ = 14695981039346656037ULL;
+    const unsigned char *bytes = reinterpret_cast<const unsigned char*>(weights_.data());
+    for (size_t i = 0; i < weights_.size() * sizeof(double); ++i) {
+      weights_hash_ = (weights_hash_ ^ bytes[i]) * 1099511628211ULL;
+    }
+  }
+
+  /*! \brief record keys, offsets and sizes of the whole index */
+  std::vector<size_t> all_keys_, all_offsets_, all_sizes_;
+  /*! \brief offsets, sizes and weights of the records in the partition */
+  std::vector<size_t> offsets_, sizes_;
+  std::vector<double> weights_;
+  /*! \brief hash of weights_ */
+  uint64_t weights_hash_ = 0;
+  /*! \brief position of a record key in the partition */
+  std::unordered_map<size_t, size_t> key_to_pos_;
+  /*! \brief total size of the records in the partition */
+  size_t total_size_;
+  bool shuffle_;
+  std::string weight_path_;
+  size_t num_samples_, batch_size_;
+  /*! \brief number of epochs started and position in the current one */
+  uint64_t epoch_, cursor_;
+  /*! \brief records of the current epoch, as positions in the partition */
+  std::vector<size_t> order_;
+  /*! \brief random state, and its value at the beginning of the epoch */
+  std::mt19937 rnd_, epoch_rnd_;
+  std::unique_ptr<dmlc::SeekStream> stream_;
+  /*! \brief raw records of the current chunk */
+  std::vector<uint32_t> buffer_;
+  /*! \brief splits the current chunk for NextRecord */
+  std::unique_ptr<dmlc::RecordIOChunkReader> reader_;
+};
+}  // namespace io
+}  // namespace mxnet
+#endif  // MXNET_IO_INDEXED_RECORD_SPLIT_H_
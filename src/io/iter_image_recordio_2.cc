@@ -40,7 +40,9 @@
 #include "./image_recordio.h"
 #include "./image_augmenter.h"
 #include "./image_iter_common.h"
+#include "./indexed_record_split.h"
 #include "./inst_vector.h"
+#include "./record_iter_state.h"
 #include "../common/utils.h"
 
 namespace mxnet {
@@ -54,7 +56,10 @@ class ImageRecordIOParser2 {
 
   // set record to the head
   inline void BeforeFirst(void) {
-    if (batch_param_.round_batch == 0 || !overflow) {
+    if (next_state_ != nullptr) {
+      this->LoadState(*next_state_);
+      next_state_.reset();
+    } else if (batch_param_.round_batch == 0 || !overflow) {
       n_parsed_ = 0;
       return source_->BeforeFirst();
     } else {
@@ -65,6 +70,30 @@ class ImageRecordIOParser2 {
   // instance vector to the user
   inline bool ParseNext(DataBatch *out);
 
+  // whether GetState is supported, it needs an index file and stateful
+  inline bool HasState(void) const {
+    return indexed_source_ != nullptr;
+  }
+
+  // position after the last parsed batch
+  inline void GetState(RecordIterState *state) const {
+    indexed_source_->GetState(&state->epoch, &state->cursor, &state->split_rnd);
+    // records parsed but not copied to a batch yet are read again
+    state->cursor -= n_parsed_;
+    state->overflow = overflow;
+    state->rnd = rnd_;
+    state->prnds.clear();
+    for (const auto &prnd : prnds_) state->prnds.push_back(*prnd);
+  }
+
+  // move to state at the next BeforeFirst
+  inline void SetState(const std::string &state) {
+    CHECK(indexed_source_ != nullptr)
+      << "ImageRecordIter: SetState requires path_imgidx and stateful=True";
+    next_state_.reset(new RecordIterState());
+    next_state_->Load(state);
+  }
+
  private:
 #if MXNET_USE_OPENCV
   template<int n_channels>
@@ -78,6 +107,7 @@ class ImageRecordIOParser2 {
   inline unsigned ParseChunk(DType* data_dptr, real_t* label_dptr, const unsigned current_size,
     dmlc::InputSplit::Blob * chunk);
   inline void CreateMeanImg(void);
+  inline void LoadState(const RecordIterState &state);
 
   // magic number to seed prng
   static const int kRandMagic = 111;
@@ -85,6 +115,7 @@ class ImageRecordIOParser2 {
   /*! \brief parameters */
   ImageRecParserParam param_;
   ImageRecordParam record_param_;
+  ImageRecordStateParam state_param_;
   BatchParam batch_param_;
   ImageNormalizeParam normalize_param_;
   PrefetcherParam prefetch_param_;
@@ -97,6 +128,10 @@ class ImageRecordIOParser2 {
   common::RANDOM_ENGINE rnd_;
   /*! \brief data source */
   std::unique_ptr<dmlc::InputSplit> source_;
+  /*! \brief source_ if it is an indexed split, which can be positioned */
+  IndexedRecordSplit *indexed_source_ = nullptr;
+  /*! \brief state to load at the next BeforeFirst, if any */
+  std::unique_ptr<RecordIterState> next_state_;
   /*! \brief label information, if any */
   std::unique_ptr<ImageLabelMap> label_map_;
   /*! \brief temporary results */
@@ -129,6 +164,7 @@ inline void ImageRecordIOParser2<DType>::Init(
   // init image rec param
   param_.InitAllowUnknown(kwargs);
   record_param_.InitAllowUnknown(kwargs);
+  state_param_.InitAllowUnknown(kwargs);
   batch_param_.InitAllowUnknown(kwargs);
   normalize_param_.InitAllowUnknown(kwargs);
   prefetch_param_.InitAllowUnknown(kwargs);
@@ -171,7 +207,16 @@ inline void ImageRecordIOParser2<DType>::Init(
               << ", use " << threadget << " threads for decoding..";
   }
   legacy_shuffle_ = false;
-  if (param_.path_imgidx.length() != 0) {
+  CHECK(!state_param_.stateful || param_.path_imgidx.length() != 0)
+      << "ImageRecordIter: stateful requires path_imgidx";
+  if (param_.path_imgidx.length() != 0 && state_param_.stateful) {
+    indexed_source_ = new IndexedRecordSplit(
+        param_.path_imgrec, param_.path_imgidx,
+        param_.part_index, param_.num_parts,
+        record_param_.shuffle, record_param_.seed,
+        batch_param_.batch_size);
+    source_.reset(indexed_source_);
+  } else if (param_.path_imgidx.length() != 0) {
     source_.reset(dmlc::InputSplit::Create(
         param_.path_imgrec.c_str(),
         param_.path_imgidx.c_str(),
@@ -656,6 +701,21 @@ inline void ImageRecordIOParser2<DType>::CreateMeanImg(void) {
     this->BeforeFirst();
 }
 
+template<typename DType>
+inline void ImageRecordIOParser2<DType>::LoadState(const RecordIterState &state) {
+  indexed_source_->SetState(state.epoch, state.cursor, state.split_rnd);
+  n_parsed_ = 0;
+  overflow = state.overflow;
+  rnd_ = state.rnd;
+  if (state.prnds.size() != prnds_.size()) {
+    LOG(WARNING) << "ImageRecordIter: state saved with " << state.prnds.size()
+                 << " preprocess threads, restoring into " << prnds_.size();
+  }
+  for (size_t i = 0; i < std::min(state.prnds.size(), prnds_.size()); ++i) {
+    *prnds_[i] = state.prnds[i];
+  }
+}
+
 template<typename DType = real_t>
 class ImageRecordIter2 : public IIterator<DataBatch> {
  public:
@@ -668,6 +728,7 @@ class ImageRecordIter2 : public IIterator<DataBatch> {
     virtual void Init(const std::vector<std::pair<std::string, std::string> >& kwargs) {
       prefetch_param_.InitAllowUnknown(kwargs);
       parser_.Init(kwargs);
+      this->ResetStates();
       // maximum prefetch threaded iter internal size
       const int kMaxPrefetchBuffer = 16;
       // init thread iter
@@ -677,9 +738,15 @@ class ImageRecordIter2 : public IIterator<DataBatch> {
           if (*dptr == nullptr) {
             *dptr = new DataBatch();
           }
-          return parser_.ParseNext(*dptr);
+          if (!parser_.ParseNext(*dptr)) return false;
+          if (parser_.HasState()) {
+            RecordIterState state;
+            parser_.GetState(&state);
+            states_.Push(std::move(state));
+          }
+          return true;
           },
-          [this]() { parser_.BeforeFirst(); });
+          [this]() { parser_.BeforeFirst(); this->ResetStates(); });
     }
 
     virtual void BeforeFirst(void) {
@@ -701,14 +768,34 @@ class ImageRecordIter2 : public IIterator<DataBatch> {
         recycle_queue_.pop();
         iter_.Recycle(&old_batch);
       }
-      return iter_.Next(&out_);
+      if (!iter_.Next(&out_)) return false;
+      if (parser_.HasState()) states_.Pop();
+      return true;
     }
 
     virtual const DataBatch &Value(void) const {
       return *out_;
     }
 
+    virtual std::string GetState(void) {
+      CHECK(parser_.HasState())
+        << "ImageRecordIter: GetState requires path_imgidx and stateful=True";
+      return states_.Current();
+    }
+
+    virtual void SetState(const std::string &state) {
+      parser_.SetState(state);
+      iter_.BeforeFirst();
+    }
+
  private:
+    /*! \brief the current state becomes the one of the parser */
+    inline void ResetStates(void) {
+      RecordIterState state;
+      if (parser_.HasState()) parser_.GetState(&state);
+      states_.Reset(std::move(state));
+    }
+
     /*! \brief Backend thread */
     dmlc::ThreadedIter<DataBatch> iter_;
     /*! \brief Parameters */
@@ -719,8 +806,12 @@ class ImageRecordIter2 : public IIterator<DataBatch> {
     std::queue<DataBatch*> recycle_queue_;
     /* \brief parser */
     ImageRecordIOParser2<DType> parser_;
+    /*! \brief states after the returned and the prefetched batches */
+    RecordIterStateQueue states_;
 };
 
+DMLC_REGISTER_PARAMETER(ImageRecordStateParam);
+
 MXNET_REGISTER_IO_ITER(ImageRecordIter)
 .describe(R"code(Iterates on image RecordIO files
 
@@ -748,6 +839,7 @@ Example::
 )code" ADD_FILELINE)
 .add_arguments(ImageRecParserParam::__FIELDS__())
 .add_arguments(ImageRecordParam::__FIELDS__())
+.add_arguments(ImageRecordStateParam::__FIELDS__())
 .add_arguments(BatchParam::__FIELDS__())
 .add_arguments(PrefetcherParam::__FIELDS__())
 .add_arguments(ListDefaultAugParams())
@@ -765,6 +857,7 @@ the data type instead of ``float``.
 )code" ADD_FILELINE)
 .add_arguments(ImageRecParserParam::__FIELDS__())
 .add_arguments(ImageRecordParam::__FIELDS__())
+.add_arguments(ImageRecordStateParam::__FIELDS__())
 .add_arguments(BatchParam::__FIELDS__())
 .add_arguments(PrefetcherParam::__FIELDS__())
 .add_arguments(ListDefaultAugParams())
@@ -34,6 +34,10 @@
 #include <dmlc/common.h>
 #include <dmlc/timer.h>
 #include <type_traits>
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <deque>
 
 #include <sstream>
 #include <string>
@@ -47,9 +51,13 @@
 #endif
 
 #include "./image_seg_recordio.h"
+#include "./image_seg_cache.h"
+#include "./image_seg_stats.h"
 #include "./image_augmenter.h"
 #include "./image_iter_common.h"
+#include "./indexed_record_split.h"
 #include "./inst_vector.h"
+#include "./record_iter_state.h"
 #include "../common/utils.h"
 
 template <class Container>
@@ -68,6 +76,7 @@ namespace io {
 template<typename DType>
 class ImageSegRecordIOParser {
  public:
+  ImageSegRecordIOParser(void) : stats_("ImageSegRecordIter") {}
   virtual ~ImageSegRecordIOParser(void) {
       this->ReleaseLabelMap();
   }
@@ -76,7 +85,11 @@ class ImageSegRecordIOParser {
 
   // set record to the head
   inline void BeforeFirst(void) {
-    if (batch_param_.round_batch == 0 || !overflow) {
+    for (auto &pending : pending_) pending.clear();
+    if (next_state_ != nullptr) {
+      this->LoadState(*next_state_);
+      next_state_.reset();
+    } else if (batch_param_.round_batch == 0 || !overflow) {
       n_parsed_ = 0;
       return source_->BeforeFirst();
     } else {
@@ -88,6 +101,38 @@ class ImageSegRecordIOParser {
   // instance vector to the user
   inline bool ParseNext(DataBatch *out);
 
+  // append per stage statistics to out
+  inline void GetStats(std::vector<std::pair<std::string, double> > *out, bool reset) {
+    stats_.Get(out, reset);
+  }
+
+  // whether GetState is supported, it needs stateful or sample_weights and fixed size batches
+  inline bool HasState(void) const {
+    return indexed_source_ != nullptr && buckets_.empty();
+  }
+
+  // position after the last parsed batch
+  inline void GetState(RecordIterState *state) const {
+    indexed_source_->GetState(&state->epoch, &state->cursor, &state->split_rnd);
+    // records parsed but not copied to a batch yet are read again
+    state->cursor -= n_parsed_;
+    state->overflow = overflow;
+    state->weights_hash = indexed_source_->WeightsHash();
+    state->rnd = rnd_;
+    state->prnds.clear();
+    for (const auto &prnd : prnds_) state->prnds.push_back(*prnd);
+  }
+
+  // move to state at the next BeforeFirst
+  inline void SetState(const std::string &state) {
+    CHECK(indexed_source_ != nullptr)
+      << "ImageSegRecordIter: SetState requires path_imgidx and stateful=True";
+    CHECK(buckets_.empty())
+      << "ImageSegRecordIter: SetState cannot be combined with bucket_shapes";
+    next_state_.reset(new RecordIterState());
+    next_state_->Load(state);
+  }
+
  private:
 #if MXNET_USE_OPENCV
   template<int n_channels>
@@ -96,13 +141,23 @@ class ImageSegRecordIOParser {
                     const float illumination_scaled);
 #if MXNET_USE_LIBJPEG_TURBO
   cv::Mat TJimdecode(cv::Mat buf, int color);
+  bool DecodeCropped(const ImageSegRecordIO& rec, ImageAugmenter* aug,
+                     common::RANDOM_ENGINE* prnd, int color, cv::Mat* res, cv::Mat* res_label);
 #endif
+  void DecodeLabel(const ImageSegRecordIO& rec, cv::Mat* out, const cv::Rect* roi = nullptr);
 #endif
 
   inline unsigned ParseChunk(DType *data_dptr, real_t *label_dptr, const unsigned current_size,
                              dmlc::InputSplit::Blob *chunk);
+  // ParseNext for bucketed batches
+  inline bool ParseNextBucketed(DataBatch *out);
+  // copy the first n pending samples of a bucket into out
+  inline void EmitBucket(size_t bucket, unsigned n, DataBatch *out);
+  // index of the shape bucket closest to a height x width image
+  inline size_t FindBucket(int height, int width) const;
 
   inline void CreateMeanImg(void);
+  inline void LoadState(const RecordIterState &state);
   inline void InitLabelMap(void);
   inline void ReleaseLabelMap(void);
 
@@ -112,18 +167,25 @@ class ImageSegRecordIOParser {
   /*! \brief parameters */
   ImageSegRecParserParam param_;
   ImageSegRecordParam record_param_;
+  ImageRecordStateParam state_param_;
   BatchParam batch_param_;
   ImageSegNormalizeParam normalize_param_;
   PrefetcherParam prefetch_param_;
 #if MXNET_USE_OPENCV
   /*! \brief augmenters */
   std::vector<std::vector<std::unique_ptr<ImageAugmenter> > > augmenters_;
+  /*! \brief decoded sample cache, if any */
+  std::unique_ptr<DecodedSegCache> decode_cache_;
 #endif
   /*! \brief random samplers */
   std::vector <std::unique_ptr<common::RANDOM_ENGINE>> prnds_;
   common::RANDOM_ENGINE rnd_;
   /*! \brief data source */
   std::unique_ptr <dmlc::InputSplit> source_;
+  /*! \brief source_ if it is an indexed split, which can be positioned */
+  IndexedRecordSplit *indexed_source_ = nullptr;
+  /*! \brief state to load at the next BeforeFirst, if any */
+  std::unique_ptr<RecordIterState> next_state_;
   /*! \brief label information, if any */
   std::unique_ptr <ImageLabelMap> label_map_;
   /*! \brief temporary results */
@@ -150,6 +212,18 @@ class ImageSegRecordIOParser {
   bool meanfile_ready_;
   /*! \brief label id map*/
   std::map<int, int> label_id_map_;
+  /*! \brief per stage statistics */
+  SegIterStats stats_;
+  /*! \brief (height, width) of the shape buckets, if any */
+  std::vector<std::pair<int, int> > buckets_;
+  /*! \brief a sample waiting for its bucket to fill up */
+  struct PendingInst {
+    unsigned index;
+    std::vector<DType> data;
+    std::vector<real_t> label;
+  };
+  /*! \brief samples waiting for each bucket */
+  std::vector<std::deque<PendingInst> > pending_;
 };
 
 template<typename DType>
@@ -160,6 +234,7 @@ inline void ImageSegRecordIOParser<DType>::Init(
   // init image rec param
   param_.InitAllowUnknown(kwargs);
   record_param_.InitAllowUnknown(kwargs);
+  state_param_.InitAllowUnknown(kwargs);
   batch_param_.InitAllowUnknown(kwargs);
   normalize_param_.InitAllowUnknown(kwargs);
   prefetch_param_.InitAllowUnknown(kwargs);
@@ -184,6 +259,17 @@ inline void ImageSegRecordIOParser<DType>::Init(
     threadget = omp_get_num_threads();
   }
   param_.preprocess_threads = threadget;
+  stats_.Init(threadget);
+  CHECK_EQ(param_.bucket_shapes.ndim() % 2, 0)
+    << "bucket_shapes must hold (height, width) pairs, got " << param_.bucket_shapes;
+  buckets_.clear();
+  for (index_t i = 0; i < param_.bucket_shapes.ndim(); i += 2) {
+    buckets_.emplace_back(param_.bucket_shapes[i], param_.bucket_shapes[i + 1]);
+  }
+  pending_.clear();
+  pending_.resize(buckets_.size());
+  CHECK(buckets_.empty() || normalize_param_.mean_img.length() == 0)
+    << "ImageSegRecordIter: bucket_shapes cannot be combined with mean_img";
 
   std::vector<std::string> aug_names = dmlc::Split(param_.aug_seq, ',');
   augmenters_.clear();
@@ -202,13 +288,31 @@ inline void ImageSegRecordIOParser<DType>::Init(
   }
   CHECK(param_.path_imgrec.length() != 0)
     << "ImageSegRecordIter: must specify image_rec";
+  if (param_.decode_cache_size > 0) {
+    decode_cache_.reset(new DecodedSegCache(param_.decode_cache_size << 20UL,
+                                            param_.decode_cache_spill_path,
+                                            param_.decode_cache_spill_size << 20UL));
+  }
 
   if (param_.verbose) {
     LOG(INFO) << "ImageSegRecordIter: " << param_.path_imgrec
               << ", use " << threadget << " threads for decoding..";
   }
   legacy_shuffle_ = false;
-  if (param_.path_imgidx.length() != 0) {
+  CHECK(param_.sample_weights.length() == 0 || param_.path_imgidx.length() != 0)
+    << "ImageSegRecordIter: sample_weights requires path_imgidx";
+  CHECK(!state_param_.stateful || param_.path_imgidx.length() != 0)
+    << "ImageSegRecordIter: stateful requires path_imgidx";
+  if (param_.path_imgidx.length() != 0 &&
+      (state_param_.stateful || param_.sample_weights.length() != 0)) {
+    indexed_source_ = new IndexedRecordSplit(
+          param_.path_imgrec, param_.path_imgidx,
+          param_.part_index, param_.num_parts,
+          record_param_.shuffle, record_param_.seed,
+          batch_param_.batch_size,
+          param_.sample_weights, param_.num_samples);
+    source_.reset(indexed_source_);
+  } else if (param_.path_imgidx.length() != 0) {
     source_.reset(dmlc::InputSplit::Create(
           param_.path_imgrec.c_str(),
           param_.path_imgidx.c_str(),
@@ -299,6 +403,9 @@ inline void ImageSegRecordIOParser<DType>::Init(
 
 template<typename DType>
 inline bool ImageSegRecordIOParser<DType>::ParseNext(DataBatch *out) {
+  if (!buckets_.empty()) {
+    return ParseNextBucketed(out);
+  }
   if (overflow) {
     return false;
   }
@@ -344,7 +451,12 @@ inline bool ImageSegRecordIOParser<DType>::ParseNext(DataBatch *out) {
     // int n_to_copy;
     unsigned n_to_out = 0;
     if (n_parsed_ == 0) {
-      if (source_->NextBatch(&chunk, batch_param_.batch_size)) {
+      bool has_chunk;
+      {
+        SegIterStats::Scope scope(&stats_, stats_.batch_thread(), SegIterStats::kRead);
+        has_chunk = source_->NextBatch(&chunk, batch_param_.batch_size);
+      }
+      if (has_chunk) {
         inst_order_.clear();
         inst_index_ = 0;
         DType *data_dptr = static_cast<DType *>(out->data[0].data().dptr_);
@@ -377,6 +489,7 @@ inline bool ImageSegRecordIOParser<DType>::ParseNext(DataBatch *out) {
     } else {
       int n_to_copy = std::min(n_parsed_, batch_param_.batch_size - current_size);
       n_parsed_ -= n_to_copy;
+      SegIterStats::Scope scope(&stats_, stats_.batch_thread(), SegIterStats::kAssemble);
       // Copy
 #pragma omp parallel for num_threads(param_.preprocess_threads)
       for (int i = 0; i < n_to_copy; ++i) {
@@ -401,9 +514,110 @@ inline bool ImageSegRecordIOParser<DType>::ParseNext(DataBatch *out) {
 
     current_size += n_to_out;
   }
+  stats_.AddBatch();
   return true;
 }
 
+template<typename DType>
+inline bool ImageSegRecordIOParser<DType>::ParseNextBucketed(DataBatch *out) {
+  CHECK(source_ != nullptr);
+  const unsigned batch_size = batch_param_.batch_size;
+  dmlc::InputSplit::Blob chunk;
+  while (true) {
+    for (size_t b = 0; b < buckets_.size(); ++b) {
+      if (pending_[b].size() >= batch_size) {
+        EmitBucket(b, batch_size, out);
+        return true;
+      }
+    }
+    bool has_chunk;
+    {
+      SegIterStats::Scope scope(&stats_, stats_.batch_thread(), SegIterStats::kRead);
+      has_chunk = source_->NextBatch(&chunk, batch_size);
+    }
+    if (!has_chunk) break;
+    inst_order_.clear();
+    // all samples go to temp_, with the shape of their bucket
+    ParseChunk(NULL, NULL, batch_size, &chunk);
+    SegIterStats::Scope scope(&stats_, stats_.batch_thread(), SegIterStats::kAssemble);
+    for (const auto &place : inst_order_) {
+      const DataInst inst = temp_[place.first][place.second];
+      const TBlob &data = inst.data[0];
+      const TBlob &label = inst.data[1];
+      PendingInst pending;
+      pending.index = inst.index;
+      pending.data.assign(data.dptr<DType>(), data.dptr<DType>() + data.Size());
+      pending.label.assign(label.dptr<real_t>(), label.dptr<real_t>() + label.Size());
+      pending_[FindBucket(data.shape_[1], data.shape_[2])].push_back(std::move(pending));
+    }
+  }
+  // end of data, flush the partial buckets
+  for (size_t b = 0; b < buckets_.size(); ++b) {
+    if (!pending_[b].empty()) {
+      EmitBucket(b, pending_[b].size(), out);
+      return true;
+    }
+  }
+  return false;
+}
+
+template<typename DType>
+inline void ImageSegRecordIOParser<DType>::EmitBucket(size_t bucket, unsigned n,
+                                                      DataBatch *out) {
+  SegIterStats::Scope scope(&stats_, stats_.batch_thread(), SegIterStats::kAssemble);
+  const unsigned batch_size = batch_param_.batch_size;
+  const int height = buckets_[bucket].first;
+  const int width = buckets_[bucket].second;
+  TShape data_shape = mshadow::Shape4(batch_size, param_.data_shape[0], height, width);
+  TShape label_shape = mshadow::Shape3(batch_size,
+                                       static_cast<int>(height * param_.label_scale),
+                                       static_cast<int>(width * param_.label_scale));
+  out->data.resize(2);
+  if (out->data[0].is_none() || out->data[0].shape() != data_shape) {
+    out->data[0] = NDArray(data_shape, Context::CPUPinned(0), false,
+                           mshadow::DataType<DType>::kFlag);
+    out->data[1] = NDArray(label_shape, Context::CPUPinned(0), false,
+                           mshadow::DataType<real_t>::kFlag);
+  }
+  out->index.resize(batch_size);
+  out->num_batch_padd = batch_size - n;
+  DType *data_dptr = static_cast<DType *>(out->data[0].data().dptr_);
+  real_t *label_dptr = static_cast<real_t *>(out->data[1].data().dptr_);
+  const size_t data_size = data_shape.Size() / batch_size;
+  const size_t label_size = label_shape.Size() / batch_size;
+  std::deque<PendingInst> &pending = pending_[bucket];
+  for (unsigned i = 0; i < n; ++i) {
+    const PendingInst &inst = pending[i];
+    CHECK_EQ(inst.data.size(), data_size);
+    CHECK_EQ(inst.label.size(), label_size);
+    std::copy(inst.data.begin(), inst.data.end(), data_dptr + i * data_size);
+    std::copy(inst.label.begin(), inst.label.end(), label_dptr + i * label_size);
+    out->index[i] = inst.index;
+  }
+  // pad with empty images, and labels that are ignored
+  std::fill(data_dptr + n * data_size, data_dptr + batch_size * data_size, DType(0));
+  std::fill(label_dptr + n * label_size, label_dptr + batch_size * label_size, real_t(255));
+  std::fill(out->index.begin() + n, out->index.end(), 0);
+  pending.erase(pending.begin(), pending.begin() + n);
+  stats_.AddBatch();
+}
+
+template<typename DType>
+inline size_t ImageSegRecordIOParser<DType>::FindBucket(int height, int width) const {
+  size_t best = 0;
+  double best_dist = 0;
+  for (size_t b = 0; b < buckets_.size(); ++b) {
+    // distance of log sizes accounts for both aspect ratio and scale
+    const double dist = std::abs(std::log(static_cast<double>(height) / buckets_[b].first))
+                      + std::abs(std::log(static_cast<double>(width) / buckets_[b].second));
+    if (b == 0 || dist < best_dist) {
+      best = b;
+      best_dist = dist;
+    }
+  }
+  return best;
+}
+
 #if MXNET_USE_OPENCV
 template<typename DType>
 template<int n_channels>
@@ -524,7 +738,123 @@ cv::Mat ImageSegRecordIOParser<DType>::TJimdecode(cv::Mat image, int color) {
   tjDestroy(handle);
   return ret;
 }
+
+template<typename DType>
+bool ImageSegRecordIOParser<DType>::DecodeCropped(const ImageSegRecordIO& rec,
+                                                  ImageAugmenter* aug,
+                                                  common::RANDOM_ENGINE* prnd, int color,
+                                                  cv::Mat* res, cv::Mat* res_label) {
+  unsigned char* jpeg = rec.image_data;
+  const size_t jpeg_size = rec.header.image_size;
+  if (jpeg_size < 2 || !is_jpeg(jpeg)) return false;
+  tjhandle handle = tjInitDecompress();
+  int h, w, subsamp;
+  if (tjDecompressHeader2(handle, jpeg, jpeg_size, &w, &h, &subsamp) != 0) {
+    tjDestroy(handle);
+    return false;
+  }
+  cv::Rect roi;
+  if (!aug->PlanCrop(w, h, prnd, &roi)) {
+    tjDestroy(handle);
+    return false;
+  }
+  // pick the strongest DCT downscale that keeps the crop at least as large as the output
+  int th = param_.data_shape[1];
+  int tw = param_.data_shape[2];
+  for (const auto &shape : buckets_) {
+    th = std::max(th, shape.first);
+    tw = std::max(tw, shape.second);
+  }
+  int num_factors = 0;
+  tjscalingfactor* factors = tjGetScalingFactors(&num_factors);
+  tjscalingfactor best = {1, 1};
+  for (int i = 0; i < num_factors; ++i) {
+    const tjscalingfactor& f = factors[i];
+    if (f.num * best.denom >= best.num * f.denom) continue;
+    if (TJSCALED(roi.width, f) < tw || TJSCALED(roi.height, f) < th) continue;
+    best = f;
+  }
+  const int sw = TJSCALED(w, best);
+  const int sh = TJSCALED(h, best);
+  cv::Mat full(sh, sw, color ? CV_8UC3 : CV_8UC1);
+  int err = tjDecompress2(handle, jpeg, jpeg_size, full.ptr(), sw, 0, sh,
+                          color ? TJPF_BGR : TJPF_GRAY, 0);
+  tjDestroy(handle);
+  cv::Rect sroi;
+  if (err != 0) {
+    // the crop is already planned, so decode the full image with OpenCV instead
+    full = cv::imdecode(cv::Mat(1, jpeg_size, CV_8U, jpeg), color);
+    sroi = roi;
+  } else {
+    sroi = cv::Rect(roi.x * sw / w, roi.y * sh / h,
+                    std::max(roi.width * sw / w, 1), std::max(roi.height * sh / h, 1));
+  }
+  sroi &= cv::Rect(0, 0, full.cols, full.rows);
+  *res = full(sroi);
+  DecodeLabel(rec, res_label, &roi);
+  if (res_label->size() != res->size()) {
+    cv::resize(*res_label, *res_label, res->size(), 0, 0, cv::INTER_NEAREST);
+  }
+  return true;
+}
 #endif
+
+template<typename DType>
+void ImageSegRecordIOParser<DType>::DecodeLabel(const ImageSegRecordIO& rec, cv::Mat* out,
+                                                const cv::Rect* roi) {
+  if (rec.label_codec() == ImageSegRecordIO::kLabelImage) {
+    cv::Mat buf_label(1, rec.header.label_size, CV_8U, rec.label_data);
+    *out = cv::imdecode(buf_label, cv::IMREAD_GRAYSCALE);
+    if (roi != nullptr) {
+      CHECK(*roi == (*roi & cv::Rect(0, 0, out->cols, out->rows)))
+        << "Label size differs from image size in record " << rec.image_index();
+      *out = (*out)(*roi);
+    }
+    return;
+  }
+  CHECK_EQ(rec.label_codec(), ImageSegRecordIO::kLabelRLE)
+    << "Unknown label codec " << rec.label_codec()
+    << " in record " << rec.image_index();
+  // layout: uint32 rows, cols, num_runs, uint32 lengths[num_runs], uint8 values[num_runs]
+  const uint8_t* buf = rec.label_data;
+  uint32_t shape[3];
+  CHECK_GE(rec.header.label_size, sizeof(shape))
+    << "Invalid RLE label in record " << rec.image_index();
+  std::memcpy(shape, buf, sizeof(shape));
+  const uint32_t num_runs = shape[2];
+  CHECK_EQ(rec.header.label_size, sizeof(shape) + num_runs * 5)
+    << "Invalid RLE label in record " << rec.image_index();
+  const uint8_t* lengths = buf + sizeof(shape);
+  const uint8_t* values = lengths + num_runs * sizeof(uint32_t);
+  const size_t cols = shape[1];
+  const size_t total = static_cast<size_t>(shape[0]) * cols;
+  // only the rows covered by roi are filled
+  size_t begin = 0, end = total;
+  if (roi != nullptr) {
+    CHECK(*roi == (*roi & cv::Rect(0, 0, shape[1], shape[0])))
+      << "Label size differs from image size in record " << rec.image_index();
+    begin = roi->y * cols;
+    end = (roi->y + roi->height) * cols;
+  }
+  out->create((end - begin) / cols, cols, CV_8U);
+  uint8_t* dst = out->ptr<uint8_t>();
+  size_t pos = 0;
+  for (uint32_t i = 0; i < num_runs && pos < end; ++i) {
+    uint32_t len;
+    std::memcpy(&len, lengths + i * sizeof(uint32_t), sizeof(len));
+    CHECK_LE(pos + len, total) << "Invalid RLE label in record " << rec.image_index();
+    const size_t lo = std::max(pos, begin);
+    const size_t hi = std::min(pos + len, end);
+    if (lo < hi) {
+      std::memset(dst + lo - begin, values[i], hi - lo);
+    }
+    pos += len;
+  }
+  CHECK_GE(pos, end) << "Invalid RLE label in record " << rec.image_index();
+  if (roi != nullptr) {
+    *out = (*out)(cv::Rect(roi->x, 0, roi->width, roi->height));
+  }
+}
 #endif
 
 // Returns the number of images that are put into output
@@ -567,42 +897,75 @@ inline unsigned ImageSegRecordIOParser<DType>::ParseChunk(DType *data_dptr, real
       cv::Mat res;
       cv::Mat res_label;
       rec.Load(blob.dptr, blob.size);
-      cv::Mat buf(1, rec.header.image_size, CV_8U, rec.image_data);
-      switch (param_.data_shape[0]) {
-        case 1:
+      stats_.AddRecord(tid, blob.size);
+      bool decoded = false;
+      if (decode_cache_ != nullptr) {
+        decoded = decode_cache_->Get(rec.image_index(), &res, &res_label);
+      }
+#if MXNET_USE_LIBJPEG_TURBO
+      if (!decoded && decode_cache_ == nullptr && param_.crop_before_decode
+          && param_.data_shape[0] != 4 && !augmenters_[tid].empty()) {
+        // also decodes the label, which is accounted to image decoding
+        SegIterStats::Scope scope(&stats_, tid, SegIterStats::kImageDecode);
+        decoded = DecodeCropped(rec, augmenters_[tid][0].get(), prnds_[tid].get(),
+                                param_.data_shape[0] == 3, &res, &res_label);
+      }
+#endif
+      if (!decoded) {
+        SegIterStats::Scope scope(&stats_, tid, SegIterStats::kImageDecode);
+        cv::Mat buf(1, rec.header.image_size, CV_8U, rec.image_data);
+        switch (param_.data_shape[0]) {
+          case 1:
 #if MXNET_USE_LIBJPEG_TURBO
-          res = TJimdecode(buf, 0);
+            res = TJimdecode(buf, 0);
 #else
-          res = cv::imdecode(buf, 0);
+            res = cv::imdecode(buf, 0);
 #endif
-          break;
-        case 3:
+            break;
+          case 3:
 #if MXNET_USE_LIBJPEG_TURBO
-          res = TJimdecode(buf, 1);
+            res = TJimdecode(buf, 1);
 #else
-          res = cv::imdecode(buf, 1);
+            res = cv::imdecode(buf, 1);
 #endif
-          break;
-        case 4:
-          // -1 to keep the number of channel of the encoded image, and not force gray or color.
-          res = cv::imdecode(buf, -1);
-          CHECK_EQ(res.channels(), 4)
-            << "Invalid image with index " << rec.image_index()
-            << ". Expected 4 channels, got " << res.channels();
-          break;
-        default:
-          LOG(FATAL) << "Invalid output shape " << param_.data_shape;
+            break;
+          case 4:
+            // -1 to keep the number of channel of the encoded image, and not force gray or color.
+            res = cv::imdecode(buf, -1);
+            CHECK_EQ(res.channels(), 4)
+              << "Invalid image with index " << rec.image_index()
+              << ". Expected 4 channels, got " << res.channels();
+            break;
+          default:
+            LOG(FATAL) << "Invalid output shape " << param_.data_shape;
+        }
+      }
+      if (!decoded) {
+        // load label before augmentations
+        {
+          SegIterStats::Scope scope(&stats_, tid, SegIterStats::kLabelDecode);
+          DecodeLabel(rec, &res_label);
+        }
+        if (decode_cache_ != nullptr) {
+          decode_cache_->Put(rec.image_index(), res, res_label);
+        }
       }
       const int n_channels = res.channels();
 
-      // load label before augmentations
-      cv::Mat buf_label(1, rec.header.label_size, CV_8U, rec.label_data);
-      res_label = cv::imdecode(buf_label, cv::IMREAD_GRAYSCALE);
-
       cv::Mat out_label;
-      for (auto& aug : augmenters_[tid]) {
-        res = aug->Process(res, res_label, &out_label, prnds_[tid].get(), label_id_map_);
+      {
+        SegIterStats::Scope scope(&stats_, tid, SegIterStats::kAugment);
+        if (!buckets_.empty()) {
+          const std::pair<int, int> &shape = buckets_[FindBucket(res.rows, res.cols)];
+          for (auto& aug : augmenters_[tid]) {
+            aug->SetOutputShape(shape.first, shape.second);
+          }
+        }
+        for (auto& aug : augmenters_[tid]) {
+          res = aug->Process(res, res_label, &out_label, prnds_[tid].get(), label_id_map_);
+        }
       }
+      SegIterStats::Scope normalize_scope(&stats_, tid, SegIterStats::kNormalize);
 
       mshadow::Tensor<cpu, 3, DType> data;
       mshadow::Tensor<cpu, 2, real_t> label;
@@ -684,6 +1047,26 @@ inline void ImageSegRecordIOParser<DType>::ReleaseLabelMap(void){
     label_id_map_.clear();
 }
 
+template<typename DType>
+inline void ImageSegRecordIOParser<DType>::LoadState(const RecordIterState &state) {
+  indexed_source_->SetState(state.epoch, state.cursor, state.split_rnd);
+  n_parsed_ = 0;
+  overflow = state.overflow;
+  rnd_ = state.rnd;
+  // the epoch is drawn again with the weights currently in the file
+  if (state.weights_hash != indexed_source_->WeightsHash()) {
+    LOG(WARNING) << "ImageSegRecordIter: " << param_.sample_weights << " changed since "
+                 << "the state was saved, the restored epoch draws different records";
+  }
+  if (state.prnds.size() != prnds_.size()) {
+    LOG(WARNING) << "ImageSegRecordIter: state saved with " << state.prnds.size()
+                 << " preprocess threads, restoring into " << prnds_.size();
+  }
+  for (size_t i = 0; i < std::min(state.prnds.size(), prnds_.size()); ++i) {
+    *prnds_[i] = state.prnds[i];
+  }
+}
+
 // create mean image.
 template<typename DType>
 inline void ImageSegRecordIOParser<DType>::CreateMeanImg(void) {
@@ -735,7 +1118,8 @@ inline void ImageSegRecordIOParser<DType>::CreateMeanImg(void) {
 template<typename DType = real_t>
 class ImageSegRecordIter : public IIterator<DataBatch> {
   public:
-    ImageSegRecordIter() : out_(nullptr) {}
+    ImageSegRecordIter() : out_(nullptr), queued_(0), occupancy_sum_(0), num_next_(0),
+                           wait_ns_(0) {}
 
     virtual ~ImageSegRecordIter(void) {
       iter_.Destroy();
@@ -744,8 +1128,7 @@ class ImageSegRecordIter : public IIterator<DataBatch> {
     virtual void Init(const std::vector <std::pair<std::string, std::string>> &kwargs) {
       prefetch_param_.InitAllowUnknown(kwargs);
       parser_.Init(kwargs);
-      // maximum prefetch threaded iter internal size
-      const int kMaxPrefetchBuffer = 16;
+      this->ResetStates();
       // init thread iter
       iter_.set_max_capacity(kMaxPrefetchBuffer);
       // init thread iter
@@ -753,9 +1136,17 @@ class ImageSegRecordIter : public IIterator<DataBatch> {
           if (*dptr == nullptr) {
             *dptr = new DataBatch();
           }
-            return parser_.ParseNext(*dptr);
+          if (!parser_.ParseNext(*dptr)) return false;
+          if (parser_.HasState()) {
+            RecordIterState state;
+            parser_.GetState(&state);
+            states_.Push(std::move(state));
+          }
+          ++queued_;
+          return true;
           },
-          [this]() { parser_.BeforeFirst(); });
+          // called while the prefetch queue is being emptied
+          [this]() { parser_.BeforeFirst(); this->ResetStates(); queued_ = 0; });
     }
 
     virtual void BeforeFirst(void) {
@@ -778,14 +1169,63 @@ class ImageSegRecordIter : public IIterator<DataBatch> {
         recycle_queue_.pop();
         iter_.Recycle(&old_batch);
       }
-      return iter_.Next(&out_);
+      occupancy_sum_ += queued_;
+      ++num_next_;
+      const auto start = std::chrono::steady_clock::now();
+      const bool ret = iter_.Next(&out_);
+      wait_ns_ += std::chrono::duration_cast<std::chrono::nanoseconds>(
+          std::chrono::steady_clock::now() - start).count();
+      if (ret) {
+        --queued_;
+        if (parser_.HasState()) states_.Pop();
+      }
+      return ret;
+    }
+
+    virtual std::string GetState(void) {
+      CHECK(parser_.HasState())
+        << "ImageSegRecordIter: GetState requires path_imgidx, stateful=True "
+        << "and no bucket_shapes";
+      return states_.Current();
+    }
+
+    virtual void SetState(const std::string &state) {
+      parser_.SetState(state);
+      iter_.BeforeFirst();
     }
 
     virtual const DataBatch &Value(void) const {
       return *out_;
     }
 
+    virtual std::vector<std::pair<std::string, double> > GetStats(bool reset) {
+      std::vector<std::pair<std::string, double> > ret;
+      parser_.GetStats(&ret, reset);
+      // batches ready in the prefetch queue, sampled before each Next
+      ret.emplace_back("queue_occupancy", queued_.load());
+      ret.emplace_back("queue_occupancy_mean",
+                       num_next_ > 0 ? static_cast<double>(occupancy_sum_) / num_next_ : 0);
+      ret.emplace_back("queue_capacity", static_cast<double>(kMaxPrefetchBuffer));
+      // time Next spent waiting for the batch thread
+      ret.emplace_back("consumer_wait_ms", wait_ns_ * 1e-6);
+      if (reset) {
+        occupancy_sum_ = 0;
+        num_next_ = 0;
+        wait_ns_ = 0;
+      }
+      return ret;
+    }
+
   private:
+    /*! \brief the current state becomes the one of the parser */
+    inline void ResetStates(void) {
+      RecordIterState state;
+      if (parser_.HasState()) parser_.GetState(&state);
+      states_.Reset(std::move(state));
+    }
+
+    /*! \brief maximum prefetch threaded iter internal size */
+    static const int kMaxPrefetchBuffer = 16;
     /*! \brief Backend thread */
     dmlc::ThreadedIter <DataBatch> iter_;
     /*! \brief Parameters */
@@ -797,6 +1237,12 @@ class ImageSegRecordIter : public IIterator<DataBatch> {
     std::queue<DataBatch *> recycle_queue_;
     /* \brief parser */
     ImageSegRecordIOParser<DType> parser_;
+    /*! \brief number of batches in the prefetch queue */
+    std::atomic<int> queued_;
+    /*! \brief prefetch queue statistics, only touched by the consumer */
+    uint64_t occupancy_sum_, num_next_, wait_ns_;
+    /*! \brief states after the returned and the prefetched batches */
+    RecordIterStateQueue states_;
 };
 
 DMLC_REGISTER_PARAMETER(ImageSegRecParserParam);
@@ -828,6 +1274,7 @@ Example::
 )code" ADD_FILELINE)
         .add_arguments (ImageSegRecParserParam::__FIELDS__())
         .add_arguments (ImageSegRecordParam::__FIELDS__())
+        .add_arguments (ImageRecordStateParam::__FIELDS__())
         .add_arguments (BatchParam::__FIELDS__())
         .add_arguments (PrefetcherParam::__FIELDS__())
         .add_arguments (ListDefaultSegAugParams())
@@ -0,0 +1,126 @@
+/*
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ */
+
+/*!
+ *  Copyright (c) 2018 by Contributors
+ * \file record_iter_state.h
+ * \brief checkpointable position of the prefetching record iterators
+ */
+#ifndef MXNET_IO_RECORD_ITER_STATE_H_
+#define MXNET_IO_RECORD_ITER_STATE_H_
+
+#include <dmlc/logging.h>
+#include <deque>
+#include <mutex>
+#include <sstream>
+#include <string>
+#include <utility>
+#include <vector>
+#include "../common/utils.h"
+
+namespace mxnet {
+namespace io {
+/*!
+ * \brief position of a record iterator after a batch: the epoch and record
+ *  of the input split, the round_batch overflow marker and the random states.
+ */
+struct RecordIterState {
+  /*! \brief number of epochs started */
+  uint64_t epoch = 0;
+  /*! \brief number of records of the epoch in the returned batches */
+  uint64_t cursor = 0;
+  /*! \brief whether the last batch wrapped around to the next epoch */
+  bool overflow = false;
+  /*! \brief hash of the sample weights of the epoch, 0 without weights */
+  uint64_t weights_hash = 0;
+  /*! \brief random state of the input split at the beginning of the epoch */
+  common::RANDOM_ENGINE split_rnd;
+  /*! \brief random state of the parser */
+  common::RANDOM_ENGINE rnd;
+  /*! \brief random states of the preprocess threads */
+  std::vector<common::RANDOM_ENGINE> prnds;
+
+  /*! \brief serialize into a portable string */
+  std::string Save() const {
+    std::ostringstream os;
+    os << "RecordIterState " << kVersion << ' ' << epoch << ' ' << cursor << ' '
+       << overflow << ' ' << weights_hash << '\n' << split_rnd << '\n' << rnd << '\n'
+       << prnds.size();
+    for (const auto &prnd : prnds) os << '\n' << prnd;
+    return os.str();
+  }
+
+  /*! \brief load a string returned by Save */
+  void Load(const std::string &str) {
+    std::istringstream is(str);
+    std::string magic;
+    int version = 0;
+    size_t num_prnds = 0;
+    is >> magic >> version;
+    CHECK(is && magic == "RecordIterState") << "Invalid record iterator state";
+    CHECK(version == kVersion)
+      << "Unsupported record iterator state version " << version;
+    is >> epoch >> cursor >> overflow >> weights_hash >> split_rnd >> rnd >> num_prnds;
+    prnds.resize(num_prnds);
+    for (auto &prnd : prnds) is >> prnd;
+    CHECK(is) << "Truncated record iterator state";
+  }
+
+  static const int kVersion = 1;
+};
+
+/*!
+ * \brief states after the batches in the prefetch queue of a threaded iterator.
+ *  The producer pushes the state after each batch it parses and the consumer pops
+ *  one per batch it takes, so that the current state matches the batch returned last.
+ */
+class RecordIterStateQueue {
+ public:
+  /*! \brief drop the queued states, current becomes state */
+  void Reset(RecordIterState state) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    queue_.clear();
+    current_ = std::move(state);
+  }
+  /*! \brief called by the producer after a batch */
+  void Push(RecordIterState state) {
+    std::lock_guard<std::mutex> lock(mutex_);
+    queue_.push_back(std::move(state));
+  }
+  /*! \brief called by the consumer after taking a batch */
+  void Pop() {
+    std::lock_guard<std::mutex> lock(mutex_);
+    CHECK(!queue_.empty());
+    current_ = std::move(queue_.front());
+    queue_.pop_front();
+  }
+  /*! \return the serialized current state */
+  std::string Current() {
+    std::lock_guard<std::mutex> lock(mutex_);
+    return current_.Save();
+  }
+
+ private:
+  std::mutex mutex_;
+  std::deque<RecordIterState> queue_;
+  RecordIterState current_;
+};
+}  // namespace io
+}  // namespace mxnet
+#endif  // MXNET_IO_RECORD_ITER_STATE_H_
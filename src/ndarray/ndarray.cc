@@ -113,7 +113,9 @@ NDArray::Chunk::~Chunk() {
   // We want to delete mkldnn memory after deleting the variable.
   mem.mem = this->mkl_mem_;
 #endif
-  Engine::Get()->DeleteVariable([mem, skip_free](RunContext s) {
+  // the external data is released with the closure, after the pending operations
+  std::shared_ptr<void> external = this->external_data;
+  Engine::Get()->DeleteVariable([mem, skip_free, external](RunContext s) {
     if (skip_free == false) {
 #if MXNET_USE_MKLDNN == 1
       if (mem.mem) {
@@ -32,6 +32,9 @@
 #include <mshadow/base.h>
 #include <nnvm/op.h>
 #include <nnvm/op_attr_types.h>
+#include <algorithm>
+#include <climits>
+#include <type_traits>
 #include <vector>
 #include "./operator_common.h"
 #include "./mshadow_op.h"
@@ -1631,6 +1634,330 @@ inline void AdagradUpdateEx(const nnvm::NodeAttrs& attrs,
   }
 }
 
+/*! \brief maximum number of weights updated by one multi-tensor optimizer operator */
+const int kMaxMultiWeights = 48;
+
+struct MultiSGDParam : public dmlc::Parameter<MultiSGDParam> {
+  nnvm::Tuple<float> lrs;
+  nnvm::Tuple<float> wds;
+  float momentum;
+  float rescale_grad;
+  float clip_gradient;
+  int num_weights;
+  DMLC_DECLARE_PARAMETER(MultiSGDParam) {
+    DMLC_DECLARE_FIELD(lrs)
+    .describe("Learning rates, one per weight.");
+    DMLC_DECLARE_FIELD(wds)
+    .describe("Weight decays, one per weight.");
+    DMLC_DECLARE_FIELD(momentum)
+    .set_default(0.0f)
+    .describe("The decay rate of momentum estimates at each epoch. "
+              "Ignored by the updates without momentum.");
+    DMLC_DECLARE_FIELD(rescale_grad)
+    .set_default(1.0f)
+    .describe("Rescale gradient to grad = rescale_grad*grad.");
+    DMLC_DECLARE_FIELD(clip_gradient)
+    .set_default(-1.0f)
+    .describe("Clip gradient to the range of [-clip_gradient, clip_gradient] "
+              "If clip_gradient <= 0, gradient clipping is turned off. "
+              "grad = max(min(grad, clip_gradient), -clip_gradient).");
+    DMLC_DECLARE_FIELD(num_weights)
+    .set_range(1, kMaxMultiWeights)
+    .describe("Number of updated weights.");
+  }
+};
+
+struct MultiAdamParam : public dmlc::Parameter<MultiAdamParam> {
+  nnvm::Tuple<float> lrs;
+  nnvm::Tuple<float> wds;
+  float beta1;
+  float beta2;
+  float epsilon;
+  float rescale_grad;
+  float clip_gradient;
+  int num_weights;
+  DMLC_DECLARE_PARAMETER(MultiAdamParam) {
+    DMLC_DECLARE_FIELD(lrs)
+    .describe("Learning rates, one per weight.");
+    DMLC_DECLARE_FIELD(wds)
+    .describe("Weight decays, one per weight.");
+    DMLC_DECLARE_FIELD(beta1)
+    .set_default(0.9f)
+    .describe("The decay rate for the 1st moment estimates.");
+    DMLC_DECLARE_FIELD(beta2)
+    .set_default(0.999f)
+    .describe("The decay rate for the 2nd moment estimates.");
+    DMLC_DECLARE_FIELD(epsilon)
+    .set_default(1e-8f)
+    .describe("A small constant for numerical stability.");
+    DMLC_DECLARE_FIELD(rescale_grad)
+    .set_default(1.0f)
+    .describe("Rescale gradient to grad = rescale_grad*grad.");
+    DMLC_DECLARE_FIELD(clip_gradient)
+    .set_default(-1.0f)
+    .describe("Clip gradient to the range of [-clip_gradient, clip_gradient] "
+              "If clip_gradient <= 0, gradient clipping is turned off. "
+              "grad = max(min(grad, clip_gradient), -clip_gradient).");
+    DMLC_DECLARE_FIELD(num_weights)
+    .set_range(1, kMaxMultiWeights)
+    .describe("Number of updated weights.");
+  }
+};
+
+/*!
+ * \brief Shape inference of the multi-tensor updates. The inputs are num_weights groups of
+ *  num_inputs arrays, a weight followed by its gradient and states, which all have the shape
+ *  of the weight. Output i is weight i.
+ */
+template<typename ParamType, int num_inputs>
+inline bool MultiUpdateShape(const nnvm::NodeAttrs& attrs,
+                             std::vector<TShape> *in_attrs,
+                             std::vector<TShape> *out_attrs) {
+  const ParamType& param = nnvm::get<ParamType>(attrs.parsed);
+  CHECK_EQ(in_attrs->size(), static_cast<size_t>(param.num_weights * num_inputs));
+  CHECK_EQ(out_attrs->size(), static_cast<size_t>(param.num_weights));
+  bool all_inferred = true;
+  for (int i = 0; i < param.num_weights; ++i) {
+    std::vector<TShape> in(in_attrs->begin() + i * num_inputs,
+                           in_attrs->begin() + (i + 1) * num_inputs);
+    std::vector<TShape> out(1, (*out_attrs)[i]);
+    all_inferred = ElemwiseShape<num_inputs, 1>(attrs, &in, &out) && all_inferred;
+    std::copy(in.begin(), in.end(), in_attrs->begin() + i * num_inputs);
+    (*out_attrs)[i] = out[0];
+  }
+  return all_inferred;
+}
+
+/*!
+ * \brief Type inference of the multi-tensor mixed precision updates: the weights, gradients
+ *  and outputs share a type, the states and the fp32 weight copies are float32.
+ */
+template<typename ParamType, int num_inputs>
+inline bool MultiMPUpdateType(const nnvm::NodeAttrs& attrs,
+                              std::vector<int> *in_attrs,
+                              std::vector<int> *out_attrs) {
+  const ParamType& param = nnvm::get<ParamType>(attrs.parsed);
+  CHECK_EQ(in_attrs->size(), static_cast<size_t>(param.num_weights * num_inputs));
+  CHECK_EQ(out_attrs->size(), static_cast<size_t>(param.num_weights));
+  std::vector<int> in, out(*out_attrs);
+  for (int i = 0; i < param.num_weights; ++i) {
+    in.push_back((*in_attrs)[i * num_inputs]);
+    in.push_back((*in_attrs)[i * num_inputs + 1]);
+    for (int j = 2; j < num_inputs; ++j) {
+      TYPE_ASSIGN_CHECK(*in_attrs, i * num_inputs + j, mshadow::kFloat32);
+    }
+  }
+  if (!ElemwiseType<-1, -1>(attrs, &in, &out)) return false;
+  for (int i = 0; i < param.num_weights; ++i) {
+    (*in_attrs)[i * num_inputs] = in[2 * i];
+    (*in_attrs)[i * num_inputs + 1] = in[2 * i + 1];
+  }
+  *out_attrs = out;
+  return true;
+}
+
+/*!
+ * \brief Arguments of a multi-tensor update kernel. The kernel runs over the concatenation
+ *  of the weights, offsets[i] being the position of weight i in it, so that a launch does
+ *  the same work as separate launches per weight.
+ */
+template<typename DType, typename MPDType>
+struct MultiUpdateKernelParam {
+  int count;
+  int offsets[kMaxMultiWeights + 1];
+  DType* weights[kMaxMultiWeights];
+  DType* grads[kMaxMultiWeights];
+  DType* outs[kMaxMultiWeights];
+  MPDType* states0[kMaxMultiWeights];
+  MPDType* states1[kMaxMultiWeights];
+  float* weights32[kMaxMultiWeights];
+  float lrs[kMaxMultiWeights];
+  float wds[kMaxMultiWeights];
+
+  /*! \brief index of the weight that element i belongs to */
+  MSHADOW_XINLINE int Find(int i) const {
+    int lo = 0, hi = count - 1;
+    while (lo < hi) {
+      const int mid = (lo + hi + 1) / 2;
+      if (offsets[mid] <= i) {
+        lo = mid;
+      } else {
+        hi = mid - 1;
+      }
+    }
+    return lo;
+  }
+
+  /*! \brief weight j at position k, from the fp32 copy if there is one */
+  MSHADOW_XINLINE MPDType Weight(int j, int k) const {
+    return weights32[j] != nullptr ? static_cast<MPDType>(weights32[j][k])
+                                   : static_cast<MPDType>(weights[j][k]);
+  }
+
+  MSHADOW_XINLINE void SetWeight(int j, int k, MPDType w, OpReqType req) const {
+    if (weights32[j] != nullptr) weights32[j][k] = static_cast<float>(w);
+    KERNEL_ASSIGN(outs[j][k], req, static_cast<DType>(w));
+  }
+};
+
+/*!
+ * \brief gather the arrays of a multi-tensor update
+ * \param num_states number of states per weight, following its gradient
+ * \param has_weight32 whether the states are followed by an fp32 copy of the weight
+ */
+template<typename DType, typename MPDType>
+inline MultiUpdateKernelParam<DType, MPDType> MultiUpdateArgs(
+    const std::vector<TBlob> &inputs, const std::vector<TBlob> &outputs,
+    const nnvm::Tuple<float> &lrs, const nnvm::Tuple<float> &wds,
+    int num_states, bool has_weight32) {
+  const int num_inputs = 2 + num_states + has_weight32;
+  MultiUpdateKernelParam<DType, MPDType> param;
+  param.count = outputs.size();
+  CHECK_EQ(lrs.ndim(), outputs.size()) << "Expected one learning rate per weight";
+  CHECK_EQ(wds.ndim(), outputs.size()) << "Expected one weight decay per weight";
+  param.offsets[0] = 0;
+  for (int i = 0; i < param.count; ++i) {
+    const std::vector<TBlob>::const_iterator in = inputs.begin() + i * num_inputs;
+    const size_t size = in[0].Size();
+    CHECK_LE(param.offsets[i] + size, static_cast<size_t>(INT_MAX))
+      << "Total size of the weights is too large for a multi-tensor update";
+    param.offsets[i + 1] = param.offsets[i] + size;
+    param.weights[i] = in[0].dptr<DType>();
+    param.grads[i] = in[1].dptr<DType>();
+    param.outs[i] = outputs[i].dptr<DType>();
+    param.states0[i] = num_states > 0 ? in[2].dptr<MPDType>() : nullptr;
+    param.states1[i] = num_states > 1 ? in[3].dptr<MPDType>() : nullptr;
+    param.weights32[i] = has_weight32 ? in[2 + num_states].dptr<float>() : nullptr;
+    param.lrs[i] = lrs[i];
+    param.wds[i] = wds[i];
+  }
+  return param;
+}
+
+struct MultiSGDKernel {
+  template<typename DType, typename MPDType>
+  MSHADOW_XINLINE static void Map(int i, const MultiUpdateKernelParam<DType, MPDType> &param,
+                                  const float clip_gradient, const float rescale_grad,
+                                  const float momentum, const OpReqType req) {
+    const int j = param.Find(i);
+    const int k = i - param.offsets[j];
+    const MPDType lr = param.lrs[j], wd = param.wds[j];
+    MPDType grad = static_cast<MPDType>(rescale_grad) * static_cast<MPDType>(param.grads[j][k]);
+    if (clip_gradient >= 0.0f) {
+      grad = mshadow_op::clip::Map(grad, static_cast<MPDType>(clip_gradient));
+    }
+    const MPDType w = (static_cast<MPDType>(1.f) - lr * wd) * param.Weight(j, k) - lr * grad;
+    param.SetWeight(j, k, w, req);
+  }
+};
+
+struct MultiSGDMomKernel {
+  template<typename DType, typename MPDType>
+  MSHADOW_XINLINE static void Map(int i, const MultiUpdateKernelParam<DType, MPDType> &param,
+                                  const float clip_gradient, const float rescale_grad,
+                                  const float momentum, const OpReqType req) {
+    const int j = param.Find(i);
+    const int k = i - param.offsets[j];
+    const MPDType lr = param.lrs[j], wd = param.wds[j];
+    MPDType grad = static_cast<MPDType>(rescale_grad) * static_cast<MPDType>(param.grads[j][k]);
+    if (clip_gradient >= 0.0f) {
+      grad = mshadow_op::clip::Map(grad, static_cast<MPDType>(clip_gradient));
+    }
+    const MPDType w = param.Weight(j, k);
+    const MPDType mom = static_cast<MPDType>(momentum) * param.states0[j][k] - lr * wd * w
+                        - lr * grad;
+    param.states0[j][k] = mom;
+    param.SetWeight(j, k, w + mom, req);
+  }
+};
+
+struct MultiNAGMomKernel {
+  template<typename DType, typename MPDType>
+  MSHADOW_XINLINE static void Map(int i, const MultiUpdateKernelParam<DType, MPDType> &param,
+                                  const float clip_gradient, const float rescale_grad,
+                                  const float momentum, const OpReqType req) {
+    const int j = param.Find(i);
+    const int k = i - param.offsets[j];
+    const MPDType lr = param.lrs[j], wd = param.wds[j];
+    MPDType grad = static_cast<MPDType>(rescale_grad) * static_cast<MPDType>(param.grads[j][k]);
+    if (clip_gradient >= 0.0f) {
+      grad = mshadow_op::clip::Map(grad, static_cast<MPDType>(clip_gradient));
+    }
+    const MPDType w = param.Weight(j, k);
+    grad += wd * w;
+    const MPDType mom = static_cast<MPDType>(momentum) * param.states0[j][k] + grad;
+    param.states0[j][k] = mom;
+    param.SetWeight(j, k, w - lr * (grad + static_cast<MPDType>(momentum) * mom), req);
+  }
+};
+
+struct MultiAdamKernel {
+  template<typename DType, typename MPDType>
+  MSHADOW_XINLINE static void Map(int i, const MultiUpdateKernelParam<DType, MPDType> &param,
+                                  const float clip_gradient, const float rescale_grad,
+                                  const float beta1, const float beta2, const float epsilon,
+                                  const OpReqType req) {
+    const int j = param.Find(i);
+    const int k = i - param.offsets[j];
+    const MPDType lr = param.lrs[j], wd = param.wds[j];
+    const MPDType w = param.Weight(j, k);
+    MPDType grad = static_cast<MPDType>(rescale_grad) * static_cast<MPDType>(param.grads[j][k])
+                   + wd * w;
+    if (clip_gradient >= 0.0f) {
+      grad = mshadow_op::clip::Map(grad, static_cast<MPDType>(clip_gradient));
+    }
+    const MPDType mean = static_cast<MPDType>(beta1) * param.states0[j][k]
+                         + static_cast<MPDType>(1.f - beta1) * grad;
+    const MPDType var = static_cast<MPDType>(beta2) * param.states1[j][k]
+                        + static_cast<MPDType>(1.f - beta2) * grad * grad;
+    param.states0[j][k] = mean;
+    param.states1[j][k] = var;
+    param.SetWeight(j, k, w - lr * mean / (mshadow_op::square_root::Map(var)
+                                           + static_cast<MPDType>(epsilon)), req);
+  }
+};
+
+/*!
+ * \brief multi-tensor SGD, SGD with momentum or NAG update
+ * \tparam OP MultiSGDKernel, MultiSGDMomKernel or MultiNAGMomKernel
+ * \tparam num_states 0 for MultiSGDKernel, 1 (the momentum) otherwise
+ * \tparam has_weight32 whether the weights are updated in a fp32 copy
+ */
+template<typename xpu, typename OP, int num_states, bool has_weight32>
+inline void MultiSGDUpdate(const nnvm::NodeAttrs& attrs,
+                           const OpContext &ctx,
+                           const std::vector<TBlob> &inputs,
+                           const std::vector<OpReqType> &req,
+                           const std::vector<TBlob> &outputs) {
+  using namespace mxnet_op;
+  const MultiSGDParam& param = nnvm::get<MultiSGDParam>(attrs.parsed);
+  Stream<xpu>* s = ctx.get_stream<xpu>();
+  MSHADOW_REAL_TYPE_SWITCH(inputs[0].type_flag_, DType, {
+    typedef typename std::conditional<has_weight32, float, DType>::type MPDType;
+    MultiUpdateKernelParam<DType, MPDType> args = MultiUpdateArgs<DType, MPDType>(
+      inputs, outputs, param.lrs, param.wds, num_states, has_weight32);
+    Kernel<OP, xpu>::Launch(s, args.offsets[args.count], args, param.clip_gradient,
+                            param.rescale_grad, param.momentum, req[0]);
+  });
+}
+
+template<typename xpu>
+inline void MultiAdamUpdate(const nnvm::NodeAttrs& attrs,
+                            const OpContext &ctx,
+                            const std::vector<TBlob> &inputs,
+                            const std::vector<OpReqType> &req,
+                            const std::vector<TBlob> &outputs) {
+  using namespace mxnet_op;
+  const MultiAdamParam& param = nnvm::get<MultiAdamParam>(attrs.parsed);
+  Stream<xpu>* s = ctx.get_stream<xpu>();
+  MSHADOW_REAL_TYPE_SWITCH(inputs[0].type_flag_, DType, {
+    MultiUpdateKernelParam<DType, DType> args = MultiUpdateArgs<DType, DType>(
+      inputs, outputs, param.lrs, param.wds, 2, false);
+    Kernel<MultiAdamKernel, xpu>::Launch(s, args.offsets[args.count], args,
+      param.clip_gradient, param.rescale_grad, param.beta1, param.beta2, param.epsilon, req[0]);
+  });
+}
+
 }  // namespace op
 }  // namespace mxnet
 
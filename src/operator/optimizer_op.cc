@@ -39,6 +39,49 @@ DMLC_REGISTER_PARAMETER(FtrlParam);
 DMLC_REGISTER_PARAMETER(SignSGDParam);
 DMLC_REGISTER_PARAMETER(SignumParam);
 DMLC_REGISTER_PARAMETER(AdagradParam);
+DMLC_REGISTER_PARAMETER(MultiSGDParam);
+DMLC_REGISTER_PARAMETER(MultiAdamParam);
+
+/*!
+ * \brief input names of a multi-tensor update, the names of the arrays of one weight
+ *  suffixed by the index of the weight
+ */
+template<typename ParamType>
+nnvm::FListInputNames MultiUpdateInputNames(const std::vector<std::string> &names) {
+  return [names](const nnvm::NodeAttrs& attrs) {
+    const ParamType& param = nnvm::get<ParamType>(attrs.parsed);
+    std::vector<std::string> ret;
+    for (int i = 0; i < param.num_weights; ++i) {
+      for (const auto& name : names) {
+        ret.push_back(name + "_" + std::to_string(i));
+      }
+    }
+    return ret;
+  };
+}
+
+/*! \brief the states and fp32 weights, which follow the weight and gradient of each weight */
+template<typename ParamType, int num_inputs>
+std::vector<uint32_t> MultiUpdateMutateInputs(const nnvm::NodeAttrs& attrs) {
+  const ParamType& param = nnvm::get<ParamType>(attrs.parsed);
+  std::vector<uint32_t> ret;
+  for (int i = 0; i < param.num_weights; ++i) {
+    for (int j = 2; j < num_inputs; ++j) {
+      ret.push_back(i * num_inputs + j);
+    }
+  }
+  return ret;
+}
+
+template<typename ParamType, int num_inputs>
+uint32_t MultiUpdateNumInputs(const nnvm::NodeAttrs& attrs) {
+  return nnvm::get<ParamType>(attrs.parsed).num_weights * num_inputs;
+}
+
+template<typename ParamType>
+uint32_t MultiUpdateNumOutputs(const nnvm::NodeAttrs& attrs) {
+  return nnvm::get<ParamType>(attrs.parsed).num_weights;
+}
 
 NNVM_REGISTER_OP(signsgd_update)
 .describe(R"code(Update function for SignSGD optimizer.
@@ -320,6 +363,138 @@ NNVM_REGISTER_OP(mp_sgd_mom_update)
 .add_argument("weight32", "NDArray-or-Symbol", "Weight32")
 .add_arguments(SGDMomParam::__FIELDS__());
 
+NNVM_REGISTER_OP(multi_sgd_update)
+.describe(R"code(Update function for Stochastic Gradient Descent (SDG) optimizer
+applied to several weights at once.
+
+It updates each weight ``i`` as ``sgd_update`` does::
+
+ weight_i = weight_i - lrs[i] * (gradient_i + wds[i] * weight_i)
+
+The inputs are ``weight_0, grad_0, weight_1, grad_1, ...``. Updating the weights in one
+call saves the overhead of an operator call per weight, which dominates for small weights.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiSGDParam, 2>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiSGDParam>)
+.set_attr_parser(ParamParser<MultiSGDParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiSGDParam, 2>)
+.set_attr<nnvm::FInferType>("FInferType", ElemwiseType<-1, -1>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiSGDParam>({"weight", "grad"}))
+.set_attr<FCompute>("FCompute<cpu>", MultiSGDUpdate<cpu, MultiSGDKernel, 0, false>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights and gradients")
+.add_arguments(MultiSGDParam::__FIELDS__());
+
+NNVM_REGISTER_OP(multi_sgd_mom_update)
+.describe(R"code(Momentum update function for Stochastic Gradient Descent (SGD) optimizer
+applied to several weights at once.
+
+It updates each weight ``i`` as ``sgd_mom_update`` does::
+
+ v_i = momentum * v_i - lrs[i] * (gradient_i + wds[i] * weight_i)
+ weight_i += v_i
+
+The inputs are ``weight_0, grad_0, mom_0, weight_1, grad_1, mom_1, ...``.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiSGDParam, 3>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiSGDParam>)
+.set_attr_parser(ParamParser<MultiSGDParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiSGDParam, 3>)
+.set_attr<nnvm::FInferType>("FInferType", ElemwiseType<-1, -1>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiSGDParam>({"weight", "grad", "mom"}))
+.set_attr<nnvm::FMutateInputs>("FMutateInputs", MultiUpdateMutateInputs<MultiSGDParam, 3>)
+.set_attr<FCompute>("FCompute<cpu>", MultiSGDUpdate<cpu, MultiSGDMomKernel, 1, false>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights, gradients and momentums")
+.add_arguments(MultiSGDParam::__FIELDS__());
+
+NNVM_REGISTER_OP(multi_mp_sgd_update)
+.describe(R"code(Updater function for multi-precision sgd optimizer applied to several
+weights at once, see ``multi_sgd_update``.
+
+The inputs are ``weight_0, grad_0, weight32_0, weight_1, grad_1, weight32_1, ...``.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiSGDParam, 3>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiSGDParam>)
+.set_attr_parser(ParamParser<MultiSGDParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiSGDParam, 3>)
+.set_attr<nnvm::FInferType>("FInferType", MultiMPUpdateType<MultiSGDParam, 3>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiSGDParam>({"weight", "grad",
+                                                                       "weight32"}))
+.set_attr<nnvm::FMutateInputs>("FMutateInputs", MultiUpdateMutateInputs<MultiSGDParam, 3>)
+.set_attr<FCompute>("FCompute<cpu>", MultiSGDUpdate<cpu, MultiSGDKernel, 0, true>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights, gradients and fp32 weights")
+.add_arguments(MultiSGDParam::__FIELDS__());
+
+NNVM_REGISTER_OP(multi_mp_sgd_mom_update)
+.describe(R"code(Updater function for multi-precision sgd optimizer with momentum applied
+to several weights at once, see ``multi_sgd_mom_update``.
+
+The inputs are ``weight_0, grad_0, mom_0, weight32_0, weight_1, ...``.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiSGDParam, 4>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiSGDParam>)
+.set_attr_parser(ParamParser<MultiSGDParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiSGDParam, 4>)
+.set_attr<nnvm::FInferType>("FInferType", MultiMPUpdateType<MultiSGDParam, 4>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiSGDParam>({"weight", "grad", "mom",
+                                                                       "weight32"}))
+.set_attr<nnvm::FMutateInputs>("FMutateInputs", MultiUpdateMutateInputs<MultiSGDParam, 4>)
+.set_attr<FCompute>("FCompute<cpu>", MultiSGDUpdate<cpu, MultiSGDMomKernel, 1, true>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights, gradients, momentums and fp32 weights")
+.add_arguments(MultiSGDParam::__FIELDS__());
+
+NNVM_REGISTER_OP(multi_nag_mom_update)
+.describe(R"code(Update function for Nesterov accelerated SGD applied to several weights
+at once.
+
+It updates each weight ``i`` using::
+
+ gradient_i += wds[i] * weight_i
+ mom_i = momentum * mom_i + gradient_i
+ weight_i -= lrs[i] * (gradient_i + momentum * mom_i)
+
+The inputs are ``weight_0, grad_0, mom_0, weight_1, grad_1, mom_1, ...``.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiSGDParam, 3>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiSGDParam>)
+.set_attr_parser(ParamParser<MultiSGDParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiSGDParam, 3>)
+.set_attr<nnvm::FInferType>("FInferType", ElemwiseType<-1, -1>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiSGDParam>({"weight", "grad", "mom"}))
+.set_attr<nnvm::FMutateInputs>("FMutateInputs", MultiUpdateMutateInputs<MultiSGDParam, 3>)
+.set_attr<FCompute>("FCompute<cpu>", MultiSGDUpdate<cpu, MultiNAGMomKernel, 1, false>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights, gradients and momentums")
+.add_arguments(MultiSGDParam::__FIELDS__());
+
+NNVM_REGISTER_OP(multi_adam_update)
+.describe(R"code(Update function for Adam optimizer applied to several weights at once.
+
+It updates each weight ``i`` as ``adam_update`` does, with learning rate ``lrs[i]`` and
+weight decay ``wds[i]``. The inputs are ``weight_0, grad_0, mean_0, var_0, weight_1, ...``.
+
+)code" ADD_FILELINE)
+.set_num_inputs(MultiUpdateNumInputs<MultiAdamParam, 4>)
+.set_num_outputs(MultiUpdateNumOutputs<MultiAdamParam>)
+.set_attr_parser(ParamParser<MultiAdamParam>)
+.set_attr<nnvm::FInferShape>("FInferShape", MultiUpdateShape<MultiAdamParam, 4>)
+.set_attr<nnvm::FInferType>("FInferType", ElemwiseType<-1, -1>)
+.set_attr<nnvm::FListInputNames>("FListInputNames",
+                                 MultiUpdateInputNames<MultiAdamParam>({"weight", "grad", "mean",
+                                                                        "var"}))
+.set_attr<nnvm::FMutateInputs>("FMutateInputs", MultiUpdateMutateInputs<MultiAdamParam, 4>)
+.set_attr<FCompute>("FCompute<cpu>", MultiAdamUpdate<cpu>)
+.add_argument("data", "NDArray-or-Symbol[]", "Weights, gradients, means and variances")
+.add_arguments(MultiAdamParam::__FIELDS__());
+
 NNVM_REGISTER_OP(ftml_update)
 .describe(R"code(The FTML optimizer described in
 *FTML - Follow the Moving Leader in Deep Learning*,
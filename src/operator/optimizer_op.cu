@@ -183,6 +183,24 @@ NNVM_REGISTER_OP(mp_sgd_update)
 NNVM_REGISTER_OP(mp_sgd_mom_update)
 .set_attr<FCompute>("FCompute<gpu>", MP_SGDMomUpdate<gpu>);
 
+NNVM_REGISTER_OP(multi_sgd_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiSGDUpdate<gpu, MultiSGDKernel, 0, false>);
+
+NNVM_REGISTER_OP(multi_sgd_mom_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiSGDUpdate<gpu, MultiSGDMomKernel, 1, false>);
+
+NNVM_REGISTER_OP(multi_mp_sgd_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiSGDUpdate<gpu, MultiSGDKernel, 0, true>);
+
+NNVM_REGISTER_OP(multi_mp_sgd_mom_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiSGDUpdate<gpu, MultiSGDMomKernel, 1, true>);
+
+NNVM_REGISTER_OP(multi_nag_mom_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiSGDUpdate<gpu, MultiNAGMomKernel, 1, false>);
+
+NNVM_REGISTER_OP(multi_adam_update)
+.set_attr<FCompute>("FCompute<gpu>", MultiAdamUpdate<gpu>);
+
 NNVM_REGISTER_OP(ftml_update)
 .set_attr<FCompute>("FCompute<gpu>", FTMLUpdate<gpu>);
 
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# pylint: skip-file
+# Trains with gradient buckets on dist_sync and checks the weights against
+# unbucketed training on one context per worker. Trainer and Module use
+# different kvstore keys, so each mode runs in its own job:
+#   ../../tools/launch.py -n 4 python dist_sync_bucketing.py gluon
+import argparse
+import os
+import sys
+sys.path.insert(0, "../../python/")
+import mxnet as mx
+import numpy as np
+from mxnet import autograd, gluon
+from mxnet.test_utils import assert_almost_equal
+
+batch_size = 4
+num_batches = 5
+bucket_size = 1024
+shapes = [(16, 10), (16,), (8, 16), (8,), (1, 8), (1,)]
+
+kv = mx.kv.create('dist_sync')
+
+def get_weights():
+    rnd = np.random.RandomState(0)
+    return [rnd.uniform(-0.5, 0.5, shape) for shape in shapes]
+
+def get_batches(rank):
+    rnd = np.random.RandomState(rank + 1)
+    return [(rnd.uniform(-1, 1, (batch_size, 10)), rnd.uniform(-1, 1, (batch_size, 1)))
+            for _ in range(num_batches)]
+
+def train_gluon(contexts, batches, kvstore, **kwargs):
+    net = gluon.nn.Sequential()
+    with net.name_scope():
+        net.add(gluon.nn.Dense(16, in_units=10, activation='relu'))
+        net.add(gluon.nn.Dense(8, in_units=16, activation='relu'))
+        net.add(gluon.nn.Dense(1, in_units=8))
+    net.initialize(ctx=contexts)
+    params = list(net.collect_params().values())
+    for param, weight in zip(params, get_weights()):
+        param.set_data(mx.nd.array(weight))
+    trainer = gluon.Trainer(params, 'sgd', {'learning_rate': 0.1},
+                            kvstore=kvstore, **kwargs)
+    loss = gluon.loss.L2Loss()
+    for step in range(num_batches):
+        with autograd.record():
+            losses = [loss(net(mx.nd.array(batches[i][step][0], ctx=ctx)),
+                           mx.nd.array(batches[i][step][1], ctx=ctx))
+                      for i, ctx in enumerate(contexts)]
+        for l in losses:
+            l.backward()
+        trainer.step(batch_size)
+    return [param.data(contexts[0]).asnumpy() for param in params]
+
+def train_module(contexts, batches, kvstore):
+    data = mx.sym.Variable('data')
+    net = mx.sym.FullyConnected(data, num_hidden=16, name='fc1')
+    net = mx.sym.Activation(net, act_type='relu')
+    net = mx.sym.FullyConnected(net, num_hidden=8, name='fc2')
+    net = mx.sym.Activation(net, act_type='relu')
+    net = mx.sym.FullyConnected(net, num_hidden=1, name='fc3')
+    net = mx.sym.LinearRegressionOutput(net, name='lro')
+    mod = mx.mod.Module(net, label_names=('lro_label',), context=contexts)
+    mod.bind(data_shapes=[('data', (batch_size * len(contexts), 10))],
+             label_shapes=[('lro_label', (batch_size * len(contexts), 1))])
+    names = ['fc1_weight', 'fc1_bias', 'fc2_weight', 'fc2_bias', 'fc3_weight', 'fc3_bias']
+    mod.init_params(arg_params={name: mx.nd.array(weight)
+                                for name, weight in zip(names, get_weights())})
+    mod.init_optimizer(kvstore=kvstore, optimizer='sgd',
+                       optimizer_params={'learning_rate': 0.1})
+    for step in range(num_batches):
+        # the executor group gives each context its slice of the batch
+        data = np.concatenate([b[step][0] for b in batches])
+        label = np.concatenate([b[step][1] for b in batches])
+        mod.forward_backward(mx.io.DataBatch([mx.nd.array(data)], [mx.nd.array(label)]))
+        mod.update()
+    arg_params, _ = mod.get_params()
+    return [arg_params[name].asnumpy() for name in names]
+
+def test_sync_bucketing(mode):
+    my_rank = kv.rank
+    nworker = kv.num_workers
+    contexts = [mx.cpu(i) for i in range(nworker)]
+    batches = [get_batches(rank) for rank in range(nworker)]
+    if mode == 'module':
+        os.environ['MXNET_KVSTORE_BUCKET_SIZE'] = '0'
+        expected = train_module(contexts, batches, 'local')
+        os.environ['MXNET_KVSTORE_BUCKET_SIZE'] = str(bucket_size)
+        result = train_module([mx.cpu()], batches[my_rank:my_rank+1], kv)
+    else:
+        kwargs = {'bucket_size': bucket_size}
+        if mode == 'overlap':
+            kwargs['overlap_comm'] = True
+        expected = train_gluon(contexts, batches, 'local', bucket_size=0)
+        result = train_gluon([mx.cpu()], batches[my_rank:my_rank+1], kv, **kwargs)
+    for res, exp in zip(result, expected):
+        assert_almost_equal(res, exp, rtol=1e-4, atol=1e-5)
+    print('worker ' + str(my_rank) + ' ' + mode + ' bucketing is correct')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='test gradient bucketing on dist_sync')
+    parser.add_argument('mode', choices=['gluon', 'overlap', 'module'])
+    args = parser.parse_args()
+    test_sync_bucketing(args.mode)
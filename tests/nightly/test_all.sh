@@ -53,6 +53,9 @@ juLog -name=Python.Local.KVStore -error=Error python test_kvstore.py
 
 # python: distributed kvstore
 juLog -name=Python.Distributed.KVStore -error=Error ../../tools/launch.py -n 4 python dist_sync_kvstore.py
+for mode in gluon overlap module; do
+    juLog -name=Python.Distributed.Bucketing.$mode -error=Error ../../tools/launch.py -n 4 python dist_sync_bucketing.py $mode
+done
 
 # download data
 juLog -name=DownloadData bash ./download.sh
@@ -0,0 +1,115 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+from collections import OrderedDict
+import mxnet as mx
+import numpy as np
+from mxnet.test_utils import assert_almost_equal
+from common import setup_module, with_seed, assertRaises, TemporaryDirectory
+
+
+@with_seed()
+def test_checkpoint_save_load():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'ckpt')
+        arrays = OrderedDict()
+        arrays['a'] = mx.nd.random.uniform(shape=(30, 7))
+        arrays['b'] = mx.nd.arange(11, dtype='int32')
+        arrays['c'] = mx.nd.random.uniform(shape=(5, 3, 2), ctx=mx.cpu(1)).astype('float16')
+        arrays['d'] = mx.nd.zeros((0, 4))
+        arrays['e'] = mx.nd.ones((6, 2)).tostype('row_sparse')
+        expected = {k: v.asnumpy() for k, v in arrays.items()}
+
+        future = mx.checkpoint.save(path, arrays, shard_size=512)
+        # later updates do not change the checkpoint
+        arrays['a'][:] = 0
+        future.wait()
+        assert future.done()
+        assert mx.checkpoint.is_checkpoint(path)
+        assert mx.checkpoint.list_arrays(path) == list(arrays)
+        with open(os.path.join(path, mx.checkpoint.MANIFEST)) as fin:
+            manifest = json.load(fin)
+        assert len(manifest['shards']) == 2
+        assert all(entry['offset'] % 64 == 0 for entry in manifest['arrays'])
+
+        loaded = list(mx.checkpoint.iter_load(path, prefetch=1))
+        assert [k for k, _ in loaded] == list(arrays)
+        for name, value in loaded:
+            assert value.dtype == arrays[name].dtype
+            assert value.stype == arrays[name].stype
+            assert_almost_equal(value.asnumpy(), expected[name])
+
+        # saving again replaces the checkpoint
+        mx.checkpoint.save(path, {'x': mx.nd.ones((2,))}, background=False)
+        loaded = mx.checkpoint.load(path, ctx=mx.cpu(1))
+        assert list(loaded) == ['x'] and loaded['x'].context == mx.cpu(1)
+        assert not os.path.exists(path + '.tmp') and not os.path.exists(path + '.old')
+
+
+@with_seed()
+def test_checkpoint_mmap():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'ckpt')
+        arrays = OrderedDict()
+        arrays['a'] = mx.nd.random.uniform(shape=(30, 7))
+        arrays['b'] = mx.nd.arange(11, dtype='int32')
+        arrays['c'] = mx.nd.zeros((0, 4))
+        arrays['d'] = mx.nd.ones((6, 2)).tostype('row_sparse')
+        expected = {k: v.asnumpy() for k, v in arrays.items()}
+        mx.checkpoint.save(path, arrays, shard_size=512, background=False)
+
+        for ctx in [mx.cpu(0), mx.cpu(1)]:
+            loaded = mx.checkpoint.load(path, ctx=ctx, mmap=True)
+            assert list(loaded) == list(arrays)
+            for name, value in loaded.items():
+                assert value.context == ctx
+                assert value.dtype == arrays[name].dtype
+                assert value.stype == arrays[name].stype
+                assert_almost_equal(value.asnumpy(), expected[name])
+
+        # mapped arrays are copy-on-write
+        loaded = mx.checkpoint.load(path, mmap=True)
+        loaded['a'][:] = 1
+        loaded['a'].wait_to_read()
+        del loaded
+        assert_almost_equal(mx.checkpoint.load(path, mmap=True)['a'].asnumpy(), expected['a'])
+
+        params = mx.gluon.ParameterDict()
+        for name in ['a', 'b']:
+            params.get(name, dtype=arrays[name].dtype)
+        params.load(path, mx.cpu(), ignore_extra=True, mmap=True)
+        params['a'].data()[:] = 2
+        assert_almost_equal(params['b'].data().asnumpy(), expected['b'])
+        assert_almost_equal(mx.checkpoint.load(path)['a'].asnumpy(), expected['a'])
+
+
+@with_seed()
+def test_checkpoint_error():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'missing', 'ckpt')
+        with open(os.path.dirname(path), 'w') as fout:
+            fout.write('not a directory')
+        future = mx.checkpoint.save(path, {'x': mx.nd.ones((2,))})
+        assertRaises(OSError, future.wait)
+        assert not mx.checkpoint.is_checkpoint(path)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.runmodule()
@@ -19,7 +19,7 @@ import mxnet as mx
 from mxnet import gluon
 from mxnet.gluon import nn
 from mxnet.test_utils import assert_almost_equal
-from common import setup_module, with_seed
+from common import setup_module, with_seed, TemporaryDirectory
 import numpy as np
 from nose.tools import raises
 from copy import deepcopy
@@ -510,6 +510,150 @@ def test_trainer():
         assert trainer._optimizer == trainer._updaters[0].optimizer
 
 
+@with_seed()
+def test_trainer_bucketing():
+    ctx = [mx.cpu(0), mx.cpu(1)]
+    def train(bucket_size, kvstore):
+        net = nn.HybridSequential()
+        with net.name_scope():
+            net.add(nn.Dense(4, in_units=3))
+            net.add(nn.Dense(5, in_units=4))
+            net.add(nn.Dense(2, in_units=5))
+        net.initialize(mx.init.One(), ctx=ctx)
+        trainer = gluon.Trainer(net.collect_params(), 'sgd',
+                                {'learning_rate': 0.1, 'momentum': 0.9},
+                                kvstore=kvstore, bucket_size=bucket_size)
+        for i in range(3):
+            with mx.autograd.record():
+                losses = [net(mx.nd.ones((2, 3), ctx=c) * (j + i)) for j, c in enumerate(ctx)]
+            mx.autograd.backward(losses)
+            trainer.step(4)
+        return trainer, [p.data(ctx[1]).asnumpy() for p in net.collect_params().values()]
+
+    for kvstore in ['local', 'device']:
+        _, expected = train(0, kvstore)
+        # weights are 48, 80 and 40 bytes, biases 16, 20 and 8 bytes
+        trainer, results = train(100, kvstore)
+        assert not trainer._update_on_kvstore
+        groups = [group for _, group, _, _ in trainer._grad_buckets.buckets]
+        assert groups == [[0, 1], [2, 3], [4, 5]]
+        for result, exp in zip(results, expected):
+            assert_almost_equal(result, exp, rtol=1e-5, atol=1e-6)
+
+
+@with_seed()
+def test_parameter_grad_hook():
+    x = gluon.Parameter('x', shape=(4,))
+    x.initialize(ctx=[mx.cpu(0), mx.cpu(1)], init='ones')
+    ready = []
+    x.register_grad_hook(lambda param, grad: ready.append((param.name, grad.context)))
+    for i in range(2):
+        with mx.autograd.record():
+            ys = [(w * 2).sum() for w in x.list_data()]
+        ys[0].backward()
+        ys[1].backward()
+        mx.nd.waitall()
+        mx.autograd._wait_ready_callbacks()
+        assert sorted(ready) == [('x', mx.cpu(0)), ('x', mx.cpu(1))]
+        # fresh gradients do not fire again until they are consumed
+        with mx.autograd.record():
+            y = (x.data(mx.cpu(0)) * 3).sum()
+        y.backward()
+        mx.nd.waitall()
+        mx.autograd._wait_ready_callbacks()
+        assert len(ready) == 2
+        for data in x.list_data():
+            data._fresh_grad = False
+        del ready[:]
+
+
+@with_seed()
+def test_trainer_overlap_comm():
+    ctx = [mx.cpu(0), mx.cpu(1)]
+    def train(grad_req='write', **kwargs):
+        net = nn.HybridSequential()
+        with net.name_scope():
+            net.add(nn.Dense(4, in_units=3))
+            net.add(nn.Dense(2, in_units=4))
+        net.initialize(mx.init.One(), ctx=ctx)
+        net.collect_params().setattr('grad_req', grad_req)
+        trainer = gluon.Trainer(net.collect_params(), 'sgd',
+                                {'learning_rate': 0.1, 'momentum': 0.9}, **kwargs)
+        for i in range(4):
+            # gradients are accumulated over two backward passes with grad_req='add'
+            for k in range(2 if grad_req == 'add' else 1):
+                with mx.autograd.record():
+                    losses = [net(mx.nd.ones((2, 3), ctx=c) * (j + i + k))
+                              for j, c in enumerate(ctx)]
+                for loss in losses:
+                    loss.backward()
+            if kwargs.get('overlap_comm') and i > 0:
+                # the kvstore is created by the first step
+                mx.nd.waitall()
+                mx.autograd._wait_ready_callbacks()
+                if grad_req == 'add':
+                    assert not any(trainer._reduced)
+                else:
+                    assert all(trainer._reduced)
+            trainer.step(4)
+            if grad_req == 'add':
+                net.collect_params().zero_grad()
+        return trainer, [p.data(ctx[1]).asnumpy() for p in net.collect_params().values()]
+
+    for grad_req in ['write', 'add']:
+        _, expected = train(grad_req)
+        for bucket_size in [0, 64]:
+            trainer, results = train(grad_req, overlap_comm=True, bucket_size=bucket_size)
+            assert not trainer._update_on_kvstore
+            for result, exp in zip(results, expected):
+                assert_almost_equal(result, exp, rtol=1e-5, atol=1e-6)
+
+
+@with_seed()
+def test_trainer_checkpoint():
+    import os
+    def get_updater(trainer):
+        return trainer._kvstore._updater if trainer._update_on_kvstore \
+               else trainer._updaters[0]
+    ctx = [mx.cpu(0), mx.cpu(1)]
+    net = nn.Dense(3, in_units=4, prefix='dense_')
+    net.initialize(ctx=ctx)
+    trainer = gluon.Trainer(net.collect_params(), 'adam', {'learning_rate': 0.1})
+    for _ in range(2):
+        with mx.autograd.record():
+            losses = [net(mx.nd.ones((2, 4), ctx=c)) for c in ctx]
+        mx.autograd.backward(losses)
+        trainer.step(4)
+
+    with TemporaryDirectory() as tmp:
+        params = net.collect_params()
+        expected = {k: v.data(ctx[0]).asnumpy() for k, v in params.items()}
+        future = params.save_checkpoint(os.path.join(tmp, 'params'), strip_prefix='dense_',
+                                        shard_size=16)
+        states_future = trainer.save_states(os.path.join(tmp, 'states'), background=True)
+        states = deepcopy(get_updater(trainer).states)
+        # training continues while the checkpoint is written
+        with mx.autograd.record():
+            losses = [net(mx.nd.ones((2, 4), ctx=c)) for c in ctx]
+        mx.autograd.backward(losses)
+        trainer.step(4)
+        future.wait()
+        states_future.wait()
+
+        net2 = nn.Dense(3, in_units=4, prefix='dense_')
+        net2.collect_params().load(os.path.join(tmp, 'params'), ctx, restore_prefix='dense_')
+        for k, v in net2.collect_params().items():
+            assert v.list_ctx() == ctx
+            assert_almost_equal(v.data(ctx[1]).asnumpy(), expected[k])
+
+        trainer2 = gluon.Trainer(net2.collect_params(), 'adam', {'learning_rate': 0.1})
+        trainer2.load_states(os.path.join(tmp, 'states'))
+        assert trainer2._optimizer.param_dict[0] is net2.collect_params()['dense_weight']
+        for i, state in states.items():
+            for a, b in zip(state, get_updater(trainer2).states[i]):
+                assert_almost_equal(a.asnumpy(), b.asnumpy())
+
+
 @with_seed()
 def test_block_attr_hidden():
     b = gluon.Block()
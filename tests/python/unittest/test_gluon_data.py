@@ -23,11 +23,12 @@ import numpy as np
 import random
 from mxnet import gluon
 import platform
-from common import setup_module, with_seed
+from common import setup_module, with_seed, assertRaises, TemporaryDirectory
 from mxnet.gluon.data import DataLoader
 import mxnet.ndarray as nd
 from mxnet import context
 from mxnet.gluon.data.dataset import Dataset
+from mxnet.test_utils import assert_almost_equal
 
 @with_seed()
 def test_array_dataset():
@@ -46,6 +47,36 @@ def test_array_dataset():
         assert mx.test_utils.almost_equal(x.asnumpy(), X[i*2:(i+1)*2])
 
 
+@with_seed()
+def test_cached_dataset():
+    X = np.random.uniform(size=(10, 3, 5)).astype(np.float32)
+    Y = np.arange(10).astype(np.int32)
+    calls = []
+    def fn(x, y):
+        calls.append(y)
+        return nd.array(x) * 2, y
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'cache')
+        dataset = gluon.data.ArrayDataset(X, Y).transform(fn).cache(path)
+        assert len(dataset) == 10 and len(calls) == 10
+        for i in range(10):
+            x, y = dataset[i]
+            assert isinstance(x, np.ndarray) and x.dtype == np.float32
+            assert_almost_equal(x, X[i] * 2)
+            assert y == i
+        loader = DataLoader(dataset.transform_first(lambda x: x + 1), 5, num_workers=2)
+        for i, (x, y) in enumerate(loader):
+            assert_almost_equal(x.asnumpy(), X[i*5:(i+1)*5] * 2 + 1)
+            assert (y.asnumpy() == Y[i*5:(i+1)*5]).all()
+
+        # an existing cache is reused
+        dataset = gluon.data.ArrayDataset(X, Y).transform(fn).cache(path)
+        assert len(calls) == 10
+        assert_almost_equal(dataset[3][0], X[3] * 2)
+        dataset = gluon.data.SimpleDataset([np.zeros(i + 1) for i in range(3)])
+        assertRaises(ValueError, dataset.cache, path, overwrite=True)
+
+
 def prepare_record():
     if not os.path.isdir("data/test_images"):
         os.makedirs('data/test_images')
@@ -72,6 +103,45 @@ def test_recordimage_dataset():
         assert x.shape[0] == 1 and x.shape[3] == 3
         assert y.asscalar() == i
 
+def prepare_seg_record():
+    prepare_record()
+    if not os.path.exists('data/test_seg.rec'):
+        imgs = sorted(os.listdir('data/test_images/test_images'))
+        record = mx.seg_recordio.MXIndexedSegRecordIO('data/test_seg.idx', 'data/test_seg.rec', 'w')
+        for i, img in enumerate(imgs):
+            str_img = open('data/test_images/test_images/'+img, 'rb').read()
+            header = mx.seg_recordio.ISegRHeader(0, 0, len(str_img), len(str_img), i, 0)
+            record.write_idx(i, mx.seg_recordio.pack(header, str_img, str_img))
+        record.close()
+    return 'data/test_seg.rec'
+
+
+@with_seed()
+def test_recordimage_seg_dataset():
+    recfile = prepare_seg_record()
+    imgs = sorted(os.listdir('data/test_images/test_images'))
+    dataset = gluon.data.vision.ImageSegRecordDataset(recfile)
+    assert len(dataset) == len(imgs)
+    for i, (x, y) in enumerate(dataset):
+        str_img = open('data/test_images/test_images/'+imgs[i], 'rb').read()
+        assert_almost_equal(x.asnumpy(), mx.image.imdecode(str_img).asnumpy())
+        assert_almost_equal(y.asnumpy(), mx.image.imdecode(str_img, 0).asnumpy()[:, :, 0])
+
+    loader = gluon.data.DataLoader(dataset.transform(lambda x, y: (x[:32, :32], y[:32, :32])), 2)
+    for x, y in loader:
+        assert x.shape[1:] == (32, 32, 3) and y.shape[1:] == (32, 32)
+
+    # labels with an unknown codec are rejected instead of decoded as images
+    str_img = open('data/test_images/test_images/'+imgs[0], 'rb').read()
+    with TemporaryDirectory() as tmpdir:
+        record = mx.seg_recordio.MXIndexedSegRecordIO(os.path.join(tmpdir, 'bad.idx'),
+                                                      os.path.join(tmpdir, 'bad.rec'), 'w')
+        header = mx.seg_recordio.ISegRHeader(2 << 24, 0, len(str_img), len(str_img), 0, 0)
+        record.write_idx(0, mx.seg_recordio.pack(header, str_img, str_img))
+        record.close()
+        dataset = gluon.data.vision.ImageSegRecordDataset(os.path.join(tmpdir, 'bad.rec'))
+        assertRaises(ValueError, dataset.__getitem__, 0)
+
 @with_seed()
 def test_sampler():
     seq_sampler = gluon.data.SequentialSampler(10)
@@ -85,6 +155,51 @@ def test_sampler():
     rand_batch_keep = gluon.data.BatchSampler(rand_sampler, 3, 'keep')
     assert sorted(sum(list(rand_batch_keep), [])) == list(range(10))
 
+@with_seed()
+def test_sharded_sampler():
+    for length, num_parts, pad in [(10, 3, True), (10, 3, False), (12, 4, True), (2, 5, True)]:
+        samplers = [gluon.data.ShardedSampler(length, num_parts, i, seed=7, pad=pad)
+                    for i in range(num_parts)]
+        for _ in range(2):
+            shards = [list(sampler) for sampler in samplers]
+            assert all(len(shard) == len(samplers[0]) for shard in shards)
+            merged = sum(shards, [])
+            if pad:
+                assert set(merged) == set(range(length))
+            else:
+                assert len(set(merged)) == len(merged) == length // num_parts * num_parts
+    sampler = gluon.data.ShardedSampler(10, 2, 0)
+    first = list(sampler)
+    assert list(sampler) != first
+    sampler.set_epoch(0)
+    assert list(sampler) == first
+
+@with_seed()
+def test_bucket_batch_sampler():
+    lengths = [random.randint(1, 50) for _ in range(200)]
+    sampler = gluon.data.BucketBatchSampler(lengths, 8, window=5)
+    num_batches = len(sampler)
+    batches = list(sampler)
+    assert len(batches) == num_batches
+    assert sorted(sum(batches, [])) == list(range(200))
+    assert all(len(b) <= 8 for b in batches)
+    padded = sum(len(b) * max(lengths[i] for i in b) for b in batches)
+    unsorted = sum(len(b) * max(lengths[i] for i in b)
+                   for b in gluon.data.BatchSampler(gluon.data.SequentialSampler(200), 8))
+    assert padded < unsorted
+
+    sizes = [(random.randint(1, 20), random.randint(1, 20)) for _ in range(100)]
+    sampler = gluon.data.BucketBatchSampler(sizes, None, max_cost=400)
+    for b in sampler:
+        cost = len(b) * max(sizes[i][0] for i in b) * max(sizes[i][1] for i in b)
+        assert cost <= 400 or len(b) == 1
+
+    data = [(np.ones((n, 2)), np.arange(n)) for n in [3, 1, 2]]
+    x, y = gluon.data.dataloader.pad_batchify_fn(data, pad_val=(0, -1))
+    assert x.shape == (3, 3, 2) and y.shape == (3, 3)
+    assert (x.asnumpy().sum(axis=(1, 2)) == [6, 2, 4]).all()
+    assert (y.asnumpy()[1] == [0, -1, -1]).all()
+
 @with_seed()
 def test_datasets():
     assert len(gluon.data.vision.MNIST(root='data/mnist')) == 60000
@@ -104,6 +219,45 @@ def test_image_folder_dataset():
     assert dataset.synsets == ['test_images']
     assert len(dataset.items) == 16
 
+def test_image_folder_dataset_index():
+    import warnings
+    with TemporaryDirectory() as tmpdir:
+        root = os.path.join(tmpdir, 'images')
+        files = {'bus': ['023.jpg', '123.png'], 'car': ['0001.jpg', 'a.JPEG', 'notes.txt']}
+        for folder, names in files.items():
+            os.makedirs(os.path.join(root, folder))
+            for name in names:
+                open(os.path.join(root, folder, name), 'w').close()
+        expected = [(os.path.join(root, 'bus', '023.jpg'), 0),
+                    (os.path.join(root, 'bus', '123.png'), 0),
+                    (os.path.join(root, 'car', '0001.jpg'), 1),
+                    (os.path.join(root, 'car', 'a.JPEG'), 1)]
+        car = os.path.join(root, 'car')
+        os.utime(car, (1000, 1000))
+        index_file = os.path.join(tmpdir, 'index.npz')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            dataset = gluon.data.vision.ImageFolderDataset(root, num_threads=2,
+                                                           index_file=index_file)
+        assert dataset.synsets == ['bus', 'car']
+        assert len(dataset) == len(expected)
+        assert dataset.items == expected and dataset.items[:2] == expected[:2]
+        assert os.path.isfile(index_file)
+        # items is a plain list, changes to it are seen by the dataset
+        dataset.items = dataset.items[1:]
+        assert len(dataset) == len(expected) - 1
+
+        # the saved index is used while the folder modification times are unchanged
+        open(os.path.join(car, 'b.jpg'), 'w').close()
+        os.utime(car, (1000, 1000))
+        dataset = gluon.data.vision.ImageFolderDataset(root, index_file=index_file)
+        assert dataset.items == expected
+        os.utime(car, (2000, 2000))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            dataset = gluon.data.vision.ImageFolderDataset(root, index_file=index_file)
+        assert dataset.items == expected + [(os.path.join(car, 'b.jpg'), 1)]
+
 
 class Dataset(gluon.data.Dataset):
     def __len__(self):
@@ -194,6 +348,77 @@ def test_multi_worker_forked_data_loader():
                     print(data)
                     print('{}:{}'.format(epoch, i))
 
+@with_seed()
+def test_persistent_workers():
+    # This test is pointless on Windows because Windows doesn't fork
+    if platform.system() == 'Windows':
+        return
+    data = gluon.data.ArrayDataset(mx.nd.arange(23).reshape((23, 1)), np.arange(23))
+    batch_sampler = gluon.data.BatchSampler(gluon.data.SequentialSampler(23), 4, 'keep')
+    loader = gluon.data.DataLoader(data, batch_sampler=batch_sampler, num_workers=2,
+                                   persistent_workers=True)
+    pool = None
+    for epoch in range(3):
+        for i, (x, y) in enumerate(loader):
+            assert x.context == mx.Context('cpu_shared', 0)
+            assert (x.asnumpy()[:, 0] == y.asnumpy()).all()
+            assert (y.asnumpy() == np.arange(4 * i, min(4 * i + 4, 23))).all()
+            if epoch == 1 and i == 2:
+                break
+        assert pool is None or loader._worker_pool is pool
+        pool = loader._worker_pool
+        # the 6 batches of an epoch fill the 2 * num_workers + 2 slots, which are
+        # reused with the same arrays as long as the batch shapes do not change
+        if epoch == 0:
+            assert len(pool._slots) == 6
+            slots, versions = list(pool._slots), list(pool._versions)
+        else:
+            assert all(a is b for a, b in zip(pool._slots, slots))
+            assert pool._versions == versions
+
+    # batches of another shape get new slot arrays
+    batch_sampler._batch_size = 3
+    for i, (x, y) in enumerate(loader):
+        assert (y.asnumpy() == np.arange(3 * i, min(3 * i + 3, 23))).all()
+    assert all(new > old for new, old in zip(pool._versions[:5], versions[:5]))
+    # the last slot held the short batch of 3 already
+    assert pool._versions[5] == versions[5]
+
+    loader = gluon.data.DataLoader(data, batch_size=5, num_workers=2, persistent_workers=True,
+                                   batchify_fn=lambda samples: mx.nd.array([s[1] for s in samples]))
+    for _ in range(2):
+        assert [b.asnumpy().tolist() for b in loader] == \
+            [list(range(i, min(i + 5, 23))) for i in range(0, 23, 5)]
+
+@with_seed()
+def test_thread_pool_data_loader():
+    data = gluon.data.ArrayDataset(mx.nd.arange(23).reshape((23, 1)), np.arange(23))
+    data = data.transform_first(lambda x: x * 2)
+    loader = gluon.data.DataLoader(data, batch_size=4, num_workers=3, thread_pool=True)
+    for _ in range(2):
+        for i, (x, y) in enumerate(loader):
+            assert x.context == mx.cpu()
+            assert (x.asnumpy()[:, 0] == 2 * y.asnumpy()).all()
+            assert (y.asnumpy() == np.arange(4 * i, min(4 * i + 4, 23))).all()
+        assert i == 5
+
+@with_seed()
+def test_data_loader_ctx_prefetch():
+    data = gluon.data.ArrayDataset(mx.nd.arange(10).reshape((10, 1)), np.arange(10))
+    loader = gluon.data.DataLoader(data, batch_size=4, ctx=mx.cpu(1), ctx_prefetch=1)
+    batches = list(loader)
+    assert len(batches) == 3
+    for i, (x, y) in enumerate(batches):
+        assert x.context == mx.cpu(1) and y.context == mx.cpu(1)
+        assert (y.asnumpy() == np.arange(4 * i, min(4 * i + 4, 10))).all()
+
+    ctx = [mx.cpu(1), mx.cpu(2)]
+    loader = gluon.data.DataLoader(data, batch_size=4, ctx=ctx, num_workers=2, thread_pool=True)
+    for i, (x, y) in enumerate(loader):
+        assert [a.context for a in x] == ctx and [a.context for a in y] == ctx
+        assert (np.concatenate([a.asnumpy() for a in y]) ==
+                np.arange(4 * i, min(4 * i + 4, 10))).all()
+
 if __name__ == '__main__':
     import nose
     nose.runmodule()
@@ -83,6 +83,82 @@ def test_transformer():
 
 
 
+@with_seed()
+def test_batch_transforms():
+    data = np.random.uniform(0, 1, (8, 3, 10, 12)).astype(np.float32)
+    for layout in ['NCHW', 'NHWC']:
+        x = nd.array(data if layout == 'NCHW' else data.transpose((0, 2, 3, 1)))
+        flipped = transforms.RandomFlipLeftRightBatch(layout=layout)(x).asnumpy()
+        w = layout.find('W')
+        for i in range(8):
+            assert (flipped[i] == x.asnumpy()[i]).all() or \
+                (flipped[i] == np.flip(x.asnumpy()[i], w - 1)).all()
+        for hybridize in [False, True]:
+            transform = transforms.Compose([
+                transforms.RandomColorJitterBatch(0.2, 0.2, 0.2, layout=layout),
+                transforms.RandomLightingBatch(0.1 / 255, layout=layout)])
+            if hybridize:
+                transform.hybridize()
+            assert transform(x).shape == x.shape
+        # brightness factors are independent per image, and 1 when not applied
+        ratio = (transforms.RandomBrightnessBatch(0.5, layout=layout)(x) / x).asnumpy()
+        ratio = ratio.reshape((8, -1))
+        assert_almost_equal(ratio.min(axis=1), ratio.max(axis=1), rtol=1e-4)
+        assert len(np.unique(ratio[:, 0].round(4))) > 1
+        ratio = (transforms.RandomContrastBatch(0.5, p=0, layout=layout)(x) / x).asnumpy()
+        assert_almost_equal(ratio, np.ones_like(ratio), rtol=1e-4)
+
+
+@with_seed()
+def test_pair_transforms():
+    img = nd.array(np.random.randint(0, 255, (20, 30, 3)), dtype=np.uint8)
+    # the mask encodes the position, so that its transform can be checked
+    mask = nd.array(np.arange(600).reshape((20, 30)) % 200, dtype=np.int32)
+
+    out_img, out_mask = transforms.FlipPair(p=1)(img, mask)
+    assert (out_img.asnumpy() == img.asnumpy()[:, ::-1]).all()
+    assert (out_mask.asnumpy() == mask.asnumpy()[:, ::-1]).all()
+
+    out_img, out_mask = transforms.RandomCropPair((16, 24), ignore_label=255)(img, mask)
+    assert out_img.shape == (24, 16, 3) and out_mask.shape == (24, 16)
+    assert (out_mask.asnumpy()[20:] == 255).all()
+    valid = out_mask.asnumpy()[:20]
+    assert set(np.unique(valid)) <= set(np.unique(mask.asnumpy()))
+
+    out_img, out_mask = transforms.RandomScalePair(0.5, 0.5)(img, mask.astype(np.uint8))
+    assert out_img.shape == (10, 15, 3) and out_mask.shape == (10, 15)
+    assert set(np.unique(out_mask.asnumpy())) <= set(np.unique(mask.asnumpy() % 256))
+
+    # an identity warp samples every pixel exactly
+    out_img, out_mask = transforms.RandomAffinePair(None, flip=False)(img, mask)
+    assert (out_img.asnumpy() == img.asnumpy()).all()
+    assert (out_mask.asnumpy() == mask.asnumpy()).all()
+    out_img, out_mask = transforms.RandomAffinePair((40, 20), flip=False, fill_value=7,
+                                                    ignore_label=255)(img, mask)
+    assert (out_img.asnumpy()[:, :5] == 7).all() and (out_mask.asnumpy()[:, :5] == 255).all()
+    assert (out_mask.asnumpy()[:, 5:35] == mask.asnumpy()).all()
+
+    transform = transforms.ComposePair([
+        transforms.RandomRotatePair(30, ignore_label=255),
+        transforms.RandomAffinePair((16, 16), scale=(0.5, 1.5), max_angle=10)])
+    out_img, out_mask = transform(img, mask)
+    assert out_img.shape == (16, 16, 3) and out_img.dtype == np.uint8
+    assert out_mask.shape == (16, 16) and out_mask.dtype == np.int32
+    # nearest neighbour lookups never create new labels
+    assert set(np.unique(out_mask.asnumpy())) <= set(np.unique(mask.asnumpy())) | {255}
+
+    # the random geometry follows the mxnet seed
+    transform = transforms.ComposePair([
+        transforms.RandomScalePair(0.5, 1.5), transforms.FlipPair(),
+        transforms.RandomCropPair((8, 8)), transforms.RandomAffinePair((6, 6), scale=(0.5, 1.5),
+                                                                       max_angle=30)])
+    outputs = []
+    for seed in [1, 2, 1]:
+        mx.random.seed(seed)
+        outputs.append(np.concatenate([transform(img, mask)[1].asnumpy() for _ in range(4)]))
+    assert (outputs[0] == outputs[2]).all() and not (outputs[0] == outputs[1]).all()
+
+
 if __name__ == '__main__':
     import nose
     nose.runmodule()
@@ -93,6 +93,24 @@ class TestImage(unittest.TestCase):
             cv_image = cv2.imread(img)
             assert_almost_equal(image.asnumpy(), cv_image)
 
+    def test_imdecode_reduced(self):
+        try:
+            import cv2
+        except ImportError:
+            return
+        src = np.random.randint(0, 255, size=(301, 402, 3)).astype(np.uint8)
+        str_image = cv2.imencode('.jpg', src)[1].tobytes()
+        assert mx.image.imdecode(str_image, reduce=2).shape == (151, 201, 3)
+        assert mx.image.imdecode(str_image, flag=0, reduce=8).shape == (38, 51, 1)
+        # the smallest scale whose shorter edge is still at least min_size
+        assert mx.image.imdecode(str_image, min_size=76).shape == (76, 101, 3)
+        assert mx.image.imdecode(str_image, min_size=77).shape == (151, 201, 3)
+        assert mx.image.imdecode(str_image, min_size=400).shape == (301, 402, 3)
+        reduced = mx.image.imdecode(str_image, reduce=4)
+        assert_almost_equal(reduced.asnumpy()[:, :, (2, 1, 0)],
+                            cv2.imdecode(np.frombuffer(str_image, np.uint8),
+                                         cv2.IMREAD_REDUCED_COLOR_4))
+
     def test_scale_down(self):
         assert mx.image.scale_down((640, 480), (720, 120)) == (640, 106)
         assert mx.image.scale_down((360, 1000), (480, 500)) == (360, 375)
@@ -28,7 +28,7 @@ try:
 except ImportError:
     h5py = None
 import sys
-from common import assertRaises
+from common import assertRaises, TemporaryDirectory
 import unittest
 
 def test_MNISTIter():
@@ -308,6 +308,279 @@ def test_CSVIter():
 
     check_CSVIter_synthetic()
 
+def test_ImageRecordIter_state():
+    try:
+        import cv2
+    except ImportError:
+        return
+    with TemporaryDirectory() as tmpdir:
+        fidx = os.path.join(tmpdir, 'data.idx')
+        frec = os.path.join(tmpdir, 'data.rec')
+        N = 22
+        writer = mx.recordio.MXIndexedRecordIO(fidx, frec, 'w')
+        for i in range(N):
+            img = np.full((8, 8, 3), i, dtype=np.uint8)
+            writer.write_idx(i, mx.recordio.pack_img(mx.recordio.IRHeader(0, i, i, 0), img,
+                                                     img_fmt='.png'))
+        writer.close()
+
+        def make_iter():
+            return mx.io.ImageRecordIter(path_imgrec=frec, path_imgidx=fidx, data_shape=(3, 8, 8),
+                                         batch_size=4, shuffle=True, seed=3, rand_mirror=True,
+                                         round_batch=True, stateful=True)
+
+        def labels(data_iter, num_batches):
+            return [data_iter.next().label[0].asnumpy().tolist() for _ in range(num_batches)]
+
+        data_iter = make_iter()
+        assert data_iter.get_state() == make_iter().get_state()
+        # reading the state of a new iterator does not move it
+        assert labels(data_iter, 6) == labels(make_iter(), 6)
+        data_iter.reset()
+        labels(data_iter, 2)
+        state = data_iter.get_state()
+        expected = labels(data_iter, 3)
+        data_iter.reset()
+        expected += labels(data_iter, 4)
+
+        resumed = make_iter()
+        resumed.set_state(state)
+        assert resumed.get_state() == state
+        actual = labels(resumed, 3)
+        resumed.reset()
+        actual += labels(resumed, 4)
+        assert actual == expected
+
+def _make_seg_rec(path, shapes, label_fmt='.png', block=8):
+    """Writes segmentation records of random blocks with the given (height, width)
+    to the directory `path`, a block of gray level 16 * k + 8 has label k so that
+    image and label pixels can be matched."""
+    frec = os.path.join(path, 'data.rec')
+    fidx = os.path.join(path, 'data.idx')
+    writer = mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec)
+    for i, (height, width) in enumerate(shapes):
+        blocks = np.random.randint(0, 16, size=(height // block, width // block))
+        label = np.kron(blocks, np.ones((block, block))).astype(np.uint8)
+        img = np.repeat((label * 16 + 8)[:, :, np.newaxis], 3, axis=2)
+        header = mx.seg_recordio.ISegRHeader(0, 0, 0, 0, i, 0)
+        writer.write_idx(i, mx.seg_recordio.pack_img(header, img, label, img_fmt='.jpg',
+                                                     label_fmt=label_fmt))
+    writer.close()
+    return frec, fidx
+
+def _seg_batches(data_iter, num_batches):
+    batches = []
+    for _ in range(num_batches):
+        batch = data_iter.next()
+        batches.append((batch.data[0].asnumpy(), batch.label[0].asnumpy()))
+    return batches
+
+def test_ImageSegRecordIter_state():
+    try:
+        import cv2
+    except ImportError:
+        return
+    N = 22
+    with TemporaryDirectory() as tmpdir:
+        frec, fidx = _make_seg_rec(tmpdir, [(32, 32)] * N)
+        fweights = os.path.join(tmpdir, 'weights.txt')
+        mx.seg_recordio.save_sample_weights(fweights, list(range(N)), np.arange(N) + 1.0)
+
+        for kwargs in [{'shuffle': False, 'stateful': True}, {'shuffle': True, 'stateful': True},
+                       {'sample_weights': fweights}]:
+            def make_iter():
+                return mx.io.ImageSegRecordIter(path_imgrec=frec, path_imgidx=fidx,
+                                                data_shape=(3, 16, 16), batch_size=4, seed=3,
+                                                min_random_scale=0.5, preprocess_threads=1,
+                                                round_batch=True, **kwargs)
+            data_iter = make_iter()
+            data_iter.get_state()
+            first = _seg_batches(data_iter, 6)
+            for (data, label), (exp_data, exp_label) in zip(first, _seg_batches(make_iter(), 6)):
+                assert_almost_equal(data, exp_data)
+                assert_almost_equal(label, exp_label)
+            data_iter.reset()
+            _seg_batches(data_iter, 2)
+            state = data_iter.get_state()
+            expected = _seg_batches(data_iter, 3)
+            data_iter.reset()
+            expected += _seg_batches(data_iter, 4)
+
+            resumed = make_iter()
+            resumed.set_state(state)
+            assert resumed.get_state() == state
+            actual = _seg_batches(resumed, 3)
+            resumed.reset()
+            actual += _seg_batches(resumed, 4)
+            for (data, label), (exp_data, exp_label) in zip(actual, expected):
+                assert_almost_equal(data, exp_data)
+                assert_almost_equal(label, exp_label)
+
+def test_ImageSegRecordIter_sample_weights():
+    try:
+        import cv2
+    except ImportError:
+        return
+    N = 8
+    with TemporaryDirectory() as tmpdir:
+        frec = os.path.join(tmpdir, 'data.rec')
+        fidx = os.path.join(tmpdir, 'data.idx')
+        fweights = os.path.join(tmpdir, 'weights.txt')
+        # record i is a uniform image with label i
+        writer = mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec)
+        for i in range(N):
+            label = np.full((16, 16), i, dtype=np.uint8)
+            img = np.full((16, 16, 3), i * 16 + 8, dtype=np.uint8)
+            header = mx.seg_recordio.ISegRHeader(0, 0, 0, 0, i, 0)
+            writer.write_idx(i, mx.seg_recordio.pack_img(header, img, label, img_fmt='.png'))
+        writer.close()
+
+        def epoch_keys(data_iter):
+            keys = []
+            for batch in data_iter:
+                keys += [int(np.median(label)) for label in batch.label[0].asnumpy()]
+            return keys
+
+        mx.seg_recordio.save_sample_weights(fweights, list(range(N)), [0, 0, 1, 0, 3, 0, 0, 0])
+        data_iter = mx.io.ImageSegRecordIter(path_imgrec=frec, path_imgidx=fidx,
+                                             sample_weights=fweights, num_samples=40,
+                                             data_shape=(3, 16, 16), batch_size=4, seed=5)
+        keys = epoch_keys(data_iter)
+        assert len(keys) == 40
+        assert set(keys) == {2, 4} and keys.count(4) > keys.count(2)
+
+        # the weight file is read again at the beginning of the next epoch
+        mx.seg_recordio.save_sample_weights(fweights, list(range(N)), [0] * (N - 1) + [1])
+        data_iter.reset()
+        assert epoch_keys(data_iter) == [N - 1] * 40
+
+def _check_seg_aligned(data, label):
+    """Checks that labels match the image blocks written by _make_seg_rec."""
+    mask = label != 255
+    assert mask.any()
+    estimated = np.round((data[:, 0] - 8) / 16.)
+    assert (estimated[mask] == label[mask]).mean() > 0.9
+
+def test_ImageSegRecordIter_crop_before_decode():
+    try:
+        import cv2
+    except ImportError:
+        return
+    for label_fmt in ['.png', '.rle']:
+        with TemporaryDirectory() as tmpdir:
+            frec, fidx = _make_seg_rec(tmpdir, [(128, 192)] * 8, label_fmt=label_fmt, block=32)
+            for resize in [-1, 96]:
+                for crop_before_decode in [False, True]:
+                    data_iter = mx.io.ImageSegRecordIter(
+                        path_imgrec=frec, path_imgidx=fidx, data_shape=(3, 24, 24),
+                        batch_size=4, min_random_scale=0.5, resize=resize, inter_method=0,
+                        crop_before_decode=crop_before_decode, preprocess_threads=1)
+                    num_batches = 0
+                    for batch in data_iter:
+                        data = batch.data[0].asnumpy()
+                        label = batch.label[0].asnumpy()
+                        assert data.shape == (4, 3, 24, 24)
+                        assert label.shape == (4, 24, 24)
+                        _check_seg_aligned(data, label)
+                        num_batches += 1
+                    assert num_batches == 2
+
+def test_ImageSegRecordIter_decode_cache():
+    try:
+        import cv2
+    except ImportError:
+        return
+    # about 100KB per decoded sample, so that 1MB holds half of them
+    with TemporaryDirectory() as tmpdir:
+        frec, fidx = _make_seg_rec(tmpdir, [(128, 192)] * 20, block=32)
+
+        def epochs(**kwargs):
+            data_iter = mx.io.ImageSegRecordIter(path_imgrec=frec, path_imgidx=fidx,
+                                                 data_shape=(3, 24, 24), batch_size=4, seed=5,
+                                                 min_random_scale=0.5, preprocess_threads=1,
+                                                 **kwargs)
+            batches = []
+            for _ in range(3):
+                batches += _seg_batches(data_iter, 5)
+                data_iter.reset()
+            return batches
+
+        expected = epochs()
+        spill = os.path.join(tmpdir, 'spill')
+        for kwargs in [{'decode_cache_size': 64},
+                       {'decode_cache_size': 1},
+                       {'decode_cache_size': 1, 'decode_cache_spill_path': spill,
+                        'decode_cache_spill_size': 1}]:
+            for (data, label), (exp_data, exp_label) in zip(epochs(**kwargs), expected):
+                assert_almost_equal(data, exp_data)
+                assert_almost_equal(label, exp_label)
+        # the spill file is removed with the iterator
+        assert not os.path.exists(spill)
+
+def test_ImageSegRecordIter_stats():
+    try:
+        import cv2
+    except ImportError:
+        return
+    with TemporaryDirectory() as tmpdir:
+        frec, fidx = _make_seg_rec(tmpdir, [(32, 32)] * 12)
+        data_iter = mx.io.ImageSegRecordIter(path_imgrec=frec, path_imgidx=fidx,
+                                             data_shape=(3, 16, 16), batch_size=4,
+                                             preprocess_threads=1)
+        for _ in range(3):
+            data_iter.next()
+        stats = data_iter.get_stats(reset=True)
+        for key in ['thread0_records', 'elapsed_sec', 'batches', 'records', 'bytes_read',
+                    'records_per_sec', 'bytes_per_sec', 'read_ms', 'image_decode_ms',
+                    'label_decode_ms', 'augment_ms', 'normalize_ms', 'assemble_ms',
+                    'image_decode_ms_le_0.25', 'image_decode_ms_le_inf', 'queue_occupancy',
+                    'queue_occupancy_mean', 'queue_capacity', 'consumer_wait_ms']:
+            assert key in stats, key
+        assert stats['records'] >= 12 and stats['batches'] >= 3
+        assert stats['thread0_records'] == stats['records']
+        assert stats['bytes_read'] > 0 and stats['image_decode_ms'] > 0
+        assert sum(v for k, v in stats.items() if k.startswith('image_decode_ms_le_')) \
+            == stats['records']
+        # the prefetch thread is done with the epoch, so nothing is counted after the reset
+        stats = data_iter.get_stats()
+        assert stats['records'] == 0 and stats['batches'] == 0 and stats['bytes_read'] == 0
+        assert stats['image_decode_ms'] == 0 and stats['consumer_wait_ms'] == 0
+
+def test_ImageSegRecordIter_bucket_shapes():
+    try:
+        import cv2
+    except ImportError:
+        return
+    wide, tall = (32, 64), (64, 32)
+    with TemporaryDirectory() as tmpdir:
+        frec, fidx = _make_seg_rec(tmpdir, [wide, tall, wide, wide, tall, wide, tall, wide])
+        data_iter = mx.io.ImageSegRecordIter(path_imgrec=frec, path_imgidx=fidx,
+                                             data_shape=(3, 64, 64), batch_size=2,
+                                             bucket_shapes=wide + tall, inter_method=0,
+                                             preprocess_threads=1)
+        assert data_iter.default_bucket_key == (64, 64)
+        assert data_iter.provide_data[0].shape == (2, 3, 64, 64)
+        assert data_iter.provide_label[0].shape == (2, 64, 64)
+        for _ in range(2):
+            samples = {wide: 0, tall: 0}
+            pads = {wide: 0, tall: 0}
+            for batch in data_iter:
+                key = batch.bucket_key
+                data = batch.data[0].asnumpy()
+                label = batch.label[0].asnumpy()
+                assert data.shape == (2, 3) + key and label.shape == (2,) + key
+                assert batch.provide_data[0].shape == data.shape
+                assert batch.provide_label[0].shape == label.shape
+                num = 2 - batch.pad
+                _check_seg_aligned(data[:num], label[:num])
+                # leftover samples of a bucket are padded with ignored labels
+                assert (label[num:] == 255).all() and (data[num:] == 0).all()
+                samples[key] += num
+                pads[key] += batch.pad
+            assert samples == {wide: 5, tall: 3}
+            assert pads == {wide: 1, tall: 1}
+            data_iter.reset()
+
 if __name__ == "__main__":
     test_NDArrayIter()
     if h5py:
@@ -317,3 +590,10 @@ if __name__ == "__main__":
     test_LibSVMIter()
     test_NDArrayIter_csr()
     test_CSVIter()
+    test_ImageRecordIter_state()
+    test_ImageSegRecordIter_state()
+    test_ImageSegRecordIter_sample_weights()
+    test_ImageSegRecordIter_crop_before_decode()
+    test_ImageSegRecordIter_decode_cache()
+    test_ImageSegRecordIter_stats()
+    test_ImageSegRecordIter_bucket_shapes()
@@ -15,13 +15,14 @@
 # specific language governing permissions and limitations
 # under the License.
 
+import os
 import mxnet as mx
 import mxnet.ndarray as nd
 from mxnet.test_utils import *
 import numpy as np
 from functools import reduce
 from mxnet.module.executor_group import DataParallelExecutorGroup
-from common import setup_module, with_seed, assertRaises
+from common import setup_module, with_seed, assertRaises, TemporaryDirectory
 from collections import namedtuple
 
 
@@ -257,6 +258,110 @@ def test_module_states():
         assert not mx.test_utils.almost_equal(x1.asnumpy(), x2.asnumpy(), rtol=1e-3)
 
 
+@with_seed()
+def test_module_grad_bucketing():
+    data = mx.sym.Variable('data')
+    net = mx.sym.FullyConnected(data, num_hidden=4, name='fc1')
+    net = mx.sym.FullyConnected(net, num_hidden=3, name='fc2')
+    net = mx.sym.LinearRegressionOutput(net, name='out')
+
+    def train(bucket_size):
+        os.environ['MXNET_KVSTORE_BUCKET_SIZE'] = str(bucket_size)
+        try:
+            mod = mx.mod.Module(net, label_names=['out_label'],
+                                context=[mx.cpu(0), mx.cpu(1)])
+            mod.bind(data_shapes=[('data', (4, 5))], label_shapes=[('out_label', (4, 3))])
+            mod.init_params(mx.init.One())
+            mod.init_optimizer(kvstore='local', optimizer='sgd',
+                               optimizer_params={'learning_rate': 0.01, 'momentum': 0.9})
+        finally:
+            del os.environ['MXNET_KVSTORE_BUCKET_SIZE']
+        for i in range(3):
+            batch = mx.io.DataBatch(data=[mx.nd.arange(20).reshape((4, 5)) * 0.1 * i],
+                                    label=[mx.nd.ones((4, 3))])
+            mod.forward_backward(batch)
+            mod.update()
+        return mod, mod.get_params()[0]
+
+    _, expected = train(0)
+    mod, results = train(1 << 20)
+    assert not mod._update_on_kvstore
+    assert len(mod._grad_buckets.buckets) == 1
+    for name in expected:
+        assert_almost_equal(results[name].asnumpy(), expected[name].asnumpy(),
+                            rtol=1e-5, atol=1e-6)
+
+    # a BucketingModule bucket with other parameters does not use the shared buckets
+    def sym_gen(key):
+        if key == 'full':
+            return net, ('data',), ('out_label',)
+        short = mx.sym.FullyConnected(mx.sym.Variable('data'), num_hidden=3, name='fc2')
+        return mx.sym.LinearRegressionOutput(short, name='out'), ('data',), ('out_label',)
+
+    def train_bucketing(bucket_size):
+        os.environ['MXNET_KVSTORE_BUCKET_SIZE'] = str(bucket_size)
+        try:
+            mod = mx.mod.BucketingModule(sym_gen, default_bucket_key='full',
+                                         context=[mx.cpu(0), mx.cpu(1)])
+            mod.bind(data_shapes=[('data', (4, 5))], label_shapes=[('out_label', (4, 3))])
+            mod.init_params(mx.init.One())
+            mod.init_optimizer(kvstore='local', optimizer='sgd',
+                               optimizer_params={'learning_rate': 0.01, 'momentum': 0.9})
+        finally:
+            del os.environ['MXNET_KVSTORE_BUCKET_SIZE']
+        for i in range(4):
+            key, width = ('full', 5) if i % 2 == 0 else ('short', 4)
+            batch = mx.io.DataBatch(data=[mx.nd.arange(4 * width).reshape((4, width)) * 0.1],
+                                    label=[mx.nd.ones((4, 3)) * i], bucket_key=key,
+                                    provide_data=[mx.io.DataDesc('data', (4, width))],
+                                    provide_label=[mx.io.DataDesc('out_label', (4, 3))])
+            mod.forward_backward(batch)
+            mod.update()
+        return mod, mod.get_params()[0]
+
+    _, expected = train_bucketing(0)
+    mod, results = train_bucketing(1 << 20)
+    assert mod._buckets['full']._grad_buckets is not None
+    assert mod._buckets['short']._grad_buckets is None
+    for name in expected:
+        assert_almost_equal(results[name].asnumpy(), expected[name].asnumpy(),
+                            rtol=1e-5, atol=1e-6)
+
+
+@with_seed()
+def test_module_checkpoint_background():
+    data = mx.sym.Variable('data')
+    net = mx.sym.FullyConnected(data, num_hidden=4, name='fc1')
+    net = mx.sym.BatchNorm(net, name='bn')
+    net = mx.sym.LinearRegressionOutput(net, name='out')
+    mod = mx.mod.Module(net, label_names=['out_label'], context=[mx.cpu(0), mx.cpu(1)])
+    mod.bind(data_shapes=[('data', (4, 5))], label_shapes=[('out_label', (4, 4))])
+    mod.init_params()
+    mod.init_optimizer(optimizer='sgd', optimizer_params={'momentum': 0.9})
+    batch = mx.io.DataBatch(data=[mx.nd.ones((4, 5))], label=[mx.nd.ones((4, 4))])
+    mod.forward_backward(batch)
+    mod.update()
+
+    with TemporaryDirectory() as tmpdir:
+        prefix = os.path.join(tmpdir, 'model')
+        future = mod.save_checkpoint(prefix, 1, save_optimizer_states=True, background=True)
+        arg_params, aux_params = mod.get_params()
+        mod.forward_backward(batch)
+        mod.update()
+        future.wait()
+        assert mx.checkpoint.is_checkpoint('%s-0001.params' % prefix)
+
+        mod2 = mx.mod.Module.load(prefix, 1, load_optimizer_states=True,
+                                  label_names=['out_label'], context=[mx.cpu(0), mx.cpu(1)])
+        mod2.bind(data_shapes=[('data', (4, 5))], label_shapes=[('out_label', (4, 4))])
+        mod2.init_optimizer(optimizer='sgd', optimizer_params={'momentum': 0.9})
+        arg_params2, aux_params2 = mod2.get_params()
+        for expected, loaded in [(arg_params, arg_params2), (aux_params, aux_params2)]:
+            assert set(expected) == set(loaded)
+            for name in expected:
+                assert_almost_equal(expected[name].asnumpy(), loaded[name].asnumpy())
+
+
 @with_seed()
 def test_module_switch_bucket():
     vocab_dim = 5000
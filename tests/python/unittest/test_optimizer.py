@@ -1031,6 +1031,48 @@ def test_adagrad():
                                               w_stype='row_sparse', g_stype='row_sparse')
 
 
+@with_seed()
+def test_multi_tensor_update():
+    shapes = [(3, 4), (5,), (2, 3, 2), (1,)]
+    configs = [('sgd', {'momentum': 0.9, 'wd': 1e-3}, np.float32),
+               ('sgd', {'clip_gradient': 0.5}, np.float32),
+               ('sgd', {'momentum': 0.9, 'multi_precision': True}, np.float16),
+               ('sgd', {'multi_precision': True}, np.float16),
+               ('nag', {'momentum': 0.9, 'wd': 1e-3, 'clip_gradient': 0.5}, np.float32),
+               ('nag', {}, np.float32),
+               ('adam', {'wd': 1e-3, 'clip_gradient': 0.5}, np.float32)]
+    for name, kwargs, dtype in configs:
+        opt1 = mx.optimizer.create(name, rescale_grad=0.5, **kwargs)
+        opt2 = mx.optimizer.create(name, rescale_grad=0.5, **kwargs)
+        opt1.aggregate_num = 0
+        opt2.aggregate_num = 3
+        opt2.set_lr_mult({1: 0.5})
+        opt1.set_lr_mult({1: 0.5})
+        updater1 = mx.optimizer.get_updater(opt1)
+        updater2 = mx.optimizer.get_updater(opt2)
+        weights1 = [mx.random.uniform(shape=shape).astype(dtype) for shape in shapes]
+        weights2 = [w.copy() for w in weights1]
+        for _ in range(3):
+            grads = [mx.random.uniform(-1, 1, shape=shape).astype(dtype) for shape in shapes]
+            updater1(list(range(len(shapes))), grads, weights1)
+            updater2(list(range(len(shapes))), grads, weights2)
+        for w1, w2 in zip(weights1, weights2):
+            assert_almost_equal(w1.asnumpy(), w2.asnumpy(), rtol=1e-3, atol=1e-4)
+
+    # subclasses overriding update get one weight at a time
+    class ScaledNAG(mx.optimizer.NAG):
+        def update(self, index, weight, grad, state):
+            assert not isinstance(index, (list, tuple))
+            super(ScaledNAG, self).update(index, weight, grad * 0.5, state)
+
+    class PlainSGD(mx.optimizer.SGD):
+        pass
+
+    assert ScaledNAG().aggregate_num == 0 and PlainSGD().aggregate_num > 0
+    updater = mx.optimizer.get_updater(ScaledNAG(momentum=0.9))
+    updater(list(range(len(shapes))), [mx.nd.ones(shape) for shape in shapes],
+            [mx.nd.ones(shape) for shape in shapes])
+
 
 if __name__ == '__main__':
     import nose
@@ -16,13 +16,16 @@
 # under the License.
 
 # pylint: skip-file
+import os
 import sys
 import mxnet as mx
 import numpy as np
 import tempfile
 import random
 import string
-from common import setup_module, with_seed
+import struct
+from mxnet.test_utils import assert_almost_equal
+from common import setup_module, with_seed, TemporaryDirectory
 
 @with_seed()
 def test_recordio():
@@ -86,6 +89,185 @@ def test_recordio_pack_label():
             assert (label == rheader.label).all()
             assert content == rcontent
 
+@with_seed()
+def test_seg_recordio_python_writer():
+    with TemporaryDirectory() as tmpdir:
+        fidx = os.path.join(tmpdir, 'data.idx')
+        frec = os.path.join(tmpdir, 'data.rec')
+        magic = struct.pack('I', 0xced7230a)
+        records = [b'abc', magic + b'xy' + magic * 2 + b'12' + magic, b'', b'1' + magic + b'123']
+        records += [bytes(bytearray(random.getrandbits(8) for _ in range(i))) for i in range(20)]
+
+        writer = mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec)
+        for i in range(10):
+            writer.write_idx(i, records[i])
+        writer.close()
+        writer = mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec, append=True)
+        for i in range(10, len(records)):
+            writer.write_idx(i, records[i])
+        writer.close()
+
+        reader = mx.seg_recordio.MXIndexedSegRecordIO(fidx, frec, 'r')
+        mapped = mx.seg_recordio.MXMappedIndexedSegRecordIO(fidx, frec)
+        assert reader.keys == mapped.keys == list(range(len(records)))
+        for i in reversed(range(len(records))):
+            assert reader.read_idx(i) == records[i]
+            assert bytes(mapped.read_idx(i)) == records[i]
+
+@with_seed()
+def test_seg_recordio_rle_label():
+    for shape in [(1, 1), (7, 13), (64, 32)]:
+        label = np.random.randint(0, 3, size=shape).astype(np.uint8)
+        label[:, :shape[1] // 2] = 255
+        s = mx.seg_recordio.encode_label_rle(label)
+        assert (mx.seg_recordio.decode_label_rle(s) == label).all()
+
+    image_data = b'image'
+    label_data = mx.seg_recordio.encode_label_rle(label)
+    flag = mx.seg_recordio.LABEL_CODEC_RLE << 24
+    header = mx.seg_recordio.ISegRHeader(flag, 0, len(image_data), len(label_data), 3, 0)
+    rheader, rimage, rlabel = mx.seg_recordio.unpack_buffers(
+        mx.seg_recordio.pack(header, image_data, label_data))
+    assert mx.seg_recordio.label_codec(rheader) == mx.seg_recordio.LABEL_CODEC_RLE
+    assert rimage.tobytes() == image_data
+    assert (mx.seg_recordio.decode_label_rle(rlabel) == label).all()
+    assert (mx.seg_recordio.decode_label(rheader, rlabel) == label).all()
+    try:
+        mx.seg_recordio.decode_label(rheader._replace(flag=2 << 24), rlabel)
+        assert False, 'decode_label accepted an unknown codec'
+    except ValueError:
+        pass
+
+@with_seed()
+def test_seg_record_decoder():
+    try:
+        import cv2
+    except ImportError:
+        return
+    N = 5
+    images = [np.random.randint(0, 255, size=(32, 48, 3)).astype(np.uint8) for _ in range(N)]
+    labels = [np.random.randint(0, 4, size=(32, 48)).astype(np.uint8) for _ in range(N)]
+    records = []
+    for i in range(N):
+        header = mx.seg_recordio.ISegRHeader(0, 0, 0, 0, i, 0)
+        records.append(mx.seg_recordio.pack_img(header, images[i], labels[i], img_fmt='.png'))
+
+    decoder = mx.seg_recordio.SegRecordDecoder(N, (32, 48), num_threads=3)
+    headers, out_images, out_labels = decoder.decode(records)
+    assert [h.id for h in headers] == list(range(N))
+    for i in range(N):
+        assert (out_images[i] == images[i]).all()
+        assert (out_labels[i] == labels[i]).all()
+
+    rle_records = [mx.seg_recordio.pack_img(mx.seg_recordio.ISegRHeader(0, 0, 0, 0, i, 0),
+                                            images[i], labels[i], img_fmt='.png',
+                                            label_fmt='.rle') for i in range(N)]
+    _, _, out_labels = decoder.decode(rle_records)
+    for i in range(N):
+        assert (out_labels[i] == labels[i]).all()
+
+    decoder = mx.seg_recordio.SegRecordDecoder(N, (16, 24), resize=True,
+                                               ctx=mx.Context('cpu_shared', 0))
+    _, out_images, out_labels = decoder.decode(records[:2])
+    assert out_images.shape == (N, 16, 24, 3) and out_labels.shape == (N, 16, 24)
+    assert out_images.context == mx.Context('cpu_shared', 0)
+    assert set(np.unique(out_labels.asnumpy()[:2])) <= set(range(4))
+
+@with_seed()
+def test_seg_sample_weights():
+    with TemporaryDirectory() as tmpdir:
+        fidx = os.path.join(tmpdir, 'data.idx')
+        frec = os.path.join(tmpdir, 'data.rec')
+        labels = [np.zeros((4, 4), dtype=np.uint8) for _ in range(3)]
+        labels[1][0, :2] = 1
+        labels[2][:, :] = 255
+        writer = mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec)
+        for i, label in enumerate(labels):
+            label_data = mx.seg_recordio.encode_label_rle(label)
+            header = mx.seg_recordio.ISegRHeader(mx.seg_recordio.LABEL_CODEC_RLE << 24, 0,
+                                                 0, len(label_data), i, 0)
+            writer.write_idx(i, mx.seg_recordio.pack(header, b'', label_data))
+        writer.close()
+
+        keys, hist = mx.seg_recordio.class_histograms(fidx, frec, 2)
+        assert keys == [0, 1, 2]
+        assert (hist == [[16, 0], [14, 2], [0, 0]]).all()
+        weights = mx.seg_recordio.balanced_sample_weights(hist)
+        assert weights[1] > weights[0] > 0 and weights[2] == 0
+        assert (mx.seg_recordio.balanced_sample_weights(hist, power=0)[:2] == 1.5).all()
+
+        fweights = os.path.join(tmpdir, 'weights.txt')
+        mx.seg_recordio.save_sample_weights(fweights, keys, weights)
+        with open(fweights) as fin:
+            lines = [line.split() for line in fin]
+        assert [int(k) for k, _ in lines] == keys
+        assert_almost_equal(np.array([float(w) for _, w in lines]), weights)
+
+def test_im2rec_seg_resume():
+    try:
+        import cv2
+    except ImportError:
+        return
+    import argparse
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../../tools'))
+    import im2rec_seg
+
+    with TemporaryDirectory() as root:
+        N = 9
+        with open(os.path.join(root, 'data.lst'), 'w') as fout:
+            for i in range(N):
+                for ext in ['.jpg', '.png']:
+                    with open(os.path.join(root, '%d%s' % (i, ext)), 'wb') as f:
+                        f.write(b'%s%d' % (ext.encode(), i))
+                fout.write('%d\t%d.jpg\t%d.png\n' % (100 + i, i, i))
+        args = argparse.Namespace(root=root, label_root=root, pass_through=True, num_parts=2,
+                                  num_thread=1, chunk_size=1, checkpoint_every=2)
+
+        class Interrupted(Exception):
+            pass
+
+        writer = mx.seg_recordio.MXIndexedSegRecordWriter
+        class InterruptedWriter(writer):
+            written = 0
+            opened = []
+            def __init__(self, *args, **kwargs):
+                super(InterruptedWriter, self).__init__(*args, **kwargs)
+                InterruptedWriter.opened.append(self)
+            def write_idx(self, idx, buf):
+                if InterruptedWriter.written == 5:
+                    raise Interrupted()
+                InterruptedWriter.written += 1
+                super(InterruptedWriter, self).write_idx(idx, buf)
+
+        # stop after 5 records, the last checkpoint is after 4 of them
+        mx.seg_recordio.MXIndexedSegRecordWriter = InterruptedWriter
+        try:
+            im2rec_seg.write_record(args, os.path.join(root, 'data.lst'))
+            assert False, 'write_record was not interrupted'
+        except Interrupted:
+            pass
+        finally:
+            mx.seg_recordio.MXIndexedSegRecordWriter = writer
+        # the record written after the checkpoint reaches the files, resuming drops it
+        for record in InterruptedWriter.opened:
+            record.close()
+        assert os.path.isfile(os.path.join(root, 'data.progress'))
+
+        im2rec_seg.write_record(args, os.path.join(root, 'data.lst'))
+        assert not os.path.isfile(os.path.join(root, 'data.progress'))
+        # records are assigned round-robin in list order, each exactly once
+        for k in range(2):
+            reader = mx.seg_recordio.MXIndexedSegRecordIO(
+                os.path.join(root, 'data_%d.idx' % k), os.path.join(root, 'data_%d.rec' % k), 'r')
+            ids = list(range(100 + k, 100 + N, 2))
+            assert reader.keys == ids
+            for i in ids:
+                header, image_data, label_data = mx.seg_recordio.unpack_buffers(reader.read_idx(i))
+                assert header.id == i
+                assert image_data.tobytes() == b'.jpg%d' % (i - 100)
+                assert label_data.tobytes() == b'.png%d' % (i - 100)
+            reader.close()
+
 if __name__ == '__main__':
     test_recordio_pack_label()
     test_recordio()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""Pack (image, label mask) pairs into segmentation RecordIO files.
+
+The list file has one tab separated line per sample:
+
+    <index>\t<image path>\t<label path>
+
+with paths relative to `root` and `label-root`. Records are encoded on a
+process pool and written in list order, optionally sharded into several
+.rec/.idx pairs. Progress is checkpointed to <prefix>.progress so that an
+interrupted job continues where it stopped when run again.
+"""
+
+from __future__ import print_function
+import os
+import sys
+
+curr_path = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(os.path.join(curr_path, "../python"))
+import mxnet as mx
+import random
+import argparse
+import cv2
+import json
+import time
+import traceback
+import multiprocessing
+
+def list_pairs(root, label_root, exts, label_ext):
+    i = 0
+    for path, dirs, files in os.walk(root, followlinks=True):
+        dirs.sort()
+        files.sort()
+        for fname in files:
+            suffix = os.path.splitext(fname)[1].lower()
+            if suffix not in exts:
+                continue
+            relpath = os.path.relpath(os.path.join(path, fname), root)
+            label_path = os.path.splitext(relpath)[0] + label_ext
+            if not os.path.isfile(os.path.join(label_root, label_path)):
+                print('Ignoring %s which has no label %s' % (relpath, label_path))
+                continue
+            yield (i, relpath, label_path)
+            i += 1
+
+def make_list(args):
+    pairs = list(list_pairs(args.root, args.label_root, args.exts, args.label_ext))
+    if args.shuffle:
+        random.seed(100)
+        random.shuffle(pairs)
+    with open(args.prefix + '.lst', 'w') as fout:
+        for item in pairs:
+            fout.write('%d\t%s\t%s\n' % item)
+
+def read_list(path_in):
+    with open(path_in) as fin:
+        for line in fin:
+            line = [i.strip() for i in line.strip().split('\t')]
+            if len(line) != 3:
+                print('lst should have three parts, but has %d parts for %s' % (len(line), line))
+                continue
+            try:
+                yield (int(line[0]), line[1], line[2])
+            except ValueError as e:
+                print('Parsing lst met error for %s, detail: %s' % (line, e))
+
+def init_worker(worker_args):
+    global args
+    args = worker_args
+
+def pair_encode(item):
+    """Encode one sample, returns (item, packed record or None)."""
+    idx, image_path, label_path = item
+    image_path = os.path.join(args.root, image_path)
+    label_path = os.path.join(args.label_root, label_path)
+    header = mx.seg_recordio.ISegRHeader(0, 0, 0, 0, idx, 0)
+    try:
+        if args.pass_through:
+            with open(image_path, 'rb') as fin:
+                image_data = fin.read()
+            with open(label_path, 'rb') as fin:
+                label_data = fin.read()
+            header = header._replace(image_size=len(image_data), label_size=len(label_data))
+            return item, mx.seg_recordio.pack(header, image_data, label_data)
+        img = cv2.imread(image_path, args.color)
+        label = cv2.imread(label_path, cv2.IMREAD_GRAYSCALE)
+        if img is None or label is None:
+            print('imread read blank (None) image for pair: %s, %s' % (image_path, label_path))
+            return item, None
+        if args.resize:
+            if img.shape[0] > img.shape[1]:
+                newsize = (args.resize, img.shape[0] * args.resize // img.shape[1])
+            else:
+                newsize = (img.shape[1] * args.resize // img.shape[0], args.resize)
+            img = cv2.resize(img, newsize, interpolation=cv2.INTER_LINEAR)
+            label = cv2.resize(label, newsize, interpolation=cv2.INTER_NEAREST)
+        return item, mx.seg_recordio.pack_img(header, img, label, quality=args.quality,
+                                              img_fmt=args.encoding,
+                                              label_fmt=args.label_encoding)
+    except Exception as e:
+        traceback.print_exc()
+        print('pack_img error on pair: %s, %s' % (image_path, label_path), e)
+        return item, None
+
+def part_names(prefix, num_parts):
+    if num_parts == 1:
+        return [(prefix + '.idx', prefix + '.rec')]
+    return [('%s_%d.idx' % (prefix, k), '%s_%d.rec' % (prefix, k)) for k in range(num_parts)]
+
+def load_progress(fname, num_parts):
+    """Returns the number of list entries already written, and truncates
+    the parts back to the last checkpoint."""
+    if not os.path.isfile(fname):
+        return 0, False
+    with open(fname) as fin:
+        progress = json.load(fin)
+    assert len(progress['parts']) == num_parts, \
+        'checkpoint was written with %d parts, got --num-parts %d' % (
+            len(progress['parts']), num_parts)
+    for (fidx, frec), (idx_pos, rec_pos) in zip(part_names(progress['prefix'], num_parts),
+                                                progress['parts']):
+        for path, pos in ((fidx, idx_pos), (frec, rec_pos)):
+            with open(path, 'ab') as fout:
+                fout.truncate(pos)
+    return progress['count'], True
+
+def save_progress(fname, prefix, count, records):
+    for record in records:
+        record.flush()
+    progress = {'prefix': prefix, 'count': count,
+                'parts': [[record.fidx.tell(), record.tell()] for record in records]}
+    with open(fname + '.tmp', 'w') as fout:
+        json.dump(progress, fout)
+    os.rename(fname + '.tmp', fname)
+
+def write_record(args, fname):
+    prefix = os.path.splitext(fname)[0]
+    progress_file = prefix + '.progress'
+    start, resume = load_progress(progress_file, args.num_parts)
+    if resume:
+        print('Resuming %s from entry %d' % (fname, start))
+    records = [mx.seg_recordio.MXIndexedSegRecordWriter(fidx, frec, append=resume)
+               for fidx, frec in part_names(prefix, args.num_parts)]
+    items = (item for i, item in enumerate(read_list(fname)) if i >= start)
+    pool = multiprocessing.Pool(args.num_thread, initializer=init_worker, initargs=(args,))
+    pre_time = time.time()
+    count = start
+    try:
+        for item, s in pool.imap(pair_encode, items, chunksize=args.chunk_size):
+            if s is not None:
+                records[count % args.num_parts].write_idx(item[0], s)
+            count += 1
+            if count % args.checkpoint_every == 0:
+                save_progress(progress_file, prefix, count, records)
+            if count % 1000 == 0:
+                cur_time = time.time()
+                print('time:', cur_time - pre_time, ' count:', count)
+                pre_time = cur_time
+    finally:
+        pool.terminate()
+    for record in records:
+        record.close()
+    if os.path.isfile(progress_file):
+        os.remove(progress_file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description='Create an image/label list or \
+        make a segmentation record database by reading from a list')
+    parser.add_argument('prefix', help='prefix of input/output lst and rec files.')
+    parser.add_argument('root', help='path to folder containing images.')
+    parser.add_argument('--label-root', default=None,
+                        help='path to folder containing label masks, defaults to root.')
+
+    cgroup = parser.add_argument_group('Options for creating lists')
+    cgroup.add_argument('--list', action='store_true',
+                        help='If this is set im2rec_seg will create a list by traversing root\
+        and output to <prefix>.lst. Otherwise it will read <prefix>*.lst and create\
+        databases at <prefix>*.rec')
+    cgroup.add_argument('--exts', nargs='+', default=['.jpeg', '.jpg', '.png'],
+                        help='list of acceptable image extensions.')
+    cgroup.add_argument('--label-ext', default='.png',
+                        help='extension of the label mask matching each image.')
+    cgroup.add_argument('--no-shuffle', dest='shuffle', action='store_false',
+                        help='If this is passed, the order in <prefix>.lst is not randomized')
+
+    rgroup = parser.add_argument_group('Options for creating database')
+    rgroup.add_argument('--pass-through', action='store_true',
+                        help='whether to skip transformation and save image and label as is')
+    rgroup.add_argument('--resize', type=int, default=0,
+                        help='resize the shorter edge of image and label to the newsize.')
+    rgroup.add_argument('--quality', type=int, default=95,
+                        help='JPEG quality for encoding, 1-100; or PNG compression for encoding, 1-9')
+    rgroup.add_argument('--num-thread', type=int, default=multiprocessing.cpu_count(),
+                        help='number of processes to use for encoding.')
+    rgroup.add_argument('--chunk-size', type=int, default=16,
+                        help='number of samples sent to an encoding process at a time.')
+    rgroup.add_argument('--num-parts', type=int, default=1,
+                        help='number of .rec/.idx shards to write, records are assigned\
+        round-robin in list order.')
+    rgroup.add_argument('--checkpoint-every', type=int, default=10000,
+                        help='number of samples between progress checkpoints.')
+    rgroup.add_argument('--color', type=int, default=1, choices=[-1, 0, 1],
+                        help='specify the color mode of the loaded image.')
+    rgroup.add_argument('--encoding', type=str, default='.jpg', choices=['.jpg', '.png'],
+                        help='specify the encoding of the images.')
+    rgroup.add_argument('--label-encoding', type=str, default='.png', choices=['.png', '.rle'],
+                        help='specify the encoding of the label masks.')
+    args = parser.parse_args()
+    args.prefix = os.path.abspath(args.prefix)
+    args.root = os.path.abspath(args.root)
+    args.label_root = os.path.abspath(args.label_root) if args.label_root else args.root
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.list:
+        make_list(args)
+    else:
+        if os.path.isdir(args.prefix):
+            working_dir = args.prefix
+        else:
+            working_dir = os.path.dirname(args.prefix)
+        files = [os.path.join(working_dir, fname) for fname in sorted(os.listdir(working_dir))
+                 if os.path.isfile(os.path.join(working_dir, fname))]
+        count = 0
+        for fname in files:
+            if fname.startswith(args.prefix) and fname.endswith('.lst'):
+                print('Creating .rec file from', fname, 'in', working_dir)
+                count += 1
+                write_record(args, fname)
+        if not count:
+            print('Did not find and list file with prefix %s' % args.prefix)